@@ -1,14 +1,40 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+from app.services.image_jobs import jobs_from_env
 
 router = APIRouter()
 
-@router.post("/upload")
+# Workers each hold a preloaded FlowerDetectionPipeline and batch queued
+# uploads into single detector calls; repeated images come from the cache
+image_jobs = jobs_from_env()
+
+@router.post("/upload", status_code=202)
 async def upload_image(file: UploadFile = File(...)):
+    data = await file.read()
+    try:
+        cache_key, cached, image = await run_in_threadpool(image_jobs.prepare, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if cached is not None:
+        job = image_jobs.add_cached(cached, file.filename)
+    else:
+        job = image_jobs.submit(image, file.filename, cache_key)
     return {
         "filename": file.filename,
-        "status": "Image received, sent for ML inference"
+        "job_id": job.id,
+        "status": "Image received, sent for ML inference",
+        "poll": f"/image/jobs/{job.id}"
     }
+
+@router.get("/jobs/{job_id}")
+async def image_job(job_id: str, wait: float = Query(0, ge=0, le=60, description="Long-poll seconds")):
+    job = await image_jobs.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.to_dict()
+
 @router.get("/status")
 def image_status():
-    return {"status": "Image API is operational"}
-  
\ No newline at end of file
+    return {"status": "Image API is operational", "jobs": image_jobs.stats()}
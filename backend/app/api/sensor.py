@@ -1,17 +1,224 @@
-from fastapi import APIRouter
+import os
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
+from app.services.inference_pool import pool_from_env
+from app.services.micro_batcher import batcher_from_env
+from app.services.readiness_model import readiness_model
+from app.services.sensor_codec import UnsupportedFormat, decode_readings, to_features
+from app.services.sensor_rollups import AGGREGATES
+from app.services.sensor_store import SensorStore, VALUE_FIELDS, now_ms
+
 router = APIRouter()
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+SENSOR_STORE_DIR = os.getenv(
+    "SENSOR_STORE_DIR",
+    os.path.join(BASE_DIR, "data", "sensors")
+)
+
+sensor_store = SensorStore(SENSOR_STORE_DIR)
+
+# Older sensor nodes have no soil probe; score them at the middle of the
+# training range unless configured otherwise
+DEFAULT_SOIL_MOISTURE = float(os.getenv("SENSOR_DEFAULT_SOIL_MOISTURE", "42.5"))
+
 class SensorPayload(BaseModel):
     temperature: float
     humidity: float
     light: float
+    soil_moisture: Optional[float] = None
+    device_id: str = "unknown"
+    timestamp: Optional[float] = None  # epoch seconds; arrival time if omitted
+    zone: Optional[str] = None         # field zone the device belongs to
+
+def score_readings(X):
+    labels, confidence = readiness_model.score(X)
+    return [
+        {"prediction": p, "confidence": c}
+        for p, c in zip(labels.tolist(), confidence.tolist())
+    ]
+
+sensor_pool = pool_from_env(prefix="SENSOR_INFERENCE", name="sensor-inference")
+readiness_batcher = batcher_from_env(score_readings, sensor_pool)
 
 @router.post("/ingest")
-def ingest_sensor_data(data: SensorPayload):
-    return {"message": "Sensor data received", "data": data}
+async def ingest_sensor_data(data: SensorPayload):
+    try:
+        timestamp_ms = now_ms() if data.timestamp is None else int(round(data.timestamp * 1000))
+        await run_in_threadpool(
+            sensor_store.append, data.device_id, timestamp_ms,
+            data.temperature, data.humidity, data.light, data.soil_moisture
+        )
+        if data.zone:
+            await run_in_threadpool(sensor_store.assign_zone, data.device_id, data.zone)
+    except (ValueError, OverflowError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    soil_moisture = data.soil_moisture
+    if soil_moisture is None:
+        soil_moisture = DEFAULT_SOIL_MOISTURE
+
+    # Concurrent ingests are coalesced into one vectorized model call
+    readiness = await readiness_batcher.submit(
+        [data.temperature, data.humidity, data.light, soil_moisture]
+    )
+    return {"message": "Sensor data received", "data": data, "readiness": readiness}
+def ingest_bulk(body, content_type, device_id, zone=None):
+    columns = decode_readings(body, content_type)
+
+    n = len(columns["temperature"])
+    if n == 0:
+        return {"received": 0, "predictions": [], "confidence": []}
+
+    # Rejects out-of-range timestamps before anything is written
+    sensor_store.append(
+        device_id,
+        columns.get("timestamp_ms", now_ms()),
+        columns["temperature"],
+        columns["humidity"],
+        columns["light"],
+        columns["soil_moisture"]
+    )
+    # Only a stored payload changes the device's zone
+    if zone:
+        sensor_store.assign_zone(device_id, zone)
+
+    # Missing soil readings are stored as NaN but scored at the default
+    features = to_features(columns)
+    soil = features[:, 3]
+    soil[np.isnan(soil)] = DEFAULT_SOIL_MOISTURE
+
+    labels, confidence = readiness_model.score(features)
+    return {
+        "received": n,
+        "predictions": labels.tolist(),
+        "confidence": confidence.tolist()
+    }
+
+@router.post("/ingest/bulk")
+async def ingest_sensor_bulk(request: Request, device_id: str = "unknown",
+                             zone: Optional[str] = None):
+    """
+    Bulk ingest: columnar JSON, NDJSON, MessagePack or packed float32
+    records (see app.services.sensor_codec), stored and scored in one
+    vectorized call.
+    """
+    body = await request.body()
+    try:
+        return await sensor_pool.run(
+            ingest_bulk, body, request.headers.get("content-type"), device_id, zone
+        )
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _json_column(values):
+    # JSON has no NaN; empty buckets / missing readings become null
+    return [None if v != v else v for v in values.tolist()]
+
+def read_history(device_id, start_ms, end_ms, every_ms, limit):
+    if every_ms:
+        buckets, means = sensor_store.downsample(device_id, start_ms, end_ms, every_ms)
+        columns = {field: _json_column(means[field]) for field in VALUE_FIELDS}
+        timestamps = buckets
+    else:
+        records = sensor_store.read(device_id, start_ms, end_ms)[-limit:]
+        columns = {field: _json_column(records[field]) for field in VALUE_FIELDS}
+        timestamps = records["timestamp"]
+
+    return {
+        "device_id": device_id,
+        "start": start_ms / 1000,
+        "end": end_ms / 1000,
+        "every": every_ms / 1000 if every_ms else None,
+        "count": len(timestamps),
+        "timestamp": (timestamps / 1000).tolist(),
+        **columns
+    }
+
+@router.get("/history")
+async def sensor_history(
+    device_id: str,
+    start: Optional[float] = Query(None, description="Epoch seconds, default end - 24h"),
+    end: Optional[float] = Query(None, description="Epoch seconds, default now"),
+    every: Optional[float] = Query(None, gt=0, description="Downsample bucket in seconds"),
+    limit: int = Query(10_000, ge=1, le=1_000_000)
+):
+    end_ms = now_ms() if end is None else int(round(end * 1000))
+    start_ms = end_ms - 86_400_000 if start is None else int(round(start * 1000))
+    every_ms = int(round(every * 1000)) if every else None
+    if end_ms <= start_ms:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    try:
+        return await run_in_threadpool(
+            read_history, device_id, start_ms, end_ms, every_ms, limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def read_aggregate(device_ids, start_ms, end_ms, bucket, aggregates, percentiles):
+    buckets, summary = sensor_store.aggregate(
+        device_ids, start_ms, end_ms, bucket, aggregates, percentiles
+    )
+    return {
+        "devices": device_ids,
+        "bucket": bucket,
+        "start": start_ms / 1000,
+        "end": end_ms / 1000,
+        "count": len(buckets),
+        "timestamp": (buckets / 1000).tolist(),
+        "fields": {
+            field: {agg: _json_column(values) for agg, values in aggs.items()}
+            for field, aggs in summary.items()
+        }
+    }
+
+@router.get("/aggregate")
+async def sensor_aggregate(
+    device_id: Optional[str] = None,
+    zone: Optional[str] = None,
+    bucket: str = Query("15m", description="Bucket width: 1m, 15m, 1h or multiples like 6h, 1d"),
+    start: Optional[float] = Query(None, description="Epoch seconds, default end - 24h"),
+    end: Optional[float] = Query(None, description="Epoch seconds, default now"),
+    agg: List[str] = Query(list(AGGREGATES), description="count, mean, min, max, last"),
+    percentile: List[float] = Query([], description="Approximate percentiles, e.g. 50, 90")
+):
+    """
+    Windowed aggregates for one device or every device of a field zone,
+    served from the rollup tiers (no raw scan).
+    """
+    if (device_id is None) == (zone is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of device_id or zone")
+
+    end_ms = now_ms() if end is None else int(round(end * 1000))
+    start_ms = end_ms - 86_400_000 if start is None else int(round(start * 1000))
+    if end_ms <= start_ms:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    device_ids = [device_id] if device_id else sensor_store.zone_devices(zone)
+    if not device_ids:
+        raise HTTPException(status_code=404, detail=f"Unknown zone: {zone}")
+
+    try:
+        return await run_in_threadpool(
+            read_aggregate, device_ids, start_ms, end_ms, bucket, agg, percentile
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 @router.get("/status")
 def sensor_status():
-    return {"status": "Sensor API is operational"}
-  
\ No newline at end of file
+    return {
+        "status": "Sensor API is operational",
+        "model": readiness_model.status(),
+        "batching": readiness_batcher.stats(),
+        "inference": sensor_pool.stats(),
+        "stored_devices": sensor_store.devices(),
+        "zones": sensor_store.zones()
+    }
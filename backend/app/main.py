@@ -1,5 +1,10 @@
+import os
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.api import auth, sensor, readiness, image
+from app.services.image_jobs import prometheus_metrics
+from app.services.readiness_model import readiness_model
 
 app = FastAPI(
     title="PolliCare Backend API",
@@ -12,6 +17,27 @@ app.include_router(sensor.router, prefix="/sensor", tags=["Sensor"])
 app.include_router(readiness.router, prefix="/readiness", tags=["Pollination"])
 app.include_router(image.router, prefix="/image", tags=["Image"])
 
+@app.on_event("startup")
+def warmup_models():
+    # Load the readiness model in the background so /sensor/ingest is hot
+    if os.getenv("READINESS_WARMUP", "1") != "0":
+        readiness_model.start_warmup()
+    # Image workers load their detection pipelines before taking jobs
+    if os.getenv("IMAGE_JOBS_ENABLED", "1") != "0":
+        image.image_jobs.start()
+
+@app.on_event("shutdown")
+def stop_workers():
+    image.image_jobs.stop()
+
 @app.get("/")
 def root():
     return {"status": "Backend running"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus scrape target: per-stage pipeline latency, counters, queue depth
+    return PlainTextResponse(
+        prometheus_metrics(image.image_jobs),
+        media_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,466 @@
+"""
+In-process job queue for flower detection on uploaded images.
+
+Uploads are decoded on a request thread (so unreadable images fail fast)
+and queued; a small pool of worker threads, each owning a preloaded
+FlowerDetectionPipeline (YOLO models are not safe to share between
+threads), drains the queue in batches so a burst of uploads costs one
+detector call per batch instead of one per image. Callers get a job id immediately and poll, or await
+`wait()` for a long-poll.
+
+Results are cached by image content hash, model version and confidence
+threshold (ml-training/inference_cache.py), so frames re-uploaded after a
+dropped connection finish immediately without touching the queue.
+
+All worker pipelines share one PipelineMetrics (ml-training/
+inference_metrics.py); `prometheus_metrics()` renders its stage timings
+and counters together with the queue's for the /metrics endpoint.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+# The inference pipeline lives next to the training code
+ML_TRAINING_DIR = os.path.join(BACKEND_DIR, "..", "ml-training")
+
+MODEL_DIR = os.path.join(ML_TRAINING_DIR, "models")
+
+DETECTOR_PATH = os.getenv("DETECTOR_PATH", os.path.join(MODEL_DIR, "detector.pt"))
+CLASSIFIER_PATH = os.getenv("CLASSIFIER_PATH", os.path.join(MODEL_DIR, "classifier.pt"))
+CONF_THRESHOLD = float(os.getenv("FLOWER_CONF", "0.5"))
+
+IMAGE_CACHE_DIR = os.getenv(
+    "IMAGE_CACHE_DIR",
+    os.path.join(BACKEND_DIR, "data", "image_cache")
+)
+
+
+_metrics = None
+_stage_histogram = None
+_metrics_lock = threading.Lock()
+
+
+def _use_ml_training():
+    if ML_TRAINING_DIR not in sys.path:
+        sys.path.append(ML_TRAINING_DIR)
+
+
+def pipeline_metrics():
+    """
+    PipelineMetrics shared by every worker pipeline; stages are timed into
+    a histogram unless FLOWER_STAGE_TIMING=0 (counters are always kept).
+    """
+    global _metrics, _stage_histogram
+    with _metrics_lock:
+        if _metrics is None:
+            _use_ml_training()
+            from inference_metrics import PipelineMetrics, StageHistogram
+
+            _metrics = PipelineMetrics()
+            if os.getenv("FLOWER_STAGE_TIMING", "1") != "0":
+                _stage_histogram = StageHistogram()
+                _metrics.add_hook(_stage_histogram)
+        return _metrics
+
+
+def load_pipeline():
+    """
+    Build a FlowerDetectionPipeline from DETECTOR_PATH / CLASSIFIER_PATH
+    (.onnx files run on onnxruntime without torch; FLOWER_THREADS caps
+    CPU threads per model operator).
+    """
+    _use_ml_training()
+    from flower_inference import FlowerDetectionPipeline
+
+    device = os.getenv("FLOWER_DEVICE", "cpu")
+    return FlowerDetectionPipeline(
+        detector_path=DETECTOR_PATH,
+        classifier_path=CLASSIFIER_PATH,
+        conf_threshold=CONF_THRESHOLD,
+        device=int(device) if device.isdigit() else device,
+        classify_batch_size=int(os.getenv("FLOWER_CLF_BATCH", "32")),
+        num_threads=int(os.getenv("FLOWER_THREADS", "0")) or None,
+        metrics=pipeline_metrics()
+    )
+
+
+def decode_upload(data):
+    """Decode uploaded image bytes to a BGR array; ValueError if unreadable."""
+    _use_ml_training()
+    from flower_inference import decode_image
+
+    with pipeline_metrics().stage("upload_decode"):
+        return decode_image(data)
+
+
+def flowers_to_dict(flowers):
+    """JSON-serializable flower list (crops dropped)."""
+    _use_ml_training()
+    from flower_inference import result_to_dict
+
+    return result_to_dict({"flowers": flowers})["flowers"]
+
+
+class ImageJob:
+    def __init__(self, image, filename, cache_key=None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.image = image
+        self.cache_key = cache_key
+        self.cached = False
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+        self._waiters = []
+
+    def finish(self, result=None, error=None):
+        self.status = "failed" if error else "done"
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        self.image = None
+        self.done.set()
+
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._waiters = []
+
+    def to_dict(self):
+        output = {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "cached": self.cached,
+            "created": self.created,
+            "finished": self.finished
+        }
+        if self.status == "done":
+            output["flowers"] = self.result
+            output["flower_count"] = len(self.result)
+        if self.error:
+            output["error"] = self.error
+        return output
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ImageJobQueue:
+    """
+    Usage:
+        jobs = ImageJobQueue(load_pipeline, workers=1)
+        jobs.start()
+        job = jobs.submit(decode_upload(data), "frame.jpg")
+        await jobs.wait(job.id, timeout=10)
+
+    Each worker blocks for the first queued job, then collects more for up
+    to `max_wait_ms` (or until `max_batch` jobs) and runs them through
+    `pipeline.process_frames` together. Submissions beyond `max_pending`
+    queued jobs, or while no workers are running, are rejected with 503. Finished jobs are kept for polling
+    until `max_finished` newer ones have completed.
+
+    With a `cache`, `prepare()` answers repeated images from it and
+    workers store every new result.
+    """
+
+    def __init__(self, pipeline_factory, workers=1, max_batch=8, max_wait_ms=20.0,
+                 max_pending=256, max_finished=1024, name="image-jobs",
+                 cache=None, model_paths=(DETECTOR_PATH, CLASSIFIER_PATH),
+                 conf_threshold=CONF_THRESHOLD):
+        if workers < 1 or max_batch < 1:
+            raise ValueError("workers and max_batch must be >= 1")
+
+        self.pipeline_factory = pipeline_factory
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.name = name
+        self.cache = cache
+        self.model_paths = model_paths
+        self.conf_threshold = conf_threshold
+        self._model_version = None
+
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._loaded = 0
+        self._load_failures = 0
+        self._error = None
+
+        self._batches = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._cache_hits = 0
+
+    def start(self):
+        """Start the workers; each loads its own pipeline before taking jobs."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"{self.name}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def prepare(self, data):
+        """
+        Hash and look up uploaded bytes, decoding them only on a miss.
+        Returns (cache key, cached flowers, image); blocking, so call it
+        from a worker thread.
+        """
+        if self.cache is None:
+            return None, None, decode_upload(data)
+
+        key = self.cache_key(data)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return key, cached, None
+        return key, None, decode_upload(data)
+
+    def cache_key(self, data):
+        _use_ml_training()
+        from inference_cache import InferenceCache, content_hash, model_version
+
+        if self._model_version is None:
+            self._model_version = model_version(*self.model_paths)
+        return InferenceCache.make_key(content_hash(data), self._model_version, self.conf_threshold)
+
+    def add_cached(self, flowers, filename=None):
+        """Register an already answered job so it can be polled like any other."""
+        job = ImageJob(None, filename)
+        job.cached = True
+        with self._lock:
+            self._jobs[job.id] = job
+            self._cache_hits += 1
+        self._finish(job, result=flowers)
+        return job
+
+    def submit(self, image, filename=None, cache_key=None):
+        if not self._threads:
+            # start() was never called (IMAGE_JOBS_ENABLED=0) or stop() ran
+            raise HTTPException(status_code=503, detail="Image inference disabled")
+        if self._queue.qsize() >= self.max_pending:
+            self._rejected += 1
+            raise HTTPException(status_code=503, detail="Image inference queue is full, retry later")
+
+        job = ImageJob(image, filename, cache_key)
+        with self._lock:
+            # Checked under the lock so the last failing worker drains this job
+            if self._load_failures >= self.workers:
+                raise HTTPException(status_code=503, detail=f"Image inference unavailable: {self._error}")
+            self._jobs[job.id] = job
+            self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def wait(self, job_id, timeout):
+        """Wait up to `timeout` seconds for a job without holding a thread."""
+        job = self.get(job_id)
+        if job is None or job.done.is_set() or timeout <= 0:
+            return job
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if job.done.is_set():
+                return job
+            job._waiters.append((loop, future))
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pipelines_loaded": self._loaded,
+            "pipelines_failed": self._load_failures,
+            "error": self._error,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_pending": self.max_pending,
+            "queued": self._queue.qsize(),
+            "batches": self._batches,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "cache_hits": self._cache_hits,
+            "cache": self.cache.stats() if self.cache is not None else None
+        }
+
+    def _work(self):
+        try:
+            pipeline = self.pipeline_factory()
+        except Exception as e:
+            logger.exception("Failed to load flower detection pipeline")
+            with self._lock:
+                self._error = f"{type(e).__name__}: {e}"
+                self._load_failures += 1
+                all_failed = self._load_failures >= self.workers
+            # Workers that did load keep serving the queue
+            if all_failed:
+                self._fail_queued()
+            return
+        with self._lock:
+            self._loaded += 1
+
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._run(pipeline, batch)
+
+    def _next_batch(self):
+        job = self._queue.get()
+        if job is None:
+            return None
+
+        batch = [job]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                # Pass the stop sentinel on after this batch
+                self._queue.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self, pipeline, batch):
+        for job in batch:
+            job.status = "running"
+        self._batches += 1
+
+        try:
+            outputs = pipeline.process_frames([job.image for job in batch])
+            results = [flowers_to_dict(flowers) for flowers, _ in outputs]
+        except Exception as e:
+            logger.exception("Image inference batch failed")
+            for job in batch:
+                self._finish(job, error=f"{type(e).__name__}: {e}")
+            return
+
+        for job, result in zip(batch, results):
+            if self.cache is not None and job.cache_key is not None:
+                self.cache.put(job.cache_key, result)
+            self._finish(job, result=result)
+
+    def _finish(self, job, result=None, error=None):
+        with self._lock:
+            job.finish(result, error)
+            if error:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+            # Forget the oldest finished jobs beyond max_finished
+            finished = [j for j in self._jobs.values() if j.done.is_set()]
+            for old in finished[:max(len(finished) - self.max_finished, 0)]:
+                del self._jobs[old.id]
+
+    def _fail_queued(self):
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                self._finish(job, error=self._error)
+
+
+def prometheus_metrics(jobs):
+    """Prometheus text for the shared pipeline metrics and a job queue."""
+    metrics = pipeline_metrics()
+    _use_ml_training()
+    from inference_metrics import render_prometheus
+
+    stats = jobs.stats()
+    counters = {
+        "image_jobs_batches_total": ("Detector batches run by the workers", stats["batches"]),
+        "image_jobs_completed_total": ("Image jobs finished successfully", stats["completed"]),
+        "image_jobs_failed_total": ("Image jobs that failed", stats["failed"]),
+        "image_jobs_rejected_total": ("Uploads rejected because the queue was full", stats["rejected"]),
+        "image_jobs_cache_hits_total": ("Uploads answered from the result cache", stats["cache_hits"]),
+    }
+    gauges = {
+        "image_jobs_queue_depth": ("Image jobs waiting for a worker", stats["queued"]),
+        "image_jobs_pipelines_loaded": ("Worker pipelines loaded", stats["pipelines_loaded"]),
+    }
+    if stats["cache"] is not None:
+        gauges["image_cache_hit_rate"] = ("Result cache hit rate", stats["cache"]["hit_rate"])
+        gauges["image_cache_memory_entries"] = ("Results in the memory tier", stats["cache"]["memory_entries"])
+        gauges["image_cache_disk_bytes"] = ("Size of the disk tier", stats["cache"]["disk_bytes"])
+
+    return render_prometheus(metrics, _stage_histogram, gauges=gauges, counters=counters)
+
+
+def cache_from_env(prefix="IMAGE_CACHE"):
+    """
+    Result cache sized by <PREFIX>_ENTRIES / <PREFIX>_MB under
+    IMAGE_CACHE_DIR; None when <PREFIX>_ENABLED=0.
+    """
+    if os.getenv(f"{prefix}_ENABLED", "1") == "0":
+        return None
+
+    _use_ml_training()
+    from inference_cache import InferenceCache
+
+    return InferenceCache(
+        IMAGE_CACHE_DIR,
+        max_entries=int(os.getenv(f"{prefix}_ENTRIES", "1024")),
+        max_disk_bytes=int(os.getenv(f"{prefix}_MB", "512")) << 20
+    )
+
+
+def jobs_from_env(pipeline_factory=load_pipeline, prefix="IMAGE_JOBS"):
+    """Build a queue sized by <PREFIX>_WORKERS / _MAX_BATCH / _MAX_WAIT_MS / _MAX_PENDING."""
+    return ImageJobQueue(
+        pipeline_factory,
+        workers=int(os.getenv(f"{prefix}_WORKERS", "1")),
+        max_batch=int(os.getenv(f"{prefix}_MAX_BATCH", "8")),
+        max_wait_ms=float(os.getenv(f"{prefix}_MAX_WAIT_MS", "20")),
+        max_pending=int(os.getenv(f"{prefix}_MAX_PENDING", "256")),
+        cache=cache_from_env()
+    )
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+
+class InferencePool:
+    """
+    Bounded worker pool for CPU-bound model inference.
+
+    Async endpoints await `run(...)` instead of calling the model inline,
+    so pandas parsing and RandomForest prediction never block the event
+    loop. Threads share the already-loaded model (tree prediction releases
+    the GIL). Once `max_pending` calls are queued or running, new calls
+    are rejected with 503 instead of piling up behind large uploads.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, name="inference"):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.name = name
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"{self.name} pool saturated, retry later"
+                )
+            self._pending += 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._call, fn, args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _call(self, fn, args):
+        with self._lock:
+            self._active += 1
+        try:
+            result = fn(*args)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+        with self._lock:
+            self._completed += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "active": self._active,
+                "queued": self._pending - self._active,
+                "saturation": round(self._pending / self.max_pending, 3),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def pool_from_env(prefix="INFERENCE", name="inference"):
+    """Build a pool sized by <PREFIX>_WORKERS / <PREFIX>_MAX_PENDING."""
+    workers = os.getenv(f"{prefix}_WORKERS")
+    pending = os.getenv(f"{prefix}_MAX_PENDING")
+    return InferencePool(
+        max_workers=int(workers) if workers else None,
+        max_pending=int(pending) if pending else None,
+        name=name
+    )
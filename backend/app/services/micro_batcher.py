@@ -0,0 +1,109 @@
+import asyncio
+import os
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row scoring requests into one vectorized
+    model call.
+
+    Callers `await submit(row)`. The first row of a batch starts a
+    `max_wait_ms` timer; the batch is flushed when the timer fires or as
+    soon as `max_batch_size` rows are waiting, whichever comes first. The
+    whole batch is scored with one `score_fn(X)` call on the inference
+    pool and every caller receives its own row of the result.
+
+    All bookkeeping happens on the event loop thread, so no locks are
+    needed; only `score_fn` runs on a worker thread. Scoring tasks are
+    kept in `_tasks` until they finish, because the event loop only holds
+    weak references to tasks.
+    """
+
+    def __init__(self, score_fn, pool, max_batch_size=64, max_wait_ms=5.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+
+        self.score_fn = score_fn
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._rows = []
+        self._futures = []
+        self._timer = None
+        self._tasks = set()
+
+        self._batches = 0
+        self._rows_scored = 0
+        self._largest_batch = 0
+
+    async def submit(self, row):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self._rows.append(row)
+        self._futures.append(future)
+
+        if len(self._rows) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._rows:
+            return
+
+        rows, futures = self._rows, self._futures
+        self._rows, self._futures = [], []
+
+        self._batches += 1
+        self._rows_scored += len(rows)
+        self._largest_batch = max(self._largest_batch, len(rows))
+
+        task = asyncio.ensure_future(self._score(rows, futures))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, rows, futures):
+        try:
+            results = await self.pool.run(
+                self.score_fn, np.asarray(rows, dtype=np.float64)
+            )
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "waiting": len(self._rows),
+            "in_flight": len(self._tasks),
+            "batches": self._batches,
+            "rows_scored": self._rows_scored,
+            "avg_batch_size": round(self._rows_scored / self._batches, 2) if self._batches else 0.0,
+            "largest_batch": self._largest_batch
+        }
+
+
+def batcher_from_env(score_fn, pool, prefix="SENSOR_BATCH"):
+    """Build a batcher sized by <PREFIX>_MAX_SIZE / <PREFIX>_MAX_WAIT_MS."""
+    return MicroBatcher(
+        score_fn,
+        pool,
+        max_batch_size=int(os.getenv(f"{prefix}_MAX_SIZE", "64")),
+        max_wait_ms=float(os.getenv(f"{prefix}_MAX_WAIT_MS", "5"))
+    )
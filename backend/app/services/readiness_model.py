@@ -0,0 +1,158 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# Artifact locations
+# ============================================================
+BACKEND_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+ARTIFACT_DIR = os.getenv(
+    "READINESS_ARTIFACT_DIR",
+    os.path.join(BACKEND_DIR, "..", "ml-training", "artifacts")
+)
+
+MODEL_PATH = os.path.join(ARTIFACT_DIR, "pollination_readiness_model.joblib")
+ENCODER_PATH = os.path.join(ARTIFACT_DIR, "pollination_readiness_label_encoder.joblib")
+FOREST_PATH = os.path.join(ARTIFACT_DIR, "pollination_readiness_forest")
+
+# The compiled evaluator lives next to the training code
+ML_TRAINING_DIR = os.path.join(BACKEND_DIR, "..", "ml-training")
+
+# "auto" uses the compiled forest when exported, "sklearn" / "compiled" force one
+ENGINE = os.getenv("READINESS_ENGINE", "auto")
+
+FEATURE_COLS = [
+    "temperature",
+    "humidity",
+    "light_lux",
+    "soil_moisture"
+]
+
+
+class ReadinessModel:
+    """
+    Lazily loaded, process-wide handle on the readiness RandomForest and
+    its LabelEncoder.
+
+    Nothing is read at import time: the artifacts load on first use or
+    from `start_warmup()`, whichever comes first, and `status()` reports
+    whether the model is hot.
+
+    When the forest has been exported with `ml-training/readiness_forest.py`
+    it is served by the compiled NumPy evaluator instead of sklearn; both
+    expose `predict_proba` and `classes_`, and give identical results.
+    The compiled forest's .npy arrays are opened with `mmap_mode`, so they
+    are mapped from the page cache and shared between uvicorn workers.
+    The sklearn fallback gets no such sharing: its trees unpickle their
+    node arrays into private memory in every worker, `mmap_mode` or not.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, encoder_path=ENCODER_PATH,
+                 mmap_mode="r", forest_path=FOREST_PATH, engine=ENGINE):
+        self.model_path = model_path
+        self.encoder_path = encoder_path
+        self.mmap_mode = mmap_mode
+        self.forest_path = forest_path
+        self.engine = engine
+
+        self._lock = threading.Lock()
+        self._model = None
+        self._encoder = None
+        self._loading = False
+        self._error = None
+        self._load_seconds = None
+        self._engine_in_use = None
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    def load(self):
+        """Load the artifacts once; concurrent callers wait for the first."""
+        if self._model is not None:
+            return self._model, self._encoder
+
+        with self._lock:
+            if self._model is None:
+                self._loading = True
+                start = time.perf_counter()
+                try:
+                    encoder = joblib.load(self.encoder_path)
+                    model, engine = self._load_model()
+                except Exception as e:
+                    self._error = f"{type(e).__name__}: {e}"
+                    logger.exception("Failed to load readiness model")
+                    raise
+                finally:
+                    self._loading = False
+
+                self._encoder = encoder
+                self._model = model
+                self._engine_in_use = engine
+                self._error = None
+                self._load_seconds = time.perf_counter() - start
+                logger.info("Readiness model (%s) loaded in %.2fs",
+                            engine, self._load_seconds)
+
+        return self._model, self._encoder
+
+    def _load_model(self):
+        use_compiled = self.engine == "compiled" or (
+            self.engine == "auto" and os.path.isdir(self.forest_path)
+        )
+        if not use_compiled:
+            return joblib.load(self.model_path, mmap_mode=self.mmap_mode), "sklearn"
+
+        if ML_TRAINING_DIR not in sys.path:
+            sys.path.append(ML_TRAINING_DIR)
+        from readiness_forest import CompiledForest
+
+        return CompiledForest.load(self.forest_path, mmap_mode=self.mmap_mode), "compiled"
+
+    def start_warmup(self):
+        """Load in a background thread so startup does not block on it."""
+        def warmup():
+            try:
+                self.load()
+            except Exception:
+                pass  # recorded in status(); the next request retries
+
+        threading.Thread(target=warmup, name="readiness-warmup", daemon=True).start()
+
+    def score(self, X):
+        """
+        Vectorized scoring: one predict_proba call for the whole array.
+        The prediction is the argmax of the probabilities (exactly what
+        RandomForestClassifier.predict does internally) and the labels are
+        decoded with a single inverse_transform.
+        """
+        model, encoder = self.load()
+
+        probs = model.predict_proba(X)
+        best = probs.argmax(axis=1)
+        labels = encoder.inverse_transform(model.classes_[best])
+        confidence = probs[np.arange(len(best)), best]
+        return labels, confidence
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "loading": self._loading,
+            "error": self._error,
+            "load_seconds": self._load_seconds,
+            "engine": self._engine_in_use,
+            "mmap_mode": self.mmap_mode
+        }
+
+
+readiness_model = ReadinessModel()
@@ -0,0 +1,206 @@
+"""
+Decoders for bulk sensor uploads.
+
+Every format decodes straight into NumPy columns (no per-reading pydantic
+objects). Supported content types:
+
+    application/json        columnar: {"temperature": [...], "humidity": [...], ...}
+    application/x-ndjson    one {"temperature": ..., ...} object per line
+    application/msgpack     columnar map like JSON; a column may also be raw
+                            bytes of little-endian float32 values
+    application/octet-stream
+                            packed float32 records behind a 12-byte header:
+                            magic b"PSR1", uint16 version, uint16 field
+                            count (3 or 4, in READING_FIELDS order), uint32
+                            record count, all little-endian. Version 2
+                            puts an int64 epoch-millisecond timestamp per
+                            record between the header and the records.
+
+The JSON and MessagePack forms may also carry a "timestamp" column in
+epoch seconds; it is returned as int64 milliseconds under "timestamp_ms".
+"""
+
+import json
+import struct
+
+import numpy as np
+
+READING_FIELDS = ("temperature", "humidity", "light", "soil_moisture")
+REQUIRED_FIELDS = READING_FIELDS[:3]
+
+PACKED_MAGIC = b"PSR1"
+PACKED_HEADER = struct.Struct("<4sHHI")
+
+MAX_READINGS = 1_000_000
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def decode_readings(body, content_type):
+    """
+    Decode a bulk upload into float64 columns keyed by READING_FIELDS.
+    A missing soil_moisture column comes back as NaN. Raises ValueError
+    on malformed input and UnsupportedFormat for unknown content types.
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+
+    if media_type == "application/json":
+        columns = _decode_columnar(json.loads(body))
+    elif media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        columns = _decode_ndjson(body)
+    elif media_type in ("application/msgpack", "application/x-msgpack"):
+        columns = _decode_msgpack(body)
+    elif media_type == "application/octet-stream":
+        columns = _decode_packed(body)
+    else:
+        raise UnsupportedFormat(f"Unsupported content type: {content_type!r}")
+
+    return _finalize(columns)
+
+
+def encode_packed(readings, timestamps_ms=None):
+    """
+    Pack an (n, 3|4) array into the application/octet-stream format
+    (version 2 when timestamps are given).
+    """
+    readings = np.asarray(readings, dtype="<f4")
+    if readings.ndim != 2 or readings.shape[1] not in (3, 4):
+        raise ValueError("readings must have shape (n, 3) or (n, 4)")
+
+    version = 1 if timestamps_ms is None else 2
+    header = PACKED_HEADER.pack(PACKED_MAGIC, version, readings.shape[1], readings.shape[0])
+    body = np.ascontiguousarray(readings).tobytes()
+    if timestamps_ms is not None:
+        timestamps = np.asarray(timestamps_ms, dtype="<i8")
+        if timestamps.shape != (readings.shape[0],):
+            raise ValueError("timestamps_ms must have one entry per reading")
+        body = timestamps.tobytes() + body
+    return header + body
+
+
+def to_features(columns):
+    """Stack decoded columns into the model's (n, 4) feature matrix."""
+    return np.column_stack([columns[field] for field in READING_FIELDS])
+
+
+def _decode_columnar(obj):
+    if not isinstance(obj, dict):
+        raise ValueError("Columnar payload must be an object of arrays")
+    return {
+        field: _column(obj[field], field)
+        for field in READING_FIELDS + ("timestamp",) if obj.get(field) is not None
+    }
+
+
+def _decode_ndjson(body):
+    lines = [line for line in body.splitlines() if line.strip()]
+    if len(lines) > MAX_READINGS:
+        raise ValueError(f"At most {MAX_READINGS} readings per request")
+
+    n = len(lines)
+    fields = READING_FIELDS + ("timestamp",)
+    columns = {field: np.full(n, np.nan) for field in fields}
+    for i, line in enumerate(lines):
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {i + 1}: expected a JSON object")
+        for field in fields:
+            value = record.get(field)
+            if value is not None:
+                columns[field][i] = value
+
+    # Optional columns nobody sent are dropped rather than left all-NaN
+    for field in ("soil_moisture", "timestamp"):
+        if n and np.isnan(columns[field]).all():
+            del columns[field]
+    return columns
+
+
+def _decode_msgpack(body):
+    try:
+        import msgpack
+    except ImportError as e:
+        raise UnsupportedFormat("MessagePack uploads require the msgpack package") from e
+
+    obj = msgpack.unpackb(body, raw=False)
+    if not isinstance(obj, dict):
+        raise ValueError("MessagePack payload must be a map of columns")
+
+    columns = {}
+    for field in READING_FIELDS + ("timestamp",):
+        value = obj.get(field)
+        if value is None:
+            continue
+        if isinstance(value, (bytes, bytearray)):
+            if len(value) % 4:
+                raise ValueError(f"Column {field!r}: byte length not a multiple of 4")
+            columns[field] = np.frombuffer(value, dtype="<f4").astype(np.float64)
+        else:
+            columns[field] = _column(value, field)
+    return columns
+
+
+def _decode_packed(body):
+    if len(body) < PACKED_HEADER.size:
+        raise ValueError("Packed payload shorter than its header")
+
+    magic, version, n_fields, n_records = PACKED_HEADER.unpack_from(body)
+    if magic != PACKED_MAGIC or version not in (1, 2):
+        raise ValueError("Not a PSR1 v1/v2 packed payload")
+    if n_fields not in (3, 4):
+        raise ValueError("Packed payload must carry 3 or 4 fields per record")
+    if n_records > MAX_READINGS:
+        raise ValueError(f"At most {MAX_READINGS} readings per request")
+
+    timestamp_bytes = n_records * 8 if version == 2 else 0
+    expected = PACKED_HEADER.size + timestamp_bytes + n_records * n_fields * 4
+    if len(body) != expected:
+        raise ValueError(f"Packed payload is {len(body)} bytes, expected {expected}")
+
+    offset = PACKED_HEADER.size
+    records = np.frombuffer(body, dtype="<f4", offset=offset + timestamp_bytes)
+    records = records.reshape(n_records, n_fields).astype(np.float64)
+    columns = {field: records[:, i] for i, field in enumerate(READING_FIELDS[:n_fields])}
+
+    if version == 2:
+        timestamps = np.frombuffer(body, dtype="<i8", count=n_records, offset=offset)
+        columns["timestamp_ms"] = timestamps.astype(np.int64)
+    return columns
+
+
+def _column(values, field):
+    try:
+        column = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Column {field!r} must be an array of numbers") from e
+    if column.ndim != 1:
+        raise ValueError(f"Column {field!r} must be a flat array")
+    return column
+
+
+def _finalize(columns):
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        raise ValueError(f"Missing required fields: {missing}")
+
+    n = len(columns["temperature"])
+    if n > MAX_READINGS:
+        raise ValueError(f"At most {MAX_READINGS} readings per request")
+    if any(len(column) != n for column in columns.values()):
+        raise ValueError("All columns must have the same length")
+
+    if "soil_moisture" not in columns:
+        columns["soil_moisture"] = np.full(n, np.nan)
+
+    for field in REQUIRED_FIELDS:
+        if np.isnan(columns[field]).any():
+            raise ValueError(f"Field {field!r} has missing values")
+
+    seconds = columns.pop("timestamp", None)
+    if seconds is not None:
+        if np.isnan(seconds).any():
+            raise ValueError("Field 'timestamp' has missing values")
+        columns["timestamp_ms"] = np.round(seconds * 1000).astype(np.int64)
+    return columns
@@ -0,0 +1,335 @@
+"""
+Incrementally maintained rollup tiers over the sensor store.
+
+Every device keeps one dense, memory-mapped file per tier:
+
+    <root>/<device_id>/rollup-1m.bin
+    <root>/<device_id>/rollup-15m.bin
+    <root>/<device_id>/rollup-1h.bin
+    <root>/<device_id>/rollups.json     {"base_ms": ...}
+
+Row i of a tier covers [base_ms + i * width, base_ms + (i + 1) * width).
+base_ms is midnight UTC, so every tier's buckets line up with epoch
+multiples of its width and rows of different devices can be merged
+directly. A row holds, per reading field, the count, sum, min, max, last
+value (and its timestamp) and a fixed-range histogram; means, extrema and
+last values are exact, percentiles are interpolated from the histogram.
+
+Rows are updated in place as readings arrive, so queries read a slice of
+each tier instead of rescanning raw segments.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from app.services.sensor_codec import READING_FIELDS as VALUE_FIELDS
+
+TIERS = {
+    "1m": 60_000,
+    "15m": 900_000,
+    "1h": 3_600_000,
+}
+
+DAY_MS = 86_400_000
+
+HISTOGRAM_BINS = 32
+
+# Histogram range per field; values outside are counted in the edge bins
+HISTOGRAM_RANGES = np.array([
+    (0.0, 50.0),        # temperature (°C)
+    (0.0, 100.0),       # humidity (%)
+    (0.0, 20000.0),     # light (lux)
+    (0.0, 100.0),       # soil moisture (%)
+])
+
+N_FIELDS = len(VALUE_FIELDS)
+
+ROLLUP_DTYPE = np.dtype([
+    ("count", "<u4", (N_FIELDS,)),
+    ("sum", "<f8", (N_FIELDS,)),
+    ("min", "<f4", (N_FIELDS,)),
+    ("max", "<f4", (N_FIELDS,)),
+    ("last", "<f4", (N_FIELDS,)),
+    ("last_ts", "<i8", (N_FIELDS,)),
+    ("hist", "<u4", (N_FIELDS, HISTOGRAM_BINS)),
+])
+
+# Files grow a day of buckets at a time to keep remapping rare
+GROWTH_MS = DAY_MS
+
+AGGREGATES = ("count", "mean", "min", "max", "last")
+
+
+class DeviceRollups:
+    """Rollup tiers of one device; callers serialize access (store lock)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "rollups.json")
+        self.base_ms = None
+        self._maps = {}
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.base_ms = json.load(f)["base_ms"]
+
+    def tier_path(self, tier):
+        return os.path.join(self.directory, f"rollup-{tier}.bin")
+
+    def add(self, records):
+        """Fold a block of raw records into every tier."""
+        if len(records) == 0:
+            return
+
+        ts = records["timestamp"]
+        first_day = int(ts.min()) // DAY_MS * DAY_MS
+        if self.base_ms is None:
+            self._set_base(first_day)
+        elif first_day < self.base_ms:
+            self._rebase(first_day)
+
+        values = np.column_stack(
+            [records[field].astype(np.float64) for field in VALUE_FIELDS]
+        )
+        for tier, width in TIERS.items():
+            self._add_to_tier(tier, width, ts, values)
+
+    def rows(self, tier, start_bucket, stop_bucket):
+        """
+        Rows for global bucket numbers [start, stop) (bucket = ts // width),
+        as a view of the tier file, plus the global bucket of its first row.
+        """
+        if self.base_ms is None:
+            return None, start_bucket
+
+        base_bucket = self.base_ms // TIERS[tier]
+        mm = self._map(tier)
+        if mm is None:
+            return None, start_bucket
+
+        lo = max(start_bucket - base_bucket, 0)
+        hi = min(stop_bucket - base_bucket, len(mm))
+        if hi <= lo:
+            return None, start_bucket
+        return mm[lo:hi], base_bucket + lo
+
+    def rebuild(self, segments):
+        """Recompute every tier from raw segments (recovery after a crash)."""
+        self._close()
+        for tier in TIERS:
+            if os.path.exists(self.tier_path(tier)):
+                os.remove(self.tier_path(tier))
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+        self.base_ms = None
+
+        for records in segments:
+            self.add(records)
+
+    def _add_to_tier(self, tier, width, ts, values):
+        rows = (ts - self.base_ms) // width
+        mm = self._map(tier, min_rows=int(rows.max()) + 1)
+
+        # Reduce the block per bucket (usually a single bucket)
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        n_rows = len(unique_rows)
+        valid = ~np.isnan(values)
+
+        count = np.zeros((n_rows, N_FIELDS), dtype=np.int64)
+        total = np.zeros((n_rows, N_FIELDS))
+        low = np.full((n_rows, N_FIELDS), np.inf)
+        high = np.full((n_rows, N_FIELDS), -np.inf)
+        last = np.zeros((n_rows, N_FIELDS))
+        last_ts = np.full((n_rows, N_FIELDS), np.iinfo(np.int64).min)
+        hist = np.zeros((n_rows, N_FIELDS, HISTOGRAM_BINS), dtype=np.int64)
+
+        for f in range(N_FIELDS):
+            ok = valid[:, f]
+            if not ok.any():
+                continue
+            r, v, t = inverse[ok], values[ok, f], ts[ok]
+
+            count[:, f] = np.bincount(r, minlength=n_rows)
+            total[:, f] = np.bincount(r, weights=v, minlength=n_rows)
+            np.minimum.at(low[:, f], r, v)
+            np.maximum.at(high[:, f], r, v)
+
+            # Last value per bucket: final element after sorting by (row, ts)
+            order = np.lexsort((t, r))
+            ends = np.flatnonzero(np.r_[r[order][1:] != r[order][:-1], True])
+            last[r[order][ends], f] = v[order][ends]
+            last_ts[r[order][ends], f] = t[order][ends]
+
+            lo, hi = HISTOGRAM_RANGES[f]
+            bins = ((v - lo) / (hi - lo) * HISTOGRAM_BINS).astype(np.int64)
+            np.clip(bins, 0, HISTOGRAM_BINS - 1, out=bins)
+            np.add.at(hist[:, f], (r, bins), 1)
+
+        # Merge into the stored rows
+        stored = mm[unique_rows]
+        empty = stored["count"] == 0
+        newer = last_ts >= stored["last_ts"]
+        has_new = count > 0
+
+        stored["min"] = np.where(empty, low, np.minimum(stored["min"], low))
+        stored["max"] = np.where(empty, high, np.maximum(stored["max"], high))
+        stored["last"] = np.where(has_new & (empty | newer), last, stored["last"])
+        stored["last_ts"] = np.where(has_new & (empty | newer), last_ts, stored["last_ts"])
+        stored["count"] += count.astype(np.uint32)
+        stored["sum"] += total
+        stored["hist"] += hist.astype(np.uint32)
+
+        mm[unique_rows] = stored
+
+    def _map(self, tier, min_rows=0):
+        mm = self._maps.get(tier)
+        path = self.tier_path(tier)
+
+        if mm is None or len(mm) < min_rows:
+            if mm is not None:
+                mm.flush()
+            size = os.path.getsize(path) // ROLLUP_DTYPE.itemsize if os.path.exists(path) else 0
+            if size < min_rows:
+                # Zero rows are empty buckets; grown files are sparse on disk
+                grow = GROWTH_MS // TIERS[tier]
+                size = -(-min_rows // grow) * grow
+                with open(path, "ab") as f:
+                    f.truncate(size * ROLLUP_DTYPE.itemsize)
+            if size == 0:
+                return None
+            mm = np.memmap(path, dtype=ROLLUP_DTYPE, mode="r+", shape=(size,))
+            self._maps[tier] = mm
+        return mm
+
+    def _set_base(self, base_ms):
+        self.base_ms = base_ms
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"base_ms": base_ms}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _rebase(self, base_ms):
+        """Backfill before base_ms: prepend empty rows to every tier."""
+        self._close()
+        for tier, width in TIERS.items():
+            path = self.tier_path(tier)
+            if not os.path.exists(path):
+                continue
+            pad = (self.base_ms - base_ms) // width
+            tmp_path = path + ".tmp"
+            with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+                dst.truncate(pad * ROLLUP_DTYPE.itemsize)
+                dst.seek(0, os.SEEK_END)
+                while True:
+                    chunk = src.read(1 << 24)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            os.replace(tmp_path, path)
+        self._set_base(base_ms)
+
+    def _close(self):
+        for mm in self._maps.values():
+            mm.flush()
+        self._maps = {}
+
+
+def merge_rows(parts, n_buckets):
+    """
+    Merge (rows, offset) slices of several devices onto one grid of
+    n_buckets rows; offset is the row of the grid where a slice starts.
+    """
+    merged = np.zeros(n_buckets, dtype=ROLLUP_DTYPE)
+    merged["min"] = np.inf
+    merged["max"] = -np.inf
+    merged["last_ts"] = np.iinfo(np.int64).min
+
+    for rows, offset in parts:
+        target = merged[offset:offset + len(rows)]   # view, updated in place
+        has = rows["count"] > 0
+        newer = has & (rows["last_ts"] > target["last_ts"])
+
+        target["count"] += rows["count"]
+        target["sum"] += rows["sum"]
+        target["min"] = np.where(has, np.minimum(target["min"], rows["min"]), target["min"])
+        target["max"] = np.where(has, np.maximum(target["max"], rows["max"]), target["max"])
+        target["last"] = np.where(newer, rows["last"], target["last"])
+        target["last_ts"] = np.where(newer, rows["last_ts"], target["last_ts"])
+        target["hist"] += rows["hist"]
+
+    return merged
+
+
+def coarsen(rows, factor):
+    """Combine every `factor` consecutive rows (e.g. 1h rows into 6h)."""
+    if factor == 1:
+        return rows
+    n = len(rows) // factor
+    grouped = rows[:n * factor].reshape(n, factor)
+
+    out = np.zeros(n, dtype=ROLLUP_DTYPE)
+    has = grouped["count"] > 0
+    out["count"] = grouped["count"].sum(axis=1)
+    out["sum"] = grouped["sum"].sum(axis=1)
+    out["min"] = np.where(has, grouped["min"], np.inf).min(axis=1)
+    out["max"] = np.where(has, grouped["max"], -np.inf).max(axis=1)
+    latest = np.where(has, grouped["last_ts"], np.iinfo(np.int64).min).argmax(axis=1)
+    pick = np.arange(n)[:, None], latest, np.arange(N_FIELDS)[None, :]
+    out["last"] = grouped["last"][pick]
+    out["last_ts"] = grouped["last_ts"][pick]
+    out["hist"] = grouped["hist"].sum(axis=1)
+    return out
+
+
+def summarize(rows, aggregates, percentiles=()):
+    """
+    Vectorized aggregates per bucket and field. Returns {field: {agg:
+    array}}, with NaN where a bucket has no readings.
+    """
+    count = rows["count"].astype(np.float64)
+    empty = count == 0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        computed = {
+            "count": rows["count"].astype(np.int64),
+            "mean": np.where(empty, np.nan, rows["sum"] / count),
+            "min": np.where(empty, np.nan, rows["min"]),
+            "max": np.where(empty, np.nan, rows["max"]),
+            "last": np.where(empty, np.nan, rows["last"]),
+        }
+        if len(percentiles):
+            hist = rows["hist"].astype(np.float32)            # (n, fields, bins)
+            cumulative = np.cumsum(hist, axis=2)
+            for q in percentiles:
+                computed[f"p{q:g}"] = _histogram_percentile(
+                    rows, hist, cumulative, q, empty
+                )
+
+    keys = list(aggregates) + [f"p{q:g}" for q in percentiles]
+    return {
+        field: {key: computed[key][:, f] for key in keys}
+        for f, field in enumerate(VALUE_FIELDS)
+    }
+
+
+def _histogram_percentile(rows, hist, cumulative, q, empty):
+    target = cumulative[:, :, -1] * (q / 100.0)
+
+    # First bin whose cumulative count reaches the target rank
+    index = (cumulative < target[:, :, None]).sum(axis=2)
+    index = np.minimum(index, HISTOGRAM_BINS - 1)
+
+    before = np.take_along_axis(cumulative, index[:, :, None], axis=2)[:, :, 0]
+    in_bin = np.take_along_axis(hist, index[:, :, None], axis=2)[:, :, 0]
+    before = before - in_bin
+    fraction = np.where(in_bin > 0, (target - before) / np.maximum(in_bin, 1), 0.5)
+
+    lo = HISTOGRAM_RANGES[:, 0]
+    width = (HISTOGRAM_RANGES[:, 1] - lo) / HISTOGRAM_BINS
+    value = lo + (index + fraction) * width
+
+    # Exact extrema bound the estimate (covers values outside the range)
+    value = np.clip(value, rows["min"], rows["max"])
+    return np.where(empty, np.nan, value)
@@ -0,0 +1,477 @@
+"""
+Append-only columnar time-series store for sensor readings.
+
+Layout (one directory per device):
+
+    <root>/<device_id>/seg-000000.bin   fixed-width RECORD_DTYPE records
+    <root>/<device_id>/seg-000001.bin   (a new segment every SEGMENT_RECORDS)
+    <root>/<device_id>/index.json       min/max index of the sealed segments
+    <root>/<device_id>/rollup-*.bin     1m / 15m / 1h rollup tiers
+    <root>/zones.json                   field zone -> device ids
+
+Segments are only ever appended to, and read back through np.memmap, so
+time-range queries return zero-copy views into the page cache. Each
+segment carries a min/max index (timestamp and every reading field) used
+to skip segments outside a query. The active segment's stats live in
+memory and are rebuilt from its file on startup, so a crash loses nothing
+that reached the file. A record torn by a crash mid-write is cut off the
+end of the active segment on startup, so later appends stay aligned.
+
+Appends also update the rollup tiers (see app.services.sensor_rollups),
+which serve windowed aggregates per device or field zone without
+rescanning raw segments. A block lands in the segment, its stats and the
+rollups together: if the rollup update fails the block is cut off the
+segment again.
+
+Timestamps outside [STORE_ORIGIN_MS, now + MAX_FUTURE_MS] are rejected
+before anything is written: a reading in 1970 (epoch seconds sent as
+milliseconds) or far in the future would size the dense rollup tiers
+for the whole span.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from app.services import sensor_rollups
+from app.services.sensor_rollups import DeviceRollups, TIERS
+
+logger = logging.getLogger(__name__)
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"),       # milliseconds since the epoch (UTC)
+    ("device_id", "S16"),
+    ("temperature", "<f4"),
+    ("humidity", "<f4"),
+    ("light", "<f4"),
+    ("soil_moisture", "<f4"),
+])
+
+VALUE_FIELDS = ("temperature", "humidity", "light", "soil_moisture")
+
+SEGMENT_RECORDS = 1 << 20
+
+DEVICE_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,15}$")
+ZONE_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,31}$")
+
+BUCKET_PATTERN = re.compile(r"^(\d+)([mhd])$")
+BUCKET_UNITS_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000}
+
+MAX_AGGREGATE_BUCKETS = 100_000
+
+# Accepted timestamp window: from 2020-01-01 UTC to a week past the
+# server clock (allows for device clock skew)
+STORE_ORIGIN_MS = 1_577_836_800_000
+MAX_FUTURE_MS = 7 * 86_400_000
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def _empty_stats():
+    return {"count": 0, "sorted": True, "min": {}, "max": {}}
+
+
+def _merge_stats(stats, records):
+    """Fold a block of records into a segment's min/max index."""
+    if len(records) == 0:
+        return stats
+
+    ts = records["timestamp"]
+    if stats["count"] and ts[0] < stats["max"]["timestamp"]:
+        stats["sorted"] = False
+    if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+        stats["sorted"] = False
+
+    for field in ("timestamp",) + VALUE_FIELDS:
+        column = records[field]
+        if field != "timestamp":
+            column = column[~np.isnan(column)]
+            if len(column) == 0:
+                continue
+        lo, hi = column.min().item(), column.max().item()
+        stats["min"][field] = min(stats["min"].get(field, lo), lo)
+        stats["max"][field] = max(stats["max"].get(field, hi), hi)
+
+    stats["count"] += len(records)
+    return stats
+
+
+class DeviceLog:
+    """Segments of one device; all mutation happens under the store lock."""
+
+    def __init__(self, directory, device_id):
+        self.directory = directory
+        self.device_id = device_id
+        os.makedirs(directory, exist_ok=True)
+
+        self.sealed = self._read_index()
+        self.active_number = len(self.sealed)
+        self.active = _empty_stats()
+
+        path = self.segment_path(self.active_number)
+        if os.path.exists(path):
+            self._truncate_torn_tail(path)
+            records = self._map(path)
+            if records is not None:
+                _merge_stats(self.active, records)
+
+        self.rollups = DeviceRollups(directory)
+        if self.rollups.base_ms is None and (self.sealed or self.active["count"]):
+            # Data written before rollups existed
+            self.rollups.rebuild(records for _, records in self.segments())
+
+    def segment_path(self, number):
+        return os.path.join(self.directory, f"seg-{number:06d}.bin")
+
+    def append(self, records):
+        while len(records):
+            room = SEGMENT_RECORDS - self.active["count"]
+            block, records = records[:room], records[room:]
+
+            path = self.segment_path(self.active_number)
+            with open(path, "ab") as f:
+                f.write(block.tobytes())
+            try:
+                self.rollups.add(block)
+            except Exception:
+                self._rollback(path)
+                raise
+            _merge_stats(self.active, block)
+
+            if self.active["count"] >= SEGMENT_RECORDS:
+                self._seal()
+
+    def segments(self, start_ms=None, end_ms=None):
+        """Yield (stats, memmap) for segments overlapping [start, end)."""
+        candidates = [
+            (dict(stats, number=i), self.segment_path(i))
+            for i, stats in enumerate(self.sealed)
+        ]
+        if self.active["count"]:
+            candidates.append((dict(self.active, number=self.active_number),
+                               self.segment_path(self.active_number)))
+
+        for stats, path in candidates:
+            if start_ms is not None and stats["max"]["timestamp"] < start_ms:
+                continue
+            if end_ms is not None and stats["min"]["timestamp"] >= end_ms:
+                continue
+            # Map only the records the index knows about; a concurrent
+            # append may already have grown the file further
+            records = self._map(path, stats["count"])
+            if records is not None:
+                yield stats, records
+
+    def _rollback(self, path):
+        # Drop the block from the segment so raw data and rollups agree;
+        # a partly updated rollup tier is recomputed from the segments
+        with open(path, "r+b") as f:
+            f.truncate(self.active["count"] * RECORD_DTYPE.itemsize)
+        try:
+            self.rollups.rebuild(records for _, records in self.segments())
+        except Exception:
+            logger.exception("Failed to rebuild rollups of %s", self.device_id)
+
+    def _truncate_torn_tail(self, path):
+        # A crash mid-write leaves a partial record at the end; appending
+        # after it would misalign every later record
+        size = os.path.getsize(path)
+        torn = size % RECORD_DTYPE.itemsize
+        if torn:
+            logger.warning("Dropping %d bytes of a torn record at the end of %s",
+                           torn, path)
+            with open(path, "r+b") as f:
+                f.truncate(size - torn)
+
+    def _seal(self):
+        self.sealed.append(self.active)
+        self._write_index()
+        self.active_number += 1
+        self.active = _empty_stats()
+
+    def _map(self, path, count=None):
+        available = os.path.getsize(path) // RECORD_DTYPE.itemsize
+        count = available if count is None else min(count, available)
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+    def _read_index(self):
+        path = os.path.join(self.directory, "index.json")
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)["segments"]
+
+    def _write_index(self):
+        path = os.path.join(self.directory, "index.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segments": self.sealed}, f)
+        os.replace(tmp_path, path)
+
+
+class SensorStore:
+    """
+    Usage:
+        store = SensorStore("data/sensors")
+        store.append("drone_001", timestamps_ms, temperature, humidity, light, soil)
+        for view in store.query("drone_001", start_ms, end_ms):
+            view["temperature"].mean()
+    """
+
+    def __init__(self, root, origin_ms=STORE_ORIGIN_MS, max_future_ms=MAX_FUTURE_MS):
+        self.root = root
+        self.origin_ms = origin_ms
+        self.max_future_ms = max_future_ms
+        self._lock = threading.Lock()
+        self._devices = {}
+        os.makedirs(root, exist_ok=True)
+        self._zones = self._read_zones()
+
+    def devices(self):
+        return sorted(
+            name for name in os.listdir(self.root)
+            if DEVICE_ID_PATTERN.match(name)
+            and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def append(self, device_id, timestamp_ms, temperature, humidity, light,
+               soil_moisture=None):
+        """Append readings (scalars or equal-length arrays); returns the count."""
+        temperature = np.atleast_1d(np.asarray(temperature, dtype=np.float32))
+        n = len(temperature)
+
+        records = np.empty(n, dtype=RECORD_DTYPE)
+        records["timestamp"] = np.broadcast_to(self._check_timestamps(timestamp_ms), n)
+        records["device_id"] = self._check_device(device_id).encode()
+        records["temperature"] = temperature
+        records["humidity"] = humidity
+        records["light"] = light
+        records["soil_moisture"] = np.nan if soil_moisture is None else soil_moisture
+
+        with self._lock:
+            self._log(device_id).append(records)
+        return n
+
+    def query(self, device_id, start_ms=None, end_ms=None):
+        """
+        Records of one device in [start_ms, end_ms), as a list of views
+        (one per segment, oldest first). Segments written in time order
+        are sliced with searchsorted, so no data is copied.
+        """
+        with self._lock:
+            if not self._exists(device_id):
+                return []
+            segments = list(self._log(device_id).segments(start_ms, end_ms))
+
+        views = []
+        for stats, records in segments:
+            ts = records["timestamp"]
+            if stats["sorted"]:
+                lo = 0 if start_ms is None else np.searchsorted(ts, start_ms, side="left")
+                hi = len(ts) if end_ms is None else np.searchsorted(ts, end_ms, side="left")
+                view = records[lo:hi]
+            else:
+                mask = np.ones(len(ts), dtype=bool)
+                if start_ms is not None:
+                    mask &= ts >= start_ms
+                if end_ms is not None:
+                    mask &= ts < end_ms
+                view = records[mask]
+            if len(view):
+                views.append(view)
+        return views
+
+    def read(self, device_id, start_ms=None, end_ms=None):
+        """Like query(), concatenated into one array (copies)."""
+        views = self.query(device_id, start_ms, end_ms)
+        if not views:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return views[0] if len(views) == 1 else np.concatenate(views)
+
+    def downsample(self, device_id, start_ms, end_ms, every_ms, fields=VALUE_FIELDS):
+        """
+        Mean of each field over fixed buckets of `every_ms`, aligned to
+        `start_ms`. Returns bucket start times and per-field means (NaN
+        for empty buckets), computed with bincount over the segment views.
+        """
+        if every_ms <= 0:
+            raise ValueError("every_ms must be positive")
+        n_buckets = int(-(-(end_ms - start_ms) // every_ms))
+        if n_buckets <= 0:
+            raise ValueError("end must be after start")
+
+        sums = {field: np.zeros(n_buckets) for field in fields}
+        counts = {field: np.zeros(n_buckets) for field in fields}
+
+        for view in self.query(device_id, start_ms, end_ms):
+            bucket = (view["timestamp"] - start_ms) // every_ms
+            for field in fields:
+                values = view[field].astype(np.float64)
+                valid = ~np.isnan(values)
+                sums[field] += np.bincount(bucket[valid], weights=values[valid],
+                                           minlength=n_buckets)
+                counts[field] += np.bincount(bucket[valid], minlength=n_buckets)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = {field: sums[field] / counts[field] for field in fields}
+
+        buckets = start_ms + np.arange(n_buckets, dtype=np.int64) * every_ms
+        return buckets, means
+
+    def assign_zone(self, device_id, zone):
+        """Record that a device belongs to a field zone (idempotent)."""
+        self._check_device(device_id)
+        if not ZONE_PATTERN.match(zone or ""):
+            raise ValueError(
+                "zone must be 1-32 letters, digits, '_', '-' or '.', "
+                "starting with a letter or digit"
+            )
+
+        with self._lock:
+            members = self._zones.setdefault(zone, [])
+            if device_id not in members:
+                members.append(device_id)
+                members.sort()
+                self._write_zones()
+
+    def zones(self):
+        with self._lock:
+            return {zone: list(members) for zone, members in sorted(self._zones.items())}
+
+    def zone_devices(self, zone):
+        with self._lock:
+            return list(self._zones.get(zone, ()))
+
+    def aggregate(self, device_ids, start_ms, end_ms, bucket="1m",
+                  aggregates=sensor_rollups.AGGREGATES, percentiles=()):
+        """
+        Windowed aggregates over the rollup tiers, merged across
+        `device_ids` (one device or every device of a zone).
+
+        `bucket` is "<n>m", "<n>h" or "<n>d" and is served from the
+        coarsest tier that divides it. Buckets are aligned to epoch
+        multiples of the bucket width. Returns bucket start times and
+        {field: {aggregate: array}}; means, extrema, counts and last
+        values are exact, percentiles are histogram estimates.
+        """
+        every_ms, tier = self._parse_bucket(bucket)
+        unknown = set(aggregates) - set(sensor_rollups.AGGREGATES)
+        if unknown:
+            raise ValueError(f"Unknown aggregates: {sorted(unknown)}")
+        if any(not 0 <= q <= 100 for q in percentiles):
+            raise ValueError("percentiles must be between 0 and 100")
+
+        first = start_ms // every_ms
+        stop = -(-end_ms // every_ms)
+        n_buckets = stop - first
+        if n_buckets <= 0:
+            raise ValueError("end must be after start")
+        if n_buckets > MAX_AGGREGATE_BUCKETS:
+            raise ValueError(
+                f"At most {MAX_AGGREGATE_BUCKETS} buckets per query; use a larger bucket"
+            )
+
+        factor = every_ms // TIERS[tier]
+        parts = []
+        with self._lock:
+            for device_id in device_ids:
+                if not self._exists(device_id):
+                    continue
+                rows, row_bucket = self._log(device_id).rollups.rows(
+                    tier, first * factor, stop * factor
+                )
+                if rows is not None:
+                    parts.append((rows, row_bucket - first * factor))
+            # Merge under the lock so concurrent appends cannot tear rows
+            merged = sensor_rollups.merge_rows(parts, n_buckets * factor)
+
+        merged = sensor_rollups.coarsen(merged, factor)
+        buckets = (first + np.arange(n_buckets, dtype=np.int64)) * every_ms
+        return buckets, sensor_rollups.summarize(merged, aggregates, percentiles)
+
+    def rebuild_rollups(self, device_id):
+        """Recompute a device's rollup tiers from its raw segments."""
+        with self._lock:
+            log = self._log(device_id)
+            log.rollups.rebuild(records for _, records in log.segments())
+
+    def segment_index(self, device_id):
+        with self._lock:
+            if not self._exists(device_id):
+                return []
+            log = self._log(device_id)
+            index = [dict(stats, number=i) for i, stats in enumerate(log.sealed)]
+            if log.active["count"]:
+                index.append(dict(log.active, number=log.active_number))
+            return index
+
+    def _exists(self, device_id):
+        return device_id in self._devices or os.path.isdir(
+            os.path.join(self.root, self._check_device(device_id))
+        )
+
+    def _log(self, device_id):
+        log = self._devices.get(device_id)
+        if log is None:
+            directory = os.path.join(self.root, self._check_device(device_id))
+            log = self._devices[device_id] = DeviceLog(directory, device_id)
+        return log
+
+    def _read_zones(self):
+        path = os.path.join(self.root, "zones.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_zones(self):
+        path = os.path.join(self.root, "zones.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._zones, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _parse_bucket(bucket):
+        match = BUCKET_PATTERN.match(bucket or "")
+        if not match or int(match.group(1)) == 0:
+            raise ValueError("bucket must look like '1m', '15m', '1h' or '1d'")
+        every_ms = int(match.group(1)) * BUCKET_UNITS_MS[match.group(2)]
+
+        # Coarsest tier whose width divides the bucket
+        for tier, width in sorted(TIERS.items(), key=lambda item: -item[1]):
+            if every_ms % width == 0:
+                return every_ms, tier
+        raise ValueError("bucket must be a whole number of minutes")
+
+    def _check_timestamps(self, timestamp_ms):
+        try:
+            ts = np.asarray(timestamp_ms, dtype=np.int64)
+        except (OverflowError, TypeError, ValueError) as e:
+            raise ValueError("timestamp must be a number") from e
+
+        latest = now_ms() + self.max_future_ms
+        if ts.size and (ts.min() < self.origin_ms or ts.max() > latest):
+            raise ValueError(
+                f"timestamp out of range: must be epoch time between "
+                f"{self.origin_ms / 1000:.0f} and {latest / 1000:.0f} (seconds)"
+            )
+        return ts
+
+    @staticmethod
+    def _check_device(device_id):
+        if not DEVICE_ID_PATTERN.match(device_id or ""):
+            raise ValueError(
+                "device_id must be 1-16 letters, digits, '_', '-' or '.', "
+                "starting with a letter or digit"
+            )
+        return device_id
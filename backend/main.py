@@ -1,31 +1,35 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Query, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 import pandas as pd
+import json
 import numpy as np
-import joblib
 import os
 
+from app.services.inference_pool import pool_from_env
+from app.services.readiness_model import readiness_model, FEATURE_COLS
+
 # ============================================================
 # Create app
 # ============================================================
 app = FastAPI(title="Pollination Readiness API")
 
 # ============================================================
-# Load ML artifacts
+# ML artifacts (loaded lazily, warmed up in the background)
 # ============================================================
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+@app.on_event("startup")
+def warmup_readiness_model():
+    if os.getenv("READINESS_WARMUP", "1") != "0":
+        readiness_model.start_warmup()
 
-MODEL_PATH = os.path.join(
-    BASE_DIR, "..", "ml-training", "artifacts",
-    "pollination_readiness_model.joblib"
-)
+# ============================================================
+# Inference worker pool (keeps CPU-bound work off the event loop)
+# ============================================================
+inference_pool = pool_from_env()
 
-ENCODER_PATH = os.path.join(
-    BASE_DIR, "..", "ml-training", "artifacts",
-    "pollination_readiness_label_encoder.joblib"
-)
 
-model = joblib.load(MODEL_PATH)
-encoder = joblib.load(ENCODER_PATH)
+@app.on_event("shutdown")
+def shutdown_inference_pool():
+    inference_pool.shutdown()
 
 # ============================================================
 # Health check (VERY IMPORTANT)
@@ -34,40 +38,175 @@ encoder = joblib.load(ENCODER_PATH)
 def root():
     return {"status": "API running"}
 
+
+@app.get("/ready")
+def ready():
+    # 503 until the model is hot, so load balancers hold traffic back
+    status = readiness_model.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/inference/stats")
+def inference_stats():
+    return inference_pool.stats()
+
 # ============================================================
 # CSV prediction endpoint
 # ============================================================
-@app.post("/predict/csv")
-async def predict_csv(file: UploadFile = File(...)):
-    df = pd.read_csv(file.file)
+def score_features(X: np.ndarray):
+    return readiness_model.score(X)
+
+
+# Empty, malformed or non-numeric uploads are client errors, not 500s
+CSV_ERRORS = (pd.errors.EmptyDataError, pd.errors.ParserError, ValueError)
 
-    feature_cols = [
-        "temperature",
-        "humidity",
-        "light_lux",
-        "soil_moisture"
-    ]
 
-    missing = set(feature_cols) - set(df.columns)
+def invalid_csv(error):
+    return HTTPException(status_code=400, detail=f"Invalid CSV: {error}")
+
+
+def score_csv(fileobj):
+    df = pd.read_csv(fileobj)
+
+    missing = set(FEATURE_COLS) - set(df.columns)
     if missing:
         return {
             "error": "Missing required columns",
             "missing_columns": list(missing)
         }
 
-    X = df[feature_cols].values
-    preds = model.predict(X)
-    probs = model.predict_proba(X)
+    X = df[FEATURE_COLS].to_numpy(dtype=np.float64)
+    labels, confidence = score_features(X)
 
-    results = []
-    for i, pred in enumerate(preds):
-        results.append({
-            "row": i,
-            "prediction": encoder.inverse_transform([pred])[0],
-            "confidence": float(np.max(probs[i]))
-        })
+    # Build the response column-wise: convert each column to Python
+    # objects once, then zip them into rows
+    rows = range(len(labels))
+    results = [
+        {"row": i, "prediction": p, "confidence": c}
+        for i, p, c in zip(rows, labels.tolist(), confidence.tolist())
+    ]
 
     return {
         "rows_processed": len(results),
         "results": results
     }
+
+
+@app.post("/predict/csv")
+async def predict_csv(file: UploadFile = File(...)):
+    # Parsing and scoring run on the inference pool, not the event loop
+    try:
+        return await inference_pool.run(score_csv, file.file)
+    except CSV_ERRORS as e:
+        raise invalid_csv(e)
+
+
+# ============================================================
+# Streaming CSV prediction endpoint (large uploads)
+# ============================================================
+FEATURE_DTYPES = {col: np.float32 for col in FEATURE_COLS}
+
+
+def encode_scored_chunk(chunk, offset, fmt):
+    labels, confidence = score_features(chunk[FEATURE_COLS].to_numpy())
+    rows = range(offset, offset + len(labels))
+
+    if fmt == "csv":
+        return "".join(
+            f"{i},{p},{c}\n"
+            for i, p, c in zip(rows, labels.tolist(), confidence.tolist())
+        )
+    return "".join(
+        json.dumps({"row": i, "prediction": p, "confidence": c}) + "\n"
+        for i, p, c in zip(rows, labels.tolist(), confidence.tolist())
+    )
+
+
+def score_next_chunk(reader, chunk, offset, fmt):
+    """
+    Score one chunk and read the next, all on a pool worker. A bad next
+    chunk is returned instead of raised, so the rows already scored are
+    still sent before the stream reports it.
+    """
+    text = encode_scored_chunk(chunk, offset, fmt)
+    try:
+        return text, len(chunk), next(reader, None), None
+    except CSV_ERRORS as e:
+        return text, len(chunk), None, e
+
+
+def encode_stream_error(error, row, fmt):
+    # The status line is long gone mid-stream, so the error ends the body
+    message = " ".join(f"Invalid CSV: {error}".split())
+    if fmt == "csv":
+        return f"# error at row {row}: {message}\n"
+    return json.dumps({"error": message, "row": row}) + "\n"
+
+
+async def iter_scored_chunks(reader, first_chunk, fmt):
+    """
+    Score an already-open chunked CSV reader and yield encoded output
+    chunk by chunk, so only one chunk is ever held in memory. Each chunk
+    is parsed and scored on the inference pool.
+
+    If a later chunk turns out to be invalid, the stream ends with an
+    error record (ndjson) or a '#' comment line (csv) naming the first
+    row that was not scored, rather than being cut off.
+    """
+    if fmt == "csv":
+        yield "row,prediction,confidence\n"
+
+    offset = 0
+    chunk = first_chunk
+    while chunk is not None:
+        try:
+            text, n_rows, chunk, error = await inference_pool.run(
+                score_next_chunk, reader, chunk, offset, fmt
+            )
+        except CSV_ERRORS as e:
+            text, n_rows, chunk, error = "", 0, None, e
+        offset += n_rows
+        yield text
+        if error is not None:
+            yield encode_stream_error(error, offset, fmt)
+
+
+def open_chunked_csv(fileobj, chunk_size):
+    # Only the feature columns are parsed, with float dtype hints
+    reader = pd.read_csv(
+        fileobj,
+        usecols=lambda col: col in FEATURE_DTYPES,
+        dtype=FEATURE_DTYPES, # type: ignore
+        chunksize=chunk_size
+    )
+    return reader, next(reader, None)
+
+
+@app.post("/predict/csv/stream")
+async def predict_csv_stream(
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    chunk_size: int = Query(50_000, ge=1, le=1_000_000)
+):
+    # The first chunk is parsed before the response starts, so bad input
+    # still gets a 400 instead of failing inside the stream
+    try:
+        reader, first_chunk = await inference_pool.run(
+            open_chunked_csv, file.file, chunk_size
+        )
+    except CSV_ERRORS as e:
+        raise invalid_csv(e)
+
+    columns = set(first_chunk.columns) if first_chunk is not None else set()
+    missing = set(FEATURE_COLS) - columns
+    if missing:
+        return {
+            "error": "Missing required columns",
+            "missing_columns": list(missing)
+        }
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        iter_scored_chunks(reader, first_chunk, format),
+        media_type=media_type
+    )
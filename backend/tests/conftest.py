@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests import the app the way uvicorn does, from the backend directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("READINESS_WARMUP", "0")
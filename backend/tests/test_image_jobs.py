@@ -0,0 +1,101 @@
+import itertools
+import threading
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from app.services.image_jobs import ImageJobQueue
+
+IMAGE = np.zeros((8, 8, 3), dtype=np.uint8)
+
+
+class FakePipeline:
+    """No flowers in any frame; records the size of every batch"""
+
+    def __init__(self):
+        self.batches = []
+
+    def process_frames(self, images):
+        self.batches.append(len(images))
+        return [([], None) for _ in images]
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(factory, workers=1):
+        jobs = ImageJobQueue(factory, workers=workers, max_wait_ms=1.0)
+        queues.append(jobs)
+        return jobs
+
+    yield make
+    for jobs in queues:
+        jobs.stop()
+
+
+def test_submit_without_workers_is_rejected(make_queue):
+    jobs = make_queue(FakePipeline)
+    with pytest.raises(HTTPException) as e:
+        jobs.submit(IMAGE, "frame.jpg")
+    assert e.value.status_code == 503
+    assert jobs.stats()["queued"] == 0
+
+
+def test_jobs_are_processed(make_queue):
+    pipeline = FakePipeline()
+    jobs = make_queue(lambda: pipeline)
+    jobs.start()
+
+    submitted = [jobs.submit(IMAGE, f"frame_{i}.jpg") for i in range(5)]
+    for job in submitted:
+        assert job.done.wait(5)
+        assert job.to_dict()["flower_count"] == 0
+    assert sum(pipeline.batches) == 5
+    assert jobs.stats()["completed"] == 5
+
+
+def test_queued_jobs_fail_once_every_worker_failed(make_queue):
+    release = threading.Event()
+
+    def factory():
+        release.wait(5)
+        raise RuntimeError("no weights")
+
+    jobs = make_queue(factory, workers=2)
+    jobs.start()
+    job = jobs.submit(IMAGE, "frame.jpg")
+    release.set()
+
+    assert job.done.wait(5)
+    assert job.status == "failed"
+    assert "no weights" in job.error
+
+    with pytest.raises(HTTPException) as e:
+        jobs.submit(IMAGE, "frame.jpg")
+    assert e.value.status_code == 503
+    assert jobs.stats()["pipelines_failed"] == 2
+
+
+def test_one_failed_worker_leaves_jobs_to_the_others(make_queue):
+    calls = itertools.count()
+    release = threading.Event()
+
+    def factory():
+        release.wait(5)
+        if next(calls) == 0:
+            raise RuntimeError("out of memory")
+        return FakePipeline()
+
+    jobs = make_queue(factory, workers=2)
+    jobs.start()
+    submitted = [jobs.submit(IMAGE, f"frame_{i}.jpg") for i in range(3)]
+    release.set()
+
+    for job in submitted:
+        assert job.done.wait(5)
+        assert job.status == "done"
+    stats = jobs.stats()
+    assert stats["pipelines_loaded"] == 1
+    assert stats["pipelines_failed"] == 1
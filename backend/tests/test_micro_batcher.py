@@ -0,0 +1,27 @@
+import asyncio
+import gc
+
+import numpy as np
+
+from app.services.micro_batcher import MicroBatcher
+
+
+class SlowPool:
+    """Inference pool stand-in that collects garbage while a batch is scoring"""
+
+    async def run(self, fn, *args):
+        await asyncio.sleep(0.01)
+        gc.collect()
+        return fn(*args)
+
+
+def test_batches_survive_gc_and_release_tasks():
+    async def main():
+        batcher = MicroBatcher(lambda X: X.sum(axis=1), SlowPool(), max_batch_size=4, max_wait_ms=1)
+        results = await asyncio.gather(*[batcher.submit([i, 1.0]) for i in range(10)])
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(main())
+    np.testing.assert_array_equal(results, np.arange(10) + 1.0)
+    assert stats["batches"] == 3
+    assert stats["in_flight"] == 0
@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.services.readiness_model import FEATURE_COLS
+
+client = TestClient(main.app)
+
+NON_NUMERIC_CSV = (
+    ",".join(FEATURE_COLS) + "\n" + ",".join(["warm"] * len(FEATURE_COLS)) + "\n"
+).encode()
+
+
+@pytest.mark.parametrize("url", ["/predict/csv", "/predict/csv/stream"])
+def test_empty_csv_is_rejected(url):
+    response = client.post(url, files={"file": ("empty.csv", b"")})
+    assert response.status_code == 400
+    assert "Invalid CSV" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("url", ["/predict/csv", "/predict/csv/stream"])
+def test_non_numeric_csv_is_rejected(url):
+    response = client.post(url, files={"file": ("bad.csv", NON_NUMERIC_CSV)})
+    assert response.status_code == 400
+    assert "Invalid CSV" in response.json()["detail"]
+
+
+def test_stream_reports_missing_columns():
+    response = client.post("/predict/csv/stream", files={"file": ("f.csv", b"a,b\n1,2\n")})
+    assert response.status_code == 200
+    assert set(response.json()["missing_columns"]) == set(FEATURE_COLS)
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_stream_ends_with_error_on_bad_later_chunk(fmt, monkeypatch):
+    monkeypatch.setattr(
+        main, "score_features",
+        lambda X: (np.array(["ready"] * len(X)), np.full(len(X), 0.9))
+    )
+    good_row = ",".join(["1.0"] * len(FEATURE_COLS)) + "\n"
+    body = NON_NUMERIC_CSV.replace(b"\n", b"\n" + good_row.encode() * 2, 1)
+
+    response = client.post(
+        "/predict/csv/stream",
+        params={"format": fmt, "chunk_size": 2},
+        files={"file": ("bad.csv", body)}
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+
+    if fmt == "csv":
+        assert lines[:3] == ["row,prediction,confidence", "0,ready,0.9", "1,ready,0.9"]
+        assert lines[3].startswith("# error at row 2: Invalid CSV")
+        assert len(lines) == 4
+    else:
+        records = [json.loads(line) for line in lines]
+        assert [r["row"] for r in records] == [0, 1, 2]
+        assert records[2]["error"].startswith("Invalid CSV")
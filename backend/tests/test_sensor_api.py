@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import sensor
+from app.services.sensor_codec import encode_packed
+from app.services.sensor_store import SensorStore
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(sensor, "sensor_store", SensorStore(str(tmp_path)))
+    app = FastAPI()
+    app.include_router(sensor.router, prefix="/sensor")
+    return TestClient(app)
+
+
+def test_bulk_ingest_rejects_far_future_timestamps(client, tmp_path):
+    body = {"temperature": [25.0], "humidity": [60.0], "light": [900.0], "timestamp": [1e13]}
+    response = client.post("/sensor/ingest/bulk?device_id=dev1", json=body)
+    assert response.status_code == 400
+    assert "timestamp out of range" in response.json()["detail"]
+    assert not (tmp_path / "dev1").exists()
+
+
+def test_bulk_ingest_rejects_seconds_sent_as_milliseconds(client, tmp_path):
+    readings = np.array([[25.0, 60.0, 900.0]], dtype=np.float32)
+    body = encode_packed(readings, timestamps_ms=[1_700_000_000])
+    response = client.post(
+        "/sensor/ingest/bulk?device_id=dev1",
+        content=body,
+        headers={"content-type": "application/octet-stream"}
+    )
+    assert response.status_code == 400
+    assert not (tmp_path / "dev1").exists()
+
+
+def test_ingest_rejects_overflowing_timestamp(client):
+    payload = {"temperature": 25.0, "humidity": 60.0, "light": 900.0,
+               "device_id": "dev1", "timestamp": 1e300}
+    response = client.post("/sensor/ingest", json=payload)
+    assert response.status_code == 400
+
+
+def test_rejected_bulk_payload_does_not_assign_zone(client):
+    body = {"temperature": [25.0], "humidity": [60.0], "light": [900.0], "timestamp": [1e13]}
+    response = client.post("/sensor/ingest/bulk?device_id=dev1&zone=north", json=body)
+    assert response.status_code == 400
+
+    empty = {"temperature": [], "humidity": [], "light": []}
+    response = client.post("/sensor/ingest/bulk?device_id=dev1&zone=north", json=empty)
+    assert response.json()["received"] == 0
+
+    assert sensor.sensor_store.zones() == {}
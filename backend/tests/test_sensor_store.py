@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.services.sensor_store import RECORD_DTYPE, SensorStore
+
+T0 = 1_700_000_000_000
+
+
+def test_torn_tail_is_truncated_before_appending(tmp_path):
+    store = SensorStore(str(tmp_path))
+    store.append("dev1", T0 + np.arange(3) * 1000, [20.0, 21.0, 22.0], 50.0, 800.0, 30.0)
+
+    # Simulate a crash part-way through writing a fourth record
+    segment = tmp_path / "dev1" / "seg-000000.bin"
+    with open(segment, "ab") as f:
+        f.write(b"\x01" * (RECORD_DTYPE.itemsize // 2))
+
+    store = SensorStore(str(tmp_path))
+    store.append("dev1", T0 + 3000, 23.0, 51.0, 810.0, 31.0)
+    assert segment.stat().st_size == 4 * RECORD_DTYPE.itemsize
+
+    records = SensorStore(str(tmp_path)).read("dev1")
+    np.testing.assert_array_equal(records["timestamp"], T0 + np.arange(4) * 1000)
+    np.testing.assert_array_equal(records["temperature"], [20.0, 21.0, 22.0, 23.0])
+    assert set(records["device_id"]) == {b"dev1"}
+
+
+def test_out_of_range_timestamps_are_rejected_before_writing(tmp_path):
+    store = SensorStore(str(tmp_path))
+    store.append("dev1", T0, 20.0, 50.0, 800.0, 30.0)
+
+    for bad in (10_000_000_000_000_000, 1_700_000_000):   # far future, epoch seconds as ms
+        with pytest.raises(ValueError, match="timestamp out of range"):
+            store.append("dev1", [T0 + 1000, bad], [21.0, 22.0], 50.0, 800.0, 30.0)
+
+    assert len(store.read("dev1")) == 1
+    assert store.segment_index("dev1")[0]["count"] == 1
+
+
+def test_failed_rollup_update_rolls_back_the_segment(tmp_path, monkeypatch):
+    store = SensorStore(str(tmp_path))
+    store.append("dev1", T0, 20.0, 50.0, 800.0, 30.0)
+    rollups = store._log("dev1").rollups
+    add = rollups.add
+
+    def fail_after_partial_update(records):
+        # Update the tiers, then fail as if growing a file had
+        monkeypatch.setattr(rollups, "add", add)
+        add(records)
+        raise OSError("File too large")
+
+    monkeypatch.setattr(rollups, "add", fail_after_partial_update)
+    with pytest.raises(OSError):
+        store.append("dev1", T0 + 60_000, 21.0, 50.0, 800.0, 30.0)
+
+    segment = tmp_path / "dev1" / "seg-000000.bin"
+    assert segment.stat().st_size == RECORD_DTYPE.itemsize
+    assert store.segment_index("dev1")[0]["count"] == 1
+
+    buckets, summary = store.aggregate(["dev1"], T0 - 60_000, T0 + 120_000, "1m")
+    assert summary["temperature"]["count"].sum() == 1
@@ -0,0 +1,306 @@
+"""
+End-to-End Pipeline Benchmark
+Times every stage of FlowerDetectionPipeline on a fixed synthetic image set
+"""
+
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional
+from datetime import datetime
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from flower_inference import FlowerDetectionPipeline, result_to_dict
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('decode', 'detect', 'crop', 'classify', 'annotate', 'serialize')
+
+def synthetic_flower_image(rng: np.random.Generator,
+                           size: Tuple[int, int] = (720, 1280),
+                           flower_range: Tuple[int, int] = (3, 12)) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+    """
+    Draw a field-like frame with pumpkin-style flowers
+
+    A noisy soil/canopy background is covered with leaves, then yellow
+    five-petal flowers with orange centres of varying size, rotation and
+    openness are drawn on top.
+
+    Args:
+        rng: Random generator (seeded for a reproducible set)
+        size: Frame (height, width)
+        flower_range: Min/max flowers per frame
+
+    Returns:
+        BGR image, flower boxes [x1, y1, x2, y2]
+    """
+    height, width = size
+    soil = np.array([40, 70, 90], dtype=np.float32)
+    canopy = np.array([40, 110, 50], dtype=np.float32)
+    blend = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+    image = soil * (1 - blend) + canopy * blend + rng.normal(0, 12, (height, width, 3)).astype(np.float32)
+    image = np.clip(image, 0, 255).astype(np.uint8)
+
+    for _ in range(int(rng.integers(15, 40))):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        axes = (int(rng.integers(30, 120)), int(rng.integers(20, 80)))
+        color = tuple(int(c) for c in (rng.integers(20, 60), rng.integers(90, 170), rng.integers(30, 80)))
+        cv2.ellipse(image, center, axes, float(rng.uniform(0, 180)), 0, 360, color, -1)
+
+    boxes = []
+    for _ in range(int(rng.integers(flower_range[0], flower_range[1] + 1))):
+        radius = int(rng.integers(15, 70))
+        cx = int(rng.integers(radius, width - radius))
+        cy = int(rng.integers(radius, height - radius))
+        openness = float(rng.uniform(0.4, 1.0))
+        petal = tuple(int(c) for c in (rng.integers(0, 40), rng.integers(170, 230), rng.integers(220, 256)))
+        rotation = float(rng.uniform(0, 72))
+
+        for k in range(5):
+            angle = np.deg2rad(rotation + 72 * k)
+            px = int(cx + np.cos(angle) * radius * 0.55)
+            py = int(cy + np.sin(angle) * radius * 0.55)
+            cv2.ellipse(image, (px, py), (int(radius * 0.5), int(radius * 0.3 * openness) + 2),
+                        np.rad2deg(angle), 0, 360, petal, -1)
+        cv2.circle(image, (cx, cy), max(radius // 4, 3), (0, 120, 240), -1)
+        boxes.append((cx - radius, cy - radius, cx + radius, cy + radius))
+
+    return image, boxes
+
+def generate_image_set(count: int = 50,
+                       size: Tuple[int, int] = (720, 1280),
+                       seed: int = 0,
+                       quality: int = 90,
+                       output_dir: Optional[str] = None) -> List[bytes]:
+    """
+    Build the fixed benchmark set as encoded JPEG bytes
+
+    The same seed always yields the same images, so runs are comparable.
+
+    Args:
+        count: Number of images
+        size: Frame (height, width)
+        seed: Random seed
+        quality: JPEG quality
+        output_dir: Also write the images here (optional)
+
+    Returns:
+        Encoded images
+    """
+    rng = np.random.default_rng(seed)
+    if output_dir:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    images = []
+    for i in range(count):
+        image, _ = synthetic_flower_image(rng, size)
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+        images.append(encoded.tobytes())
+        if output_dir:
+            (Path(output_dir) / f'synthetic_{i:04d}.jpg').write_bytes(images[-1])
+    return images
+
+def _summarize(samples_ms: np.ndarray) -> Dict:
+    p50, p90, p99 = np.percentile(samples_ms, [50, 90, 99])
+    return {
+        'p50': float(p50),
+        'p90': float(p90),
+        'p99': float(p99),
+        'mean': float(samples_ms.mean()),
+        'total': float(samples_ms.sum())
+    }
+
+def benchmark_pipeline(pipeline: FlowerDetectionPipeline,
+                       images: List[bytes],
+                       warmup: int = 3,
+                       passes: int = 1) -> Dict:
+    """
+    Run the pipeline over encoded images and collect per-stage timings
+
+    Each image goes through ``process_frame`` (decode, detect, crop,
+    classify, annotate), timed by a stage hook on ``pipeline.metrics``,
+    plus JSON serialization of the result timed here.
+
+    Args:
+        pipeline: FlowerDetectionPipeline (its cache is not used)
+        images: Encoded images (see generate_image_set)
+        warmup: Untimed images processed first
+        passes: Times the image set is processed
+
+    Returns:
+        Report with per-stage distributions (ms per image) and throughput
+    """
+    durations = {}
+
+    def record(stage, seconds):
+        # Nested stages (e.g. classify_forward) are part of their parent
+        if stage in durations:
+            durations[stage] += seconds * 1000
+
+    def run(data):
+        durations.update(dict.fromkeys(STAGES, 0.0))
+        flowers, _ = pipeline.process_frame(data)
+
+        start = time.perf_counter()
+        json.dumps(result_to_dict({'flowers': flowers, 'flower_count': len(flowers)}))
+        durations['serialize'] = (time.perf_counter() - start) * 1000
+        return dict(durations), len(flowers)
+
+    pipeline.metrics.add_hook(record)
+    try:
+        for i in range(min(warmup, len(images))):
+            run(images[i])
+
+        samples = {stage: [] for stage in STAGES}
+        flower_count = 0
+        start = time.perf_counter()
+        for _ in range(passes):
+            for data in images:
+                image_durations, flowers = run(data)
+                flower_count += flowers
+                for stage, duration in image_durations.items():
+                    samples[stage].append(duration)
+        elapsed = time.perf_counter() - start
+    finally:
+        pipeline.metrics.remove_hook(record)
+
+    stages = {stage: _summarize(np.array(values)) for stage, values in samples.items()}
+    image_total = sum(stage['total'] for stage in stages.values())
+    for stage in stages.values():
+        stage['share'] = stage['total'] / image_total if image_total else 0.0
+
+    processed = len(images) * passes
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'config': {
+            'images': len(images),
+            'passes': passes,
+            'warmup': warmup,
+            'model_version': pipeline.result_version,
+            'cpu_count': os.cpu_count(),
+            'platform': platform.platform()
+        },
+        'stages': stages,
+        'images_per_s': processed / elapsed,
+        'flowers_per_s': flower_count / elapsed,
+        'flowers_per_image': flower_count / max(processed, 1)
+    }
+
+def compare_to_baseline(report: Dict,
+                        baseline: Dict,
+                        tolerance: float = 0.15,
+                        min_delta_ms: float = 0.5) -> List[Dict]:
+    """
+    Stages whose median time regressed past the baseline
+
+    A stage regresses when its p50 grows by more than ``tolerance`` and by
+    more than ``min_delta_ms`` (so sub-millisecond stages do not fail on
+    timer noise). Overall images/s dropping by more than ``tolerance`` is
+    reported as stage 'throughput'.
+
+    Args:
+        report: Current benchmark_pipeline() report
+        baseline: Stored report
+        tolerance: Allowed relative slowdown
+        min_delta_ms: Ignore slowdowns smaller than this
+
+    Returns:
+        Regressions (stage, baseline, current, change)
+    """
+    regressions = []
+    for stage, current in report['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if before is None:
+            continue
+        delta = current['p50'] - before['p50']
+        change = delta / before['p50'] if before['p50'] else 0.0
+        if change > tolerance and delta > min_delta_ms:
+            regressions.append({'stage': stage, 'baseline': before['p50'],
+                                'current': current['p50'], 'change': change})
+
+    if baseline.get('images_per_s'):
+        change = report['images_per_s'] / baseline['images_per_s'] - 1
+        if change < -tolerance:
+            regressions.append({'stage': 'throughput', 'baseline': baseline['images_per_s'],
+                                'current': report['images_per_s'], 'change': change})
+    return regressions
+
+def print_report(report: Dict):
+    print("\nPipeline Benchmark:")
+    print(f"  {'stage':<10} {'p50':>9} {'p90':>9} {'p99':>9} {'share':>7}")
+    for stage, summary in report['stages'].items():
+        print(f"  {stage:<10} {summary['p50']:7.2f}ms {summary['p90']:7.2f}ms "
+              f"{summary['p99']:7.2f}ms {summary['share']:6.1%}")
+    print(f"  Images/s:  {report['images_per_s']:.2f}")
+    print(f"  Flowers/s: {report['flowers_per_s']:.2f} ({report['flowers_per_image']:.1f} per image)")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='End-to-end flower pipeline benchmark')
+    parser.add_argument('--detector', required=True, help='Detection model path')
+    parser.add_argument('--classifier', required=True, help='Classification model path')
+    parser.add_argument('--images', type=int, default=50, help='Synthetic images in the set')
+    parser.add_argument('--size', type=str, default='1280x720', help='Image size WIDTHxHEIGHT')
+    parser.add_argument('--seed', type=int, default=0, help='Image set seed')
+    parser.add_argument('--save-images', type=str, help='Also write the image set to this directory')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed images first')
+    parser.add_argument('--passes', type=int, default=1, help='Times the image set is processed')
+    parser.add_argument('--conf', type=float, default=0.5, help='Confidence threshold')
+    parser.add_argument('--clf-batch', type=int, default=32, help='Flower crops per classifier call')
+    parser.add_argument('--tile-size', type=int, help='Detect on tiles of this size')
+    parser.add_argument('--threads', type=int, help='CPU threads per model operator')
+    parser.add_argument('--device', type=str, default='cpu', help='Device for .pt models')
+    parser.add_argument('--output', type=str, default='pipeline_benchmark.json', help='Report output path')
+    parser.add_argument('--baseline', type=str, help='Stored report to compare against (exit 1 on regression)')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative slowdown per stage')
+    parser.add_argument('--update-baseline', action='store_true', help='Write this run to --baseline')
+
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    images = generate_image_set(args.images, (height, width), args.seed, output_dir=args.save_images)
+
+    pipeline = FlowerDetectionPipeline(
+        args.detector,
+        args.classifier,
+        conf_threshold=args.conf,
+        device=int(args.device) if args.device.isdigit() else args.device,
+        classify_batch_size=args.clf_batch,
+        tile_size=args.tile_size,
+        num_threads=args.threads
+    )
+
+    report = benchmark_pipeline(pipeline, images, warmup=args.warmup, passes=args.passes)
+    report['config'].update({'size': [width, height], 'seed': args.seed, 'threads': args.threads,
+                             'tile_size': args.tile_size})
+    print_report(report)
+
+    regressions = []
+    if args.baseline and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        report['baseline'] = {'path': args.baseline, 'tolerance': args.tolerance, 'regressions': regressions}
+        for regression in regressions:
+            print(f"  ⚠ {regression['stage']}: {regression['baseline']:.2f} -> "
+                  f"{regression['current']:.2f} ({regression['change']:+.1%})")
+        if not regressions:
+            print(f"  ✓ No regression against {args.baseline}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"  Baseline written to: {args.baseline}")
+
+    sys.exit(1 if regressions else 0)
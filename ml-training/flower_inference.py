@@ -4,13 +4,21 @@ Handles both detection and classification with easy integration
 """
 
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
-from ultralytics import YOLO # pyright: ignore[reportPrivateImportUsage]
+from typing import List, Dict, Tuple, Optional, Union, Iterable, Iterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import numpy as np
 import cv2
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
+import json
 import logging
 
+from inference_cache import InferenceCache, content_hash, model_version
+from inference_manifest import InferenceManifest, MANIFEST_NAME
+from flower_tracking import FlowerTracker
+from inference_backends import load_model, nms
+from inference_metrics import PipelineMetrics
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,6 +38,87 @@ class ClassificationResult:
     confidence: float  # Confidence score
     class_probs: Dict[str, float]  # Per-class probabilities
 
+def decode_image(source: Union[str, Path, bytes, bytearray, memoryview, np.ndarray]) -> np.ndarray:
+    """
+    Decode an image source into a BGR array
+    
+    Args:
+        source: Image path, encoded image bytes, or an already decoded array
+        
+    Returns:
+        Decoded BGR image (arrays are returned unchanged)
+    """
+    if isinstance(source, np.ndarray):
+        if source.size == 0:
+            raise ValueError("Empty image array")
+        return source
+    
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        image = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Failed to decode image bytes")
+        return image
+    
+    image = cv2.imread(str(source))
+    if image is None:
+        raise ValueError(f"Failed to load image: {source}")
+    return image
+
+def result_to_dict(result: Dict) -> Dict:
+    """
+    Convert a per-image result into a JSON-serializable dict
+    
+    Crops are dropped and ClassificationResult objects become plain dicts.
+    
+    Args:
+        result: Result dict as produced by process_batch / iter_batch
+        
+    Returns:
+        JSON-serializable copy of the result
+    """
+    output = {k: v for k, v in result.items() if k != 'flowers'}
+    output['flowers'] = [
+        {
+            'bbox': list(flower['bbox']),
+            'confidence': flower['confidence'],
+            'classification': asdict(flower['classification']),
+            **({'track_id': flower['track_id']} if 'track_id' in flower else {})
+        }
+        for flower in result['flowers']
+    ]
+    return output
+
+def tile_offsets(height: int, width: int, tile_size: int, overlap: float) -> np.ndarray:
+    """
+    Top-left corners of overlapping tiles covering a frame
+    
+    Tiles step by ``tile_size * (1 - overlap)``; the last row and column
+    are snapped to the frame edge so every pixel is covered.
+    
+    Args:
+        height, width: Frame size
+        tile_size: Tile edge length in pixels
+        overlap: Fraction of a tile shared with its neighbour (0 <= overlap < 1)
+        
+    Returns:
+        (n_tiles, 2) array of (x0, y0)
+    """
+    stride = max(int(tile_size * (1 - overlap)), 1)
+    
+    def starts(length):
+        last = max(length - tile_size, 0)
+        axis = np.arange(0, last + 1, stride)
+        return axis if axis[-1] == last else np.append(axis, last)
+    
+    xs, ys = np.meshgrid(starts(width), starts(height))
+    return np.stack([xs.ravel(), ys.ravel()], axis=1)
+
+def _to_numpy(values) -> np.ndarray:
+    """Convert detector output (torch tensor or array) to a NumPy array"""
+    if hasattr(values, 'cpu'):
+        values = values.cpu().numpy()
+    return np.asarray(values)
+
 class FlowerDetectionPipeline:
     """
     Unified pipeline for flower detection and readiness classification
@@ -55,27 +144,102 @@ class FlowerDetectionPipeline:
                  detector_path: str,
                  classifier_path: str,
                  conf_threshold: float = 0.5,
-                 device: int = 0):
+                 device: int = 0,
+                 classify_batch_size: int = 32,
+                 cache: Optional[InferenceCache] = None,
+                 tile_size: Optional[int] = None,
+                 tile_overlap: float = 0.2,
+                 tile_batch_size: int = 16,
+                 tile_nms_threshold: float = 0.5,
+                 tile_full_frame: bool = False,
+                 tracker: Optional[FlowerTracker] = None,
+                 num_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None,
+                 metrics: Optional[PipelineMetrics] = None):
         """
         Initialize the pipeline
         
+        Models are loaded by file type: ``.onnx`` exports run on
+        onnxruntime (CPU, no torch needed), ``.pt`` weights on ultralytics.
+        
         Args:
-            detector_path: Path to detection model
-            classifier_path: Path to classification model
+            detector_path: Path to detection model (.pt or .onnx)
+            classifier_path: Path to classification model (.pt or .onnx)
             conf_threshold: Confidence threshold for detections
             device: GPU device ID (0) or 'cpu'
+            classify_batch_size: Max flower crops per classifier forward pass
+            cache: Result cache consulted by process_image and batch mode
+            tile_size: Detect on overlapping tiles of this size (pixels) for
+                frames larger than it; None runs on the whole frame
+            tile_overlap: Fraction of a tile shared with its neighbours
+            tile_batch_size: Max tiles per detector call
+            tile_nms_threshold: Overlap (intersection over the smaller box)
+                above which detections from different tiles are merged
+            tile_full_frame: Also detect on the downscaled whole frame, to
+                catch flowers larger than a tile
+            tracker: Track flowers across consecutive frames and classify
+                each track once (frames must then arrive in capture order;
+                the result cache is bypassed so no frame is skipped)
+            num_threads: CPU threads per model operator (None for all cores)
+            inter_op_threads: Threads running independent operators (ONNX)
+            metrics: Stage timing hooks and counters (may be shared between
+                pipelines); stages are not timed until a hook is added
         """
+        if classify_batch_size < 1:
+            raise ValueError("classify_batch_size must be >= 1")
+        if tile_size is not None and (tile_size < 32 or not 0 <= tile_overlap < 1 or tile_batch_size < 1):
+            raise ValueError("tile_size must be >= 32, 0 <= tile_overlap < 1 and tile_batch_size >= 1")
+        
         self.conf_threshold = conf_threshold
         self.device = device
+        self.classify_batch_size = classify_batch_size
+        self.cache = cache
+        self.model_paths = (detector_path, classifier_path)
+        self._model_version = None
+        
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_batch_size = tile_batch_size
+        self.tile_nms_threshold = tile_nms_threshold
+        self.tile_full_frame = tile_full_frame
+        self.tracker = tracker
+        self.metrics = metrics if metrics is not None else PipelineMetrics()
         
         logger.info("Loading detection model...")
-        self.detector = YOLO(detector_path)
+        self.detector = load_model(detector_path, 'detect', num_threads, inter_op_threads)
         
         logger.info("Loading classification model...")
-        self.classifier = YOLO(classifier_path)
+        self.classifier = load_model(classifier_path, 'classify', num_threads, inter_op_threads)
         
         logger.info("✓ Models loaded successfully")
     
+    @property
+    def model_version(self) -> str:
+        """Digest of the model weights, part of every cache key"""
+        if self._model_version is None:
+            self._model_version = model_version(*self.model_paths)
+        return self._model_version
+    
+    @property
+    def result_version(self) -> str:
+        """Model version plus any setting that changes results (tiling)"""
+        if self.tile_size is None:
+            return self.model_version
+        return (f'{self.model_version}-tile{self.tile_size}-{self.tile_overlap:g}'
+                f'-{self.tile_nms_threshold:g}{"-full" if self.tile_full_frame else ""}')
+    
+    def cache_key(self, data: bytes) -> str:
+        """
+        Cache key for encoded image bytes under the current models and threshold
+        
+        Args:
+            data: Encoded image file contents
+            
+        Returns:
+            Cache key
+        """
+        return InferenceCache.make_key(content_hash(data), self.result_version, self.conf_threshold)
+    
     def process_image(self, image_path: str) -> Tuple[List[Dict], np.ndarray]:
         """
         Process image with detection and classification
@@ -86,53 +250,336 @@ class FlowerDetectionPipeline:
         Returns:
             List of flower detections with classifications, annotated image
         """
-        # Read image
-        image = cv2.imread(str(image_path))
-        if image is None:
-            raise ValueError(f"Failed to load image: {image_path}")
+        if self.cache is None or self.tracker is not None:
+            with self.metrics.stage('decode'):
+                image = decode_image(image_path)
+            return self._process_frames([image])[0]
+        
+        # Hash the file bytes we decode anyway; a hit skips both models
+        with self.metrics.stage('decode'):
+            try:
+                data = Path(image_path).read_bytes()
+                image = decode_image(data)
+            except (OSError, ValueError):
+                raise ValueError(f"Failed to load image: {image_path}")
+        
+        with self.metrics.stage('cache_lookup'):
+            key = self.cache_key(data)
+            cached = self.cache.get(key)
+        if cached is not None:
+            self.metrics.count('cache_hits')
+            self.metrics.count('images')
+            self.metrics.count('flowers', len(cached))
+            flowers = self._flowers_from_cache(cached, image)
+            with self.metrics.stage('annotate'):
+                annotated = self._annotate(image, flowers)
+            return flowers, annotated
+        
+        self.metrics.count('cache_misses')
+        flowers, annotated = self._process_frames([image])[0]
+        self.cache.put(key, result_to_dict({'flowers': flowers})['flowers'])
+        return flowers, annotated
+    
+    def process_frame(self, frame: Union[bytes, np.ndarray]) -> Tuple[List[Dict], np.ndarray]:
+        """
+        Process an in-memory frame with detection and classification
+        
+        Lets the backend and drone callers skip the filesystem: pass either
+        encoded image bytes (JPEG/PNG as received over HTTP) or an already
+        decoded BGR array (e.g. straight from the camera).
+        
+        Args:
+            frame: Encoded image bytes or decoded BGR image array
+            
+        Returns:
+            List of flower detections with classifications, annotated image
+        """
+        with self.metrics.stage('decode'):
+            image = decode_image(frame)
+        return self._process_frames([image])[0]
+    
+    def process_frames(self,
+                       frames: List[Union[bytes, np.ndarray]],
+                       annotate: bool = False) -> List[Tuple[List[Dict], Optional[np.ndarray]]]:
+        """
+        Process several in-memory frames with one detector call
+        
+        Used by servers that coalesce concurrent uploads into a batch.
+        
+        Args:
+            frames: Encoded image bytes or decoded BGR image arrays
+            annotate: Whether to draw detections on a copy of each frame
+        
+        Returns:
+            (flowers, annotated image or None) per input frame
+        """
+        with self.metrics.stage('decode'):
+            images = [decode_image(frame) for frame in frames]
+        return self._process_frames(images, annotate=annotate)
+    
+    def _process_frames(self,
+                        images: List[np.ndarray],
+                        annotate: bool = True) -> List[Tuple[List[Dict], Optional[np.ndarray]]]:
+        """
+        Detect and classify flowers on a batch of decoded frames
+        
+        All frames go through the detector in one call, and the crops of
+        every frame are classified together in batched calls.
+        
+        Args:
+            images: Decoded BGR images
+            annotate: Whether to draw detections on a copy of each frame
+            
+        Returns:
+            (flowers, annotated image or None) per input frame
+        """
+        # Run detection on the decoded arrays so each image is decoded only once
+        with self.metrics.stage('detect'):
+            detections = self._detect_batch(images)
+        self.metrics.count('images', len(images))
+        self.metrics.count('flowers', sum(len(boxes) for boxes, _ in detections))
+        
+        if self.tracker is not None:
+            return self._process_tracked(images, detections, annotate)
+        
+        # Crop every flower region, then classify them all in batched calls
+        with self.metrics.stage('crop'):
+            crops = [
+                [image[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+                for image, (boxes, _) in zip(images, detections)
+            ]
+        with self.metrics.stage('classify'):
+            classifications = self._classify_flowers(
+                [crop for frame_crops in crops for crop in frame_crops]
+            )
+        
+        outputs = []
+        offset = 0
+        for image, (boxes, confidences), frame_crops in zip(images, detections, crops):
+            frame_classifications = classifications[offset:offset + len(boxes)]
+            offset += len(boxes)
+            
+            flowers = [
+                {
+                    'bbox': (x1, y1, x2, y2),
+                    'confidence': conf,
+                    'classification': classification,
+                    'crop': flower_crop
+                }
+                for (x1, y1, x2, y2), conf, flower_crop, classification in zip(
+                    boxes, confidences, frame_crops, frame_classifications)
+            ]
+            
+            outputs.append((flowers, self._annotate_timed(image, flowers) if annotate else None))
+        
+        return outputs
+    
+    def _process_tracked(self,
+                         images: List[np.ndarray],
+                         detections: List[Tuple[List[Tuple[int, int, int, int]], List[float]]],
+                         annotate: bool) -> List[Tuple[List[Dict], Optional[np.ndarray]]]:
+        """
+        Assign track ids and classify each track once
+        
+        The tracker advances frame by frame, then only tracks without a
+        confident cached classification are classified - from their first
+        crop in this batch, all in one batched classifier pass. A track's
+        cached state is read when it is first seen, since a batch longer
+        than the tracker's max_age can drop the track (and its state)
+        before the batch is classified.
+        
+        Args:
+            images: Decoded BGR images, in capture order
+            detections: (boxes, confidences) per image
+            annotate: Whether to draw detections on a copy of each frame
+            
+        Returns:
+            (flowers with 'track_id', annotated image or None) per frame
+        """
+        track_ids = []
+        labels = {}
+        pending = {}
+        for index, (boxes, _) in enumerate(detections):
+            ids = self.tracker.update(np.array(boxes, dtype=np.float64).reshape(-1, 4))
+            track_ids.append(ids)
+            # First crop of every track that still needs a classification
+            for box, track_id in zip(boxes, ids.tolist()):
+                if track_id in labels:
+                    continue
+                labels[track_id] = self.tracker.classification(track_id)
+                if self.tracker.needs_classification(track_id):
+                    pending[track_id] = (index, box)
+        
+        with self.metrics.stage('classify'):
+            classifications = self._classify_flowers([
+                images[index][y1:y2, x1:x2] for index, (x1, y1, x2, y2) in pending.values()
+            ])
+        for track_id, classification in zip(pending, classifications):
+            self.tracker.set_classification(track_id, classification)
+            previous = labels[track_id]
+            if previous is None or classification.confidence >= previous.confidence:
+                labels[track_id] = classification
+        
+        outputs = []
+        for image, (boxes, confidences), ids in zip(images, detections, track_ids):
+            flowers = [
+                {
+                    'bbox': (x1, y1, x2, y2),
+                    'confidence': conf,
+                    'classification': labels[track_id],
+                    'crop': image[y1:y2, x1:x2],
+                    'track_id': track_id
+                }
+                for (x1, y1, x2, y2), conf, track_id in zip(boxes, confidences, ids.tolist())
+            ]
+            outputs.append((flowers, self._annotate_timed(image, flowers) if annotate else None))
+        
+        return outputs
+    
+    def _annotate_timed(self, image: np.ndarray, flowers: List[Dict]) -> np.ndarray:
+        with self.metrics.stage('annotate'):
+            return self._annotate(image, flowers)
+    
+    def _annotate(self, image: np.ndarray, flowers: List[Dict]) -> np.ndarray:
+        """Draw every flower on a copy of the image"""
+        annotated_image = image.copy()
+        for flower in flowers:
+            x1, y1, x2, y2 = flower['bbox']
+            annotated_image = self._draw_detection(
+                annotated_image, x1, y1, x2, y2,
+                flower['classification'].class_name,
+                flower['confidence'],
+                flower['classification'].confidence
+            )
+        return annotated_image
+    
+    @staticmethod
+    def _flowers_from_cache(cached: List[Dict], image: Optional[np.ndarray]) -> List[Dict]:
+        """
+        Rebuild pipeline flower dicts from a cached (JSON) flower list
+        
+        Args:
+            cached: Flowers as stored by result_to_dict
+            image: Decoded image to crop from, or None to omit crops
+            
+        Returns:
+            Flowers in the same form _process_frames produces
+        """
+        flowers = []
+        for flower in cached:
+            x1, y1, x2, y2 = flower['bbox']
+            rebuilt = {
+                'bbox': (x1, y1, x2, y2),
+                'confidence': flower['confidence'],
+                'classification': ClassificationResult(**flower['classification'])
+            }
+            if image is not None:
+                rebuilt['crop'] = image[y1:y2, x1:x2]
+            flowers.append(rebuilt)
+        return flowers
+    
+    def _detect_batch(self,
+                      images: List[np.ndarray]) -> List[Tuple[List[Tuple[int, int, int, int]], List[float]]]:
+        """
+        Run flower detection on several decoded images in one detector call
+        
+        Args:
+            images: Decoded BGR images
+            
+        Returns:
+            (boxes, confidences) per input image
+        """
+        if not images:
+            return []
+        
+        if self.tile_size is not None:
+            return self._detect_tiled(images)
         
-        # Run detection
         det_results = self.detector.predict(
-            source=image_path,
+            source=list(images),
             conf=self.conf_threshold,
             device=self.device,
             verbose=False
         )
         
-        flowers = []
-        annotated_image = image.copy()
-        
-        if len(det_results) > 0:
-            result = det_results[0]
-            
-            # Process each detection
+        detections = []
+        for result in det_results:
+            boxes = []
+            confidences = []
             if result.boxes is not None:
                 for box, conf in zip(result.boxes.xyxy,
                                     result.boxes.conf):
-                    x1, y1, x2, y2 = map(int, box)
-                    
-                    # Crop flower region
-                    flower_crop = image[y1:y2, x1:x2]
-                    
-                    # Classify flower readiness
-                    classification = self._classify_flower(flower_crop)
-                    
-                    flowers.append({
-                        'bbox': (x1, y1, x2, y2),
-                        'confidence': float(conf),
-                        'classification': classification,
-                        'crop': flower_crop
-                    })
-                    
-                    # Draw on annotated image
-                    annotated_image = self._draw_detection(
-                        annotated_image, x1, y1, x2, y2,
-                        classification.class_name,
-                        float(conf),
-                        classification.confidence
-                    )
-        
-        return flowers, annotated_image
+                    boxes.append(tuple(map(int, box)))
+                    confidences.append(float(conf))
+            detections.append((boxes, confidences))
+        
+        # Pad in case the detector returned fewer results than frames
+        detections.extend(([], []) for _ in range(len(images) - len(detections)))
+        
+        return detections
+    
+    def _detect_tiled(self,
+                      images: List[np.ndarray]) -> List[Tuple[List[Tuple[int, int, int, int]], List[float]]]:
+        """
+        Run flower detection on overlapping tiles of several images
+        
+        The tiles of all images are detected together in chunks of
+        ``tile_batch_size`` at ``imgsz=tile_size``, so small flowers keep
+        their native resolution without running the detector on the
+        full-resolution frame. Tile boxes are shifted back to frame
+        coordinates and duplicates from overlapping tiles merged with NMS.
+        
+        Args:
+            images: Decoded BGR images
+            
+        Returns:
+            (boxes, confidences) per input image, best first
+        """
+        # (image index, x0, y0, pixels) for every tile of every image
+        tiles = []
+        for index, image in enumerate(images):
+            height, width = image.shape[:2]
+            if height <= self.tile_size and width <= self.tile_size:
+                tiles.append((index, 0, 0, image))
+                continue
+            for x0, y0 in tile_offsets(height, width, self.tile_size, self.tile_overlap):
+                tile = image[y0:y0 + self.tile_size, x0:x0 + self.tile_size]
+                tiles.append((index, int(x0), int(y0), np.ascontiguousarray(tile)))
+            if self.tile_full_frame:
+                tiles.append((index, 0, 0, image))
+        
+        found_boxes = [[] for _ in images]
+        found_scores = [[] for _ in images]
+        for start in range(0, len(tiles), self.tile_batch_size):
+            chunk = tiles[start:start + self.tile_batch_size]
+            det_results = self.detector.predict(
+                source=[tile for _, _, _, tile in chunk],
+                conf=self.conf_threshold,
+                device=self.device,
+                imgsz=self.tile_size,
+                verbose=False
+            )
+            for (index, x0, y0, _), result in zip(chunk, det_results):
+                if result.boxes is None or len(result.boxes.conf) == 0:
+                    continue
+                xyxy = _to_numpy(result.boxes.xyxy).astype(np.float32).reshape(-1, 4)
+                found_boxes[index].append(xyxy + np.array([x0, y0, x0, y0], dtype=np.float32))
+                found_scores[index].append(_to_numpy(result.boxes.conf).astype(np.float32).ravel())
+        
+        detections = []
+        for image_boxes, image_scores in zip(found_boxes, found_scores):
+            if not image_boxes:
+                detections.append(([], []))
+                continue
+            boxes = np.concatenate(image_boxes)
+            scores = np.concatenate(image_scores)
+            keep = nms(boxes, scores, self.tile_nms_threshold, metric='ios')
+            detections.append((
+                [tuple(map(int, box)) for box in boxes[keep]],
+                [float(score) for score in scores[keep]]
+            ))
+        
+        return detections
     
     def _classify_flower(self, flower_crop: np.ndarray) -> ClassificationResult:
         """
@@ -144,58 +591,83 @@ class FlowerDetectionPipeline:
         Returns:
             Classification result
         """
-        # Save temp crop for inference
-        temp_path = '/tmp/flower_crop.jpg'
-        cv2.imwrite(temp_path, flower_crop)
+        return self._classify_flowers([flower_crop])[0]
+    
+    def _classify_flowers(self, flower_crops: List[np.ndarray]) -> List[ClassificationResult]:
+        """
+        Classify many flower crops with batched classifier calls
         
-        # Run classification
-        clf_results = self.classifier.predict(
-            source=temp_path,
-            device=self.device,
-            verbose=False
-        )
+        Crops are passed as a list of in-memory BGR arrays; the classifier
+        resizes each one to its input size and stacks them into a single
+        tensor, so every chunk of ``classify_batch_size`` crops costs one
+        forward pass instead of one per flower.
         
-        if len(clf_results) > 0:
-            result = clf_results[0]
-            if result.probs is not None:
-                class_idx = result.probs.top1.item() # pyright: ignore[reportAttributeAccessIssue]
-                class_name = self.FLOWER_CLASSES.get(class_idx, 'unknown')
-                probs = result.probs.data
-                if not isinstance(probs, np.ndarray):
-                    if hasattr(probs, 'cpu'):
-                        probs = probs.cpu().numpy()
-                    else:
-                        probs = np.array(probs)
-                confidence = float(probs[class_idx])
-            else:
-                return ClassificationResult(
-                    class_name='unknown',
-                    confidence=0.0,
-                    class_probs={}
-                )
+        Args:
+            flower_crops: Cropped flower images
             
-            # Get all class probabilities
-            probs = result.probs.data
-            if not isinstance(probs, np.ndarray):
-                if hasattr(probs, 'cpu'):
-                    probs = probs.cpu().numpy()
-                else:
-                    probs = np.array(probs)
-            class_probs = {
-                self.FLOWER_CLASSES[i]: float(probs[i])
-                for i in range(len(self.FLOWER_CLASSES))
-            }
+        Returns:
+            Classification results, in the same order as ``flower_crops``
+        """
+        results = [
+            ClassificationResult(class_name='unknown', confidence=0.0, class_probs={})
+            for _ in flower_crops
+        ]
+        
+        # Degenerate (zero-area) boxes cannot be classified
+        valid = [i for i, crop in enumerate(flower_crops) if crop.size > 0]
+        
+        self.metrics.count('classifier_crops', len(valid))
+        for start in range(0, len(valid), self.classify_batch_size):
+            chunk = valid[start:start + self.classify_batch_size]
+            with self.metrics.stage('classify_forward'):
+                clf_results = self.classifier.predict(
+                    source=[flower_crops[i] for i in chunk],
+                    device=self.device,
+                    verbose=False
+                )
+            with self.metrics.stage('classify_parse'):
+                for i, result in zip(chunk, clf_results):
+                    results[i] = self._parse_classification(result)
+        
+        return results
+    
+    def _parse_classification(self, result) -> ClassificationResult:
+        """
+        Convert a single classifier result into a ClassificationResult
+        
+        Args:
+            result: Ultralytics classification result
             
+        Returns:
+            Classification result
+        """
+        if result.probs is None:
             return ClassificationResult(
-                class_name=class_name,
-                confidence=confidence,
-                class_probs=class_probs
+                class_name='unknown',
+                confidence=0.0,
+                class_probs={}
             )
         
+        class_idx = result.probs.top1 # pyright: ignore[reportAttributeAccessIssue]
+        class_idx = int(class_idx.item() if hasattr(class_idx, 'item') else class_idx)
+        class_name = self.FLOWER_CLASSES.get(class_idx, 'unknown')
+        
+        # Get all class probabilities
+        probs = result.probs.data
+        if not isinstance(probs, np.ndarray):
+            if hasattr(probs, 'cpu'):
+                probs = probs.cpu().numpy()
+            else:
+                probs = np.array(probs)
+        class_probs = {
+            self.FLOWER_CLASSES[i]: float(probs[i])
+            for i in range(min(len(probs), len(self.FLOWER_CLASSES)))
+        }
+        
         return ClassificationResult(
-            class_name='unknown',
-            confidence=0.0,
-            class_probs={}
+            class_name=class_name,
+            confidence=float(probs[class_idx]),
+            class_probs=class_probs
         )
     
     def _draw_detection(self, 
@@ -237,64 +709,406 @@ class FlowerDetectionPipeline:
         
         return image
     
-    def process_batch(self, image_dir: str) -> List[Dict]:
+    def process_batch(self,
+                      image_dir: str,
+                      batch_size: int = 8,
+                      num_workers: int = 4,
+                      prefetch: int = 32,
+                      manifest_path: Optional[str] = None) -> List[Dict]:
         """
         Process multiple images
         
+        Collects every result (crops included) in memory; use iter_batch
+        for large directories.
+        
         Args:
             image_dir: Directory containing images
+            batch_size: Frames per detector call
+            num_workers: Threads decoding images ahead of the model
+            prefetch: Max decoded frames held in memory at once
+            manifest_path: Incremental mode: only process new or changed
+                images and merge in the results stored in this manifest
             
         Returns:
             List of results for all images
         """
-        results = []
+        return list(self.iter_batch(
+            image_dir,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            prefetch=prefetch,
+            manifest_path=manifest_path
+        ))
+    
+    def iter_batch(self,
+                   image_dir: str,
+                   keep_crops: bool = True,
+                   batch_size: int = 8,
+                   num_workers: int = 4,
+                   prefetch: int = 32,
+                   manifest_path: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Process multiple images, yielding each result as soon as it is ready
+        
+        Nothing is accumulated, so with ``keep_crops=False`` peak memory is
+        bounded by the prefetch window regardless of directory size.
+        
+        In incremental mode (``manifest_path`` given) images whose size and
+        mtime, or failing that content hash, match the manifest under the
+        current models are not processed again: their stored results are
+        yielded in place (without crops) alongside the new ones, so
+        get_statistics covers the whole directory. Incremental mode cannot
+        be combined with tracking: stored results carry no track ids, and
+        tracks need every frame in order.
+        
+        Args:
+            image_dir: Directory containing images
+            keep_crops: Keep each flower's 'crop' array in the results
+            batch_size: Frames per detector call
+            num_workers: Threads decoding images ahead of the model
+            prefetch: Max decoded frames held in memory at once
+            manifest_path: Manifest file for incremental mode
+            
+        Yields:
+            Result dict per image, in sorted path order
+        """
+        if manifest_path is not None:
+            if self.tracker is not None:
+                raise ValueError("Incremental mode cannot be combined with tracking")
+            results = self._iter_incremental(
+                image_dir, manifest_path, batch_size, num_workers, prefetch, keep_crops
+            )
+        else:
+            results = self._iter_batch(
+                self._list_images(image_dir),
+                batch_size=batch_size,
+                num_workers=num_workers,
+                prefetch=prefetch,
+                keep_crops=keep_crops
+            )
+        
+        for result in results:
+            if not keep_crops:
+                for flower in result['flowers']:
+                    flower.pop('crop', None)
+            yield result
+    
+    @staticmethod
+    def _list_images(image_dir: str) -> List[Path]:
+        """List the *.jpg and *.png images of a directory in a stable order"""
+        image_dir_path = Path(image_dir)
+        return sorted(image_dir_path.glob('*.jpg')) + sorted(image_dir_path.glob('*.png'))
+    
+    def _iter_incremental(self,
+                          image_dir: str,
+                          manifest_path: str,
+                          batch_size: int,
+                          num_workers: int,
+                          prefetch: int,
+                          keep_crops: bool) -> Iterator[Dict]:
+        """
+        Incremental batch mode: process only new or changed images
+        
+        Every image is stat-checked against the manifest first; the images
+        whose size/mtime do not match go through the regular batch engine,
+        which hashes the bytes it reads for decoding and answers content
+        matches from the manifest instead of the models. The manifest is
+        saved periodically and when the generator finishes, so an
+        interrupted run keeps its progress.
+        
+        Yields:
+            Stored or fresh result per image, in sorted path order
+        """
         image_dir_path = Path(image_dir)
+        image_paths = self._list_images(image_dir)
+        names = [path.relative_to(image_dir_path).as_posix() for path in image_paths]
+        
+        manifest = InferenceManifest(manifest_path)
+        manifest.prune(names)
+        version = self.result_version
+        
+        def check(item):
+            image_path, name = item
+            try:
+                stat = image_path.stat()
+            except OSError:
+                # Left to the batch engine, which reports the error
+                return None, None
+            return stat, manifest.match(name, stat, version, self.conf_threshold)
+        
+        checks = [check(item) for item in zip(image_paths, names)]
         
-        for image_path in list(image_dir_path.glob('*.jpg')) + list(image_dir_path.glob('*.png')):
-            logger.info(f"Processing {image_path.name}...")
+        # name and stat of each image the batch engine reads; its digest is
+        # filled in by the decode thread that hashes the bytes
+        todo = {path: (name, stat) for path, name, (stat, stored)
+                in zip(image_paths, names, checks) if stored is None}
+        digests = {}
+        logger.info(f"Incremental: {len(todo)} of {len(image_paths)} images new or changed")
+        
+        def lookup(image_path, data):
+            name, stat = todo[image_path]
+            digests[image_path] = digest = content_hash(data)
+            if stat is None:
+                return None
+            return manifest.match(name, stat, version, self.conf_threshold, digest)
+        
+        fresh = self._iter_batch(
+            todo,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            prefetch=prefetch,
+            keep_crops=keep_crops,
+            lookup=lookup
+        )
+        
+        unsaved = 0
+        try:
+            for image_path, name, (stat, stored) in zip(image_paths, names, checks):
+                if stored is not None:
+                    yield {
+                        'image': str(image_path),
+                        'flowers': self._flowers_from_cache(stored, None),
+                        'flower_count': len(stored)
+                    }
+                    continue
+                
+                result = next(fresh)
+                digest = digests.pop(image_path, None)
+                if 'error' not in result and stat is not None and digest is not None:
+                    manifest.record(name, stat, digest, version, self.conf_threshold,
+                                    result_to_dict(result)['flowers'])
+                    unsaved += 1
+                    if unsaved >= 64:
+                        manifest.save()
+                        unsaved = 0
+                yield result
+        finally:
+            manifest.save()
+    
+    def _iter_batch(self,
+                    image_paths: Iterable[Path],
+                    batch_size: int = 8,
+                    num_workers: int = 4,
+                    prefetch: int = 32,
+                    keep_crops: bool = True,
+                    lookup: Optional[Callable[[Path, bytes], Optional[List[Dict]]]] = None) -> Iterator[Dict]:
+        """
+        Pipelined batch engine: decode ahead on a thread pool, detect in
+        batches of frames, and yield per-image results in input order
+        
+        Decoding (which releases the GIL) overlaps with model inference, and
+        the prefetch window bounds how many decoded frames exist at a time,
+        so memory stays flat however many images there are. With a cache,
+        hits are answered without running the models (and without decoding
+        when crops are not needed) and only misses fill detector batches.
+        
+        Args:
+            image_paths: Images to process
+            batch_size: Frames per detector call
+            num_workers: Threads decoding images ahead of the model
+            prefetch: Max decoded frames held in memory at once
+            keep_crops: Whether cache hits need their image decoded for crops
+            lookup: Called with each image's path and bytes; stored flowers
+                it returns are used like a cache hit
             
-            flowers, _ = self.process_image(str(image_path))
+        Yields:
+            Result dict per image, in the order of ``image_paths``
+        """
+        if batch_size < 1 or num_workers < 1:
+            raise ValueError("batch_size and num_workers must be >= 1")
+        
+        window = max(prefetch, batch_size)
+        
+        # (path, image, cache key, finished result or None), in input order
+        pending = []
+        frames = 0
+        for image_path, image, error, key, cached in self._prefetch_images(
+                image_paths, num_workers, window, decode_hits=keep_crops, lookup=lookup):
+            if error is not None:
+                logger.warning(f"Skipping {image_path.name}: {error}")
+                pending.append((image_path, None, None, {
+                    'image': str(image_path),
+                    'flowers': [],
+                    'flower_count': 0,
+                    'error': error
+                }))
+            elif cached is not None:
+                pending.append((image_path, None, None, {
+                    'image': str(image_path),
+                    'flowers': self._flowers_from_cache(cached, image),
+                    'flower_count': len(cached)
+                }))
+            else:
+                pending.append((image_path, image, key, None))
+                frames += 1
             
-            results.append({
-                'image': str(image_path),
-                'flowers': flowers,
-                'flower_count': len(flowers)
-            })
+            # Run once a detector batch is full, or when finished results pile up
+            if frames >= batch_size or len(pending) >= window:
+                yield from self._run_batch(pending)
+                pending = []
+                frames = 0
         
-        return results
+        yield from self._run_batch(pending)
+    
+    def _run_batch(self, batch: List[Tuple[Path, Optional[np.ndarray], Optional[str], Optional[Dict]]]) -> Iterator[Dict]:
+        """Detect and classify the unfinished frames of a batch, yield all in order"""
+        todo = [i for i, (_, _, _, result) in enumerate(batch) if result is None]
+        results = [result for _, _, _, result in batch]
+        
+        if todo:
+            logger.info(f"Processing {len(todo)} images ({batch[todo[0]][0].name}...)")
+            outputs = self._process_frames([batch[i][1] for i in todo], annotate=False)
+            
+            for i, (flowers, _) in zip(todo, outputs):
+                image_path, _, key, _ = batch[i]
+                results[i] = {
+                    'image': str(image_path),
+                    'flowers': flowers,
+                    'flower_count': len(flowers)
+                }
+                if key is not None:
+                    self.cache.put(key, result_to_dict(results[i])['flowers'])
+        
+        yield from results
+    
+    def _prefetch_images(self,
+                         image_paths: Iterable[Path],
+                         num_workers: int,
+                         prefetch: int,
+                         decode_hits: bool = True,
+                         lookup: Optional[Callable[[Path, bytes], Optional[List[Dict]]]] = None) -> Iterator[Tuple[Path, Optional[np.ndarray], Optional[str], Optional[str], Optional[List[Dict]]]]:
+        """
+        Decode images on a thread pool, keeping at most ``prefetch`` in flight
+        
+        With a cache the file bytes are hashed and looked up on the same
+        threads, after ``lookup`` if given (which sees the same bytes); hits
+        are only decoded when ``decode_hits`` is set.
+        
+        Yields:
+            (path, decoded image or None, error message or None,
+             cache key or None, cached flowers or None), in order
+        """
+        cache = self.cache if self.tracker is None else None
+        
+        def load(image_path):
+            if cache is None and lookup is None:
+                try:
+                    with self.metrics.stage('decode'):
+                        return decode_image(image_path), None, None, None
+                except ValueError as e:
+                    return None, str(e), None, None
+            
+            try:
+                data = image_path.read_bytes()
+            except OSError as e:
+                return None, f"Failed to load image: {image_path} ({e})", None, None
+            key = None
+            cached = lookup(image_path, data) if lookup is not None else None
+            if cached is None and cache is not None:
+                with self.metrics.stage('cache_lookup'):
+                    key = self.cache_key(data)
+                    cached = cache.get(key)
+                if cached is not None:
+                    self.metrics.count('cache_hits')
+                    self.metrics.count('images')
+                    self.metrics.count('flowers', len(cached))
+                else:
+                    self.metrics.count('cache_misses')
+            if cached is not None and not decode_hits:
+                return None, None, key, cached
+            try:
+                with self.metrics.stage('decode'):
+                    return decode_image(data), None, key, cached
+            except ValueError:
+                return None, f"Failed to load image: {image_path}", None, None
+        
+        paths = iter(image_paths)
+        in_flight = deque()
+        
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            for image_path in paths:
+                image_path = Path(image_path)
+                in_flight.append((image_path, pool.submit(load, image_path)))
+                if len(in_flight) >= prefetch:
+                    path, future = in_flight.popleft()
+                    yield (path, *future.result())
+            
+            while in_flight:
+                path, future = in_flight.popleft()
+                yield (path, *future.result())
     
-    def get_statistics(self, results: List[Dict]) -> Dict:
+    def get_statistics(self, results: Iterable[Dict]) -> Dict:
         """
         Generate statistics from batch results
         
+        Uses running totals, so ``results`` may be a one-pass generator
+        such as iter_batch. Tracked flowers (with a 'track_id') are counted
+        once per track, using the track's latest detection.
+        
         Args:
-            results: List of batch processing results
+            results: Batch processing results
             
         Returns:
             Statistics dictionary
         """
         class_counts = {'bud': 0, 'open': 0, 'post-pollination': 0}
         total_flowers = 0
-        avg_det_conf = []
-        avg_clf_conf = []
+        det_conf_sum = 0.0
+        clf_conf_sum = 0.0
         
-        for result in results:
-            for flower in result['flowers']:
+        tracks = {}
+        
+        def untracked(results):
+            for result in results:
+                for flower in result['flowers']:
+                    track_id = flower.get('track_id')
+                    if track_id is None:
+                        yield flower
+                    else:
+                        tracks[track_id] = flower
+        
+        for flowers in (untracked(results), tracks.values()):
+            for flower in flowers:
                 total_flowers += 1
                 class_name = flower['classification'].class_name
                 class_counts[class_name] = class_counts.get(class_name, 0) + 1
-                avg_det_conf.append(flower['confidence'])
-                avg_clf_conf.append(flower['classification'].confidence)
+                det_conf_sum += flower['confidence']
+                clf_conf_sum += flower['classification'].confidence
         
         return {
             'total_flowers': total_flowers,
             'class_distribution': class_counts,
-            'avg_detection_confidence': np.mean(avg_det_conf) if avg_det_conf else 0,
-            'avg_classification_confidence': np.mean(avg_clf_conf) if avg_clf_conf else 0,
+            'avg_detection_confidence': det_conf_sum / total_flowers if total_flowers > 0 else 0,
+            'avg_classification_confidence': clf_conf_sum / total_flowers if total_flowers > 0 else 0,
             'receptive_flowers': class_counts.get('open', 0),
             'receptivity_rate': (class_counts.get('open', 0) / total_flowers * 100) if total_flowers > 0 else 0
         }
 
+def stream_results(results: Iterable[Dict], fp, jsonl: bool = True) -> Iterator[Dict]:
+    """
+    Write results to an open text file as they pass through
+    
+    In JSONL mode every result becomes one line; otherwise the items of a
+    JSON array are written (the caller writes the surrounding brackets).
+    Each record is flushed immediately, so partial output survives a crash.
+    
+    Args:
+        results: Per-image results
+        fp: Writable text file
+        jsonl: Write JSON Lines instead of array items
+        
+    Yields:
+        The unchanged results, for further consumption (e.g. statistics)
+    """
+    for i, result in enumerate(results):
+        record = json.dumps(result_to_dict(result))
+        if jsonl:
+            fp.write(record + '\n')
+        else:
+            fp.write(('' if i == 0 else ',\n') + record)
+        fp.flush()
+        yield result
+
 if __name__ == '__main__':
     import argparse
     
@@ -303,16 +1117,60 @@ if __name__ == '__main__':
     parser.add_argument('--classifier', required=True, help='Classification model path')
     parser.add_argument('--image', type=str, help='Single image path')
     parser.add_argument('--batch', type=str, help='Batch image directory')
-    parser.add_argument('--output', type=str, default='results.json', help='Output JSON path')
+    parser.add_argument('--video', type=str, help='Video file / stream URL, or camera index')
+    parser.add_argument('--output', type=str, default='results.json',
+                        help='Output path (.jsonl streams one line per image, otherwise JSON)')
     parser.add_argument('--conf', type=float, default=0.5, help='Confidence threshold')
+    parser.add_argument('--clf-batch', type=int, default=32, help='Flower crops per classifier call')
+    parser.add_argument('--det-batch', type=int, default=8, help='Frames per detector call in batch mode')
+    parser.add_argument('--workers', type=int, default=4, help='Image decode threads in batch mode')
+    parser.add_argument('--prefetch', type=int, default=32, help='Max decoded frames held ahead of the model')
+    parser.add_argument('--cache-dir', type=str, help='Reuse results of unchanged images from this directory')
+    parser.add_argument('--cache-size-mb', type=int, default=512, help='Max disk size of the result cache')
+    parser.add_argument('--tile-size', type=int, help='Detect on overlapping tiles of this size (high-resolution frames)')
+    parser.add_argument('--tile-overlap', type=float, default=0.2, help='Fraction of overlap between tiles')
+    parser.add_argument('--tile-batch', type=int, default=16, help='Tiles per detector call')
+    parser.add_argument('--tile-nms', type=float, default=0.5, help='Overlap above which cross-tile boxes are merged')
+    parser.add_argument('--tile-full-frame', action='store_true', help='Also detect on the whole downscaled frame')
+    parser.add_argument('--video-output', type=str, help='Annotated video output (--video)')
+    parser.add_argument('--frame-stride', type=int, default=1, help='Only decode every N-th video frame')
+    parser.add_argument('--motion-threshold', type=float, default=4.0,
+                        help='Skip video frames changing less than this (0 processes every frame)')
+    parser.add_argument('--max-skip', type=int, default=30, help='Process at least one frame in this many')
+    parser.add_argument('--gate', choices=['diff', 'dhash'], default='diff', help='Near-duplicate frame test')
+    parser.add_argument('--track', action='store_true',
+                        help='Track flowers across frames (video / time-ordered batch) and classify each once')
+    parser.add_argument('--track-iou', type=float, default=0.3, help='Min IoU to continue a track')
+    parser.add_argument('--track-max-age', type=int, default=15, help='Frames a lost track is kept')
+    parser.add_argument('--threads', type=int, help='CPU threads per model operator (default: all cores)')
+    parser.add_argument('--inter-threads', type=int, help='Threads running independent operators (ONNX models)')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'Batch mode: only process new or changed images (manifest: <batch>/{MANIFEST_NAME})')
+    parser.add_argument('--manifest', type=str, help='Manifest path for --incremental')
     
     args = parser.parse_args()
+    if args.incremental and args.track:
+        parser.error('--incremental cannot be combined with --track')
+    
+    cache = None
+    if args.cache_dir:
+        cache = InferenceCache(args.cache_dir, max_disk_bytes=args.cache_size_mb << 20)
     
     # Initialize pipeline
     pipeline = FlowerDetectionPipeline(
         args.detector,
         args.classifier,
-        conf_threshold=args.conf
+        conf_threshold=args.conf,
+        classify_batch_size=args.clf_batch,
+        cache=cache,
+        tile_size=args.tile_size,
+        tile_overlap=args.tile_overlap,
+        tile_batch_size=args.tile_batch,
+        tile_nms_threshold=args.tile_nms,
+        tile_full_frame=args.tile_full_frame,
+        tracker=FlowerTracker(args.track_iou, args.track_max_age) if args.track else None,
+        num_threads=args.threads,
+        inter_op_threads=args.inter_threads
     )
     
     # Process image or batch
@@ -323,12 +1181,75 @@ if __name__ == '__main__':
             print(f"  Flower {i+1}: {flower['classification'].class_name} "
                   f"({flower['classification'].confidence:.2f})")
         cv2.imwrite('annotated_output.jpg', annotated)
+        
+        with open(args.output, 'w') as f:
+            json.dump(result_to_dict({
+                'image': args.image,
+                'flowers': flowers,
+                'flower_count': len(flowers)
+            }), f, indent=2)
     
     elif args.batch:
-        results = pipeline.process_batch(args.batch)
-        stats = pipeline.get_statistics(results)
+        results = pipeline.iter_batch(
+            args.batch,
+            keep_crops=False,
+            batch_size=args.det_batch,
+            num_workers=args.workers,
+            prefetch=args.prefetch,
+            manifest_path=(args.manifest or str(Path(args.batch) / MANIFEST_NAME)) if args.incremental else None
+        )
+        
+        # Results are written as they finish and never accumulated
+        jsonl = args.output.endswith('.jsonl')
+        with open(args.output, 'w') as f:
+            if jsonl:
+                stats = pipeline.get_statistics(stream_results(results, f))
+            else:
+                f.write('{"results": [\n')
+                stats = pipeline.get_statistics(stream_results(results, f, jsonl=False))
+                f.write('\n],\n"statistics": ')
+                json.dump(stats, f, indent=2)
+                f.write('}\n')
         
         print(f"\\nBatch Results:")
         print(f"  Total flowers: {stats['total_flowers']}")
         print(f"  Class distribution: {stats['class_distribution']}")
         print(f"  Receptivity rate: {stats['receptivity_rate']:.1f}%")
+        print(f"  Results written to: {args.output}")
+        if cache is not None:
+            print(f"  Cache: {cache.stats()}")
+    
+    elif args.video:
+        from flower_video import MotionGate, process_video
+        
+        gate = None
+        if args.motion_threshold > 0:
+            gate = MotionGate(args.motion_threshold, max_skip=args.max_skip, method=args.gate)
+        
+        results = process_video(
+            pipeline,
+            int(args.video) if args.video.isdigit() else args.video,
+            output_path=args.video_output,
+            batch_size=args.det_batch,
+            stride=args.frame_stride,
+            gate=gate,
+            buffer_size=args.prefetch
+        )
+        
+        jsonl = args.output.endswith('.jsonl')
+        with open(args.output, 'w') as f:
+            if jsonl:
+                stats = pipeline.get_statistics(stream_results(results, f))
+            else:
+                f.write('{"results": [\n')
+                stats = pipeline.get_statistics(stream_results(results, f, jsonl=False))
+                f.write('\n],\n"statistics": ')
+                json.dump(stats, f, indent=2)
+                f.write('}\n')
+        
+        print("\nVideo Results:")
+        print(f"  Total flowers: {stats['total_flowers']}")
+        if pipeline.tracker is not None:
+            print(f"  Tracking: {pipeline.tracker.stats()}")
+        print(f"  Class distribution: {stats['class_distribution']}")
+        print(f"  Results written to: {args.output}")
@@ -0,0 +1,241 @@
+"""
+Flower Tracking
+SORT-style IoU + Kalman tracker giving flowers persistent ids across frames
+"""
+
+from typing import Dict
+import numpy as np
+
+# Constant-velocity model over [cx, cy, area, aspect, vx, vy, v_area]
+_F = np.eye(7)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+
+_H = np.eye(4, 7)
+
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+_R = np.diag([1.0, 1.0, 10.0, 10.0])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 10000.0, 10000.0, 10000.0])
+
+def _to_state(boxes: np.ndarray) -> np.ndarray:
+    """[x1, y1, x2, y2] -> [cx, cy, area, aspect]"""
+    width = boxes[:, 2] - boxes[:, 0]
+    height = boxes[:, 3] - boxes[:, 1]
+    return np.stack([
+        boxes[:, 0] + width / 2,
+        boxes[:, 1] + height / 2,
+        width * height,
+        width / np.maximum(height, 1e-6)
+    ], axis=1)
+
+def _to_boxes(state: np.ndarray) -> np.ndarray:
+    """[cx, cy, area, aspect, ...] -> [x1, y1, x2, y2]"""
+    area = np.maximum(state[:, 2], 0)
+    width = np.sqrt(area * np.maximum(state[:, 3], 1e-6))
+    height = area / np.maximum(width, 1e-6)
+    return np.stack([
+        state[:, 0] - width / 2,
+        state[:, 1] - height / 2,
+        state[:, 0] + width / 2,
+        state[:, 1] + height / 2
+    ], axis=1)
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoU of two box sets
+
+    Args:
+        a: (n, 4) boxes [x1, y1, x2, y2]
+        b: (m, 4) boxes
+
+    Returns:
+        (n, m) IoU matrix
+    """
+    width = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    height = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    inter = np.maximum(width, 0) * np.maximum(height, 0)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+class FlowerTracker:
+    """
+    Multi-object tracker for flower detections
+
+    Every track carries a Kalman filter over box centre, area and aspect
+    with constant velocity; all tracks are predicted together with batched
+    matrix products. Detections are matched to predicted boxes greedily by
+    IoU, unmatched detections start new tracks, and tracks unseen for
+    ``max_age`` frames are dropped.
+
+    The tracker also caches one classification per track, so the pipeline
+    classifies a flower once per pass instead of once per frame; tracks
+    whose classification is below ``reclassify_below`` are re-classified,
+    at most ``max_classifications`` times. Classification state lives only
+    as long as its track: it is dropped when the track is pruned, and
+    results for tracks already dropped are not stored.
+
+    Usage:
+        tracker = FlowerTracker()
+        pipeline = FlowerDetectionPipeline(detector, classifier, tracker=tracker)
+        for flowers, _ in pipeline.process_frames(frames):
+            print([flower['track_id'] for flower in flowers])
+    """
+
+    def __init__(self,
+                 iou_threshold: float = 0.3,
+                 max_age: int = 15,
+                 reclassify_below: float = 0.5,
+                 max_classifications: int = 3):
+        """
+        Initialize the tracker
+
+        Args:
+            iou_threshold: Min IoU between a prediction and a detection to match
+            max_age: Frames a track survives without a matching detection
+            reclassify_below: Re-classify tracks whose confidence is below this
+            max_classifications: Max classifier runs per track
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.reclassify_below = reclassify_below
+        self.max_classifications = max_classifications
+
+        self._x = np.zeros((0, 7))
+        self._P = np.zeros((0, 7, 7))
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._missed = np.zeros(0, dtype=np.int64)
+        self._next_id = 1
+
+        self._classifications = {}
+        self._attempts = {}
+
+        self.frames = 0
+        self.classifier_runs = 0
+
+    def update(self, boxes: np.ndarray) -> np.ndarray:
+        """
+        Advance one frame
+
+        Args:
+            boxes: (n, 4) detections [x1, y1, x2, y2] of the new frame
+
+        Returns:
+            (n,) track id of each detection
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.frames += 1
+        self._predict()
+
+        matches = self._associate(_to_boxes(self._x), boxes)
+        track_ids = np.zeros(len(boxes), dtype=np.int64)
+
+        if len(matches):
+            tracks, detections = matches[:, 0], matches[:, 1]
+            self._correct(tracks, _to_state(boxes[detections]))
+            self._missed[tracks] = 0
+            track_ids[detections] = self._ids[tracks]
+
+        new = np.flatnonzero(track_ids == 0)
+        if len(new):
+            track_ids[new] = self._start(_to_state(boxes[new]))
+
+        self._prune()
+        return track_ids
+
+    def needs_classification(self, track_id: int) -> bool:
+        """Whether a track has no (confident enough) classification yet"""
+        result = self._classifications.get(track_id)
+        if result is None:
+            return True
+        return (result.confidence < self.reclassify_below
+                and self._attempts.get(track_id, 0) < self.max_classifications)
+
+    def is_active(self, track_id: int) -> bool:
+        return bool(np.any(self._ids == track_id))
+
+    def set_classification(self, track_id: int, result):
+        """Store a classifier result for a track (the more confident one wins)"""
+        self.classifier_runs += 1
+        if not self.is_active(track_id):
+            # Pruned while its batch was being classified
+            return
+        self._attempts[track_id] = self._attempts.get(track_id, 0) + 1
+        previous = self._classifications.get(track_id)
+        if previous is None or result.confidence >= previous.confidence:
+            self._classifications[track_id] = result
+
+    def classification(self, track_id: int):
+        return self._classifications.get(track_id)
+
+    def stats(self) -> Dict:
+        return {
+            'frames': self.frames,
+            'active_tracks': len(self._ids),
+            'tracks_created': self._next_id - 1,
+            'classifier_runs': self.classifier_runs
+        }
+
+    def _predict(self):
+        if not len(self._ids):
+            return
+        # Keep the predicted area positive
+        shrinking = self._x[:, 2] + self._x[:, 6] <= 0
+        self._x[shrinking, 6] = 0.0
+
+        self._x = self._x @ _F.T
+        self._P = _F @ self._P @ _F.T + _Q
+        self._missed += 1
+
+    def _associate(self, predicted: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+        """Greedy IoU matching; returns (k, 2) array of (track index, detection index)"""
+        if not len(predicted) or not len(boxes):
+            return np.zeros((0, 2), dtype=np.int64)
+
+        iou = iou_matrix(predicted, boxes)
+        candidates = np.argwhere(iou >= self.iou_threshold)
+        order = np.argsort(-iou[candidates[:, 0], candidates[:, 1]], kind='stable')
+
+        used_tracks = np.zeros(len(predicted), dtype=bool)
+        used_boxes = np.zeros(len(boxes), dtype=bool)
+        matches = []
+        for track, box in candidates[order]:
+            if not used_tracks[track] and not used_boxes[box]:
+                used_tracks[track] = used_boxes[box] = True
+                matches.append((track, box))
+        return np.array(matches, dtype=np.int64).reshape(-1, 2)
+
+    def _correct(self, tracks: np.ndarray, measured: np.ndarray):
+        """Batched Kalman update of the matched tracks"""
+        x, P = self._x[tracks], self._P[tracks]
+
+        residual = measured - x @ _H.T
+        S = _H @ P @ _H.T + _R
+        K = P @ _H.T @ np.linalg.inv(S)
+
+        self._x[tracks] = x + np.einsum('nij,nj->ni', K, residual)
+        self._P[tracks] = (np.eye(7) - K @ _H) @ P
+
+    def _start(self, measured: np.ndarray) -> np.ndarray:
+        n = len(measured)
+        ids = np.arange(self._next_id, self._next_id + n, dtype=np.int64)
+        self._next_id += n
+
+        state = np.zeros((n, 7))
+        state[:, :4] = measured
+        self._x = np.concatenate([self._x, state])
+        self._P = np.concatenate([self._P, np.repeat(_P0[None], n, axis=0)])
+        self._ids = np.concatenate([self._ids, ids])
+        self._missed = np.concatenate([self._missed, np.zeros(n, dtype=np.int64)])
+        return ids
+
+    def _prune(self):
+        dead = self._missed > self.max_age
+        if not dead.any():
+            return
+        for track_id in self._ids[dead].tolist():
+            self._classifications.pop(track_id, None)
+            self._attempts.pop(track_id, None)
+
+        alive = ~dead
+        self._x, self._P = self._x[alive], self._P[alive]
+        self._ids, self._missed = self._ids[alive], self._missed[alive]
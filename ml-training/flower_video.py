@@ -0,0 +1,345 @@
+"""
+Streaming Video Inference
+Runs FlowerDetectionPipeline over video files and live cameras
+"""
+
+from typing import List, Dict, Optional, Union, Iterator, Tuple
+import logging
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+class FrameReader:
+    """
+    Decode frames on a background thread into a bounded buffer
+
+    Files are read as fast as the consumer allows (the decoder blocks when
+    the buffer is full, so no frame is lost). Live cameras cannot wait, so
+    for them the oldest buffered frame is dropped instead, like a ring
+    buffer, and the model always works on recent frames.
+
+    Usage:
+        with FrameReader('flight.mp4', buffer_size=64) as reader:
+            for index, time_ms, frame in reader:
+                ...
+    """
+
+    def __init__(self,
+                 source: Union[str, int],
+                 buffer_size: int = 64,
+                 stride: int = 1,
+                 drop_when_full: Optional[bool] = None):
+        """
+        Open a video source
+
+        Args:
+            source: Video file path / stream URL, or camera index
+            buffer_size: Max decoded frames waiting for the model
+            stride: Keep every ``stride``-th frame (others are grabbed but
+                not decoded into arrays)
+            drop_when_full: Drop the oldest frame instead of blocking when
+                the buffer is full (default: only for camera indices)
+        """
+        if buffer_size < 1 or stride < 1:
+            raise ValueError("buffer_size and stride must be >= 1")
+
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise ValueError(f"Failed to open video source: {source}")
+
+        self.stride = stride
+        self.drop_when_full = isinstance(source, int) if drop_when_full is None else drop_when_full
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.size = (
+            int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        )
+
+        self.dropped = 0
+        self._buffer = queue.Queue(maxsize=buffer_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._decode, name='frame-reader', daemon=True)
+        self._thread.start()
+
+    def __iter__(self) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """Yield (frame index, timestamp in ms, BGR frame) in order"""
+        while True:
+            item = self._buffer.get()
+            if item is _END:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        self._stop.set()
+        # Unblock a decoder waiting on a full buffer
+        while self._thread.is_alive():
+            try:
+                self._buffer.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(timeout=0.1)
+        self.capture.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _decode(self):
+        index = -1
+        try:
+            while not self._stop.is_set():
+                if not self.capture.grab():
+                    break
+                index += 1
+                if index % self.stride:
+                    continue
+
+                ok, frame = self.capture.retrieve()
+                if not ok:
+                    break
+                time_ms = self.capture.get(cv2.CAP_PROP_POS_MSEC) or index * 1000.0 / self.fps
+                self._put((index, time_ms, frame))
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(_END, force=True)
+
+    def _put(self, item, force=False):
+        while not self._stop.is_set() or force:
+            try:
+                self._buffer.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self.drop_when_full or force:
+                    try:
+                        self._buffer.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+class MotionGate:
+    """
+    Skip frames that barely differ from the last processed frame
+
+    Frames are reduced to a small grayscale thumbnail; a frame passes when
+    its mean absolute difference from the last passed thumbnail exceeds
+    ``threshold`` (0-255 scale), or when ``max_skip`` frames in a row have
+    been skipped. With ``method='dhash'`` a 64-bit difference hash is used
+    instead and ``threshold`` is a Hamming distance.
+    """
+
+    def __init__(self,
+                 threshold: float = 4.0,
+                 max_skip: int = 30,
+                 method: str = 'diff',
+                 thumbnail_size: Tuple[int, int] = (64, 36)):
+        """
+        Initialize the gate
+
+        Args:
+            threshold: Change needed to process a frame (0 processes all)
+            max_skip: Process at least one frame in this many
+            method: 'diff' (thumbnail difference) or 'dhash' (perceptual hash)
+            thumbnail_size: Thumbnail (width, height) for 'diff'
+        """
+        if method not in ('diff', 'dhash'):
+            raise ValueError("method must be 'diff' or 'dhash'")
+
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.method = method
+        self.thumbnail_size = thumbnail_size
+
+        self._last = None
+        self._skipped = 0
+
+    def __call__(self, frame: np.ndarray) -> bool:
+        """Whether the frame should be processed"""
+        signature = self._signature(frame)
+
+        if self._last is not None and self._skipped < self.max_skip:
+            if self.method == 'diff':
+                change = np.abs(signature - self._last).mean()
+            else:
+                change = np.count_nonzero(signature != self._last)
+            if change <= self.threshold:
+                self._skipped += 1
+                return False
+
+        self._last = signature
+        self._skipped = 0
+        return True
+
+    def _signature(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if self.method == 'diff':
+            return cv2.resize(gray, self.thumbnail_size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+        # dHash: sign of horizontal gradients on a 9x8 thumbnail
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        return small[:, 1:] > small[:, :-1]
+
+class AnnotatedWriter:
+    """
+    Encode annotated frames on a background thread
+
+    Drawing and encoding happen off the inference thread; the queue is
+    bounded so a slow disk applies back-pressure instead of growing memory.
+    """
+
+    def __init__(self,
+                 output_path: str,
+                 fps: float,
+                 size: Tuple[int, int],
+                 annotate,
+                 queue_size: int = 64):
+        """
+        Open the output video
+
+        Args:
+            output_path: Output file (.mp4 uses the mp4v codec, else MJPG)
+            fps: Output frame rate
+            size: Frame (width, height)
+            annotate: Callable (frame, flowers) -> annotated frame
+            queue_size: Max frames waiting to be encoded
+        """
+        codec = 'mp4v' if output_path.lower().endswith('.mp4') else 'MJPG'
+        self.writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, size)
+        if not self.writer.isOpened():
+            raise ValueError(f"Failed to open video writer: {output_path}")
+
+        self.annotate = annotate
+        self.frames_written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._encode, name='annotated-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, frame: np.ndarray, flowers: List[Dict]):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((frame, flowers))
+
+    def close(self):
+        self._queue.put(_END)
+        self._thread.join()
+        self.writer.release()
+        if self._error is not None:
+            raise self._error
+
+    def _encode(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if self._error is not None:
+                continue
+            try:
+                frame, flowers = item
+                self.writer.write(self.annotate(frame, flowers))
+                self.frames_written += 1
+            except Exception as e:
+                self._error = e
+
+def process_video(pipeline,
+                  source: Union[str, int],
+                  output_path: Optional[str] = None,
+                  batch_size: int = 8,
+                  stride: int = 1,
+                  gate: Optional[MotionGate] = None,
+                  buffer_size: int = 64,
+                  max_pending: int = 64) -> Iterator[Dict]:
+    """
+    Detect and classify flowers on a video file or camera stream
+
+    Frames are decoded ahead on a reader thread, filtered by the motion
+    gate, and the frames that pass are detected in batches of
+    ``batch_size``. Skipped frames reuse the last detections in the
+    annotated output but are reported with no flowers, so statistics only
+    count processed frames.
+
+    Args:
+        pipeline: FlowerDetectionPipeline
+        source: Video path / URL, or camera index
+        output_path: Annotated video output (None to skip encoding)
+        batch_size: Processed frames per detector call
+        stride: Decode every ``stride``-th frame only
+        gate: Motion gate (None processes every decoded frame)
+        buffer_size: Max decoded frames waiting for the model
+        max_pending: Max frames held while a detector batch fills up
+
+    Yields:
+        Result dict per decoded frame, in order
+    """
+    if batch_size < 1 or max_pending < batch_size:
+        raise ValueError("batch_size must be >= 1 and max_pending >= batch_size")
+
+    reader = FrameReader(source, buffer_size=buffer_size, stride=stride)
+    writer = None
+    if output_path:
+        writer = AnnotatedWriter(output_path, reader.fps / stride, reader.size, pipeline._annotate)
+
+    start = time.perf_counter()
+    counts = {'frames': 0, 'processed': 0}
+    last_flowers = []
+    pending = []   # (index, time_ms, frame, process?)
+    pending_processed = 0
+
+    def flush():
+        nonlocal last_flowers, pending_processed
+        frames = [frame for _, _, frame, process in pending if process]
+        outputs = iter(pipeline.process_frames(frames) if frames else [])
+
+        for index, time_ms, frame, process in pending:
+            flowers = []
+            if process:
+                flowers, _ = next(outputs)
+                for flower in flowers:
+                    flower.pop('crop', None)
+                last_flowers = flowers
+            if writer is not None:
+                writer.write(frame, last_flowers)
+            yield {
+                'frame': index,
+                'time_ms': round(time_ms, 1),
+                'skipped': not process,
+                'flowers': flowers,
+                'flower_count': len(flowers)
+            }
+        pending.clear()
+        pending_processed = 0
+
+    try:
+        with reader:
+            for index, time_ms, frame in reader:
+                process = gate is None or gate(frame)
+                pending.append((index, time_ms, frame, process))
+                pending_processed += process
+                counts['frames'] += 1
+                counts['processed'] += process
+
+                if pending_processed >= batch_size or len(pending) >= max_pending:
+                    yield from flush()
+
+            yield from flush()
+    finally:
+        if writer is not None:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Video: {counts['frames']} frames ({counts['processed']} processed, "
+        f"{reader.dropped} dropped) in {elapsed:.1f}s = {counts['frames'] / max(elapsed, 1e-9):.1f} fps"
+    )
@@ -0,0 +1,400 @@
+"""
+Inference Backends
+Runs exported ONNX detector / classifier models on CPU with onnxruntime,
+without the torch + ultralytics runtime
+"""
+
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Input statistics of torchvision models (e.g. the ResNet18 readiness CNN);
+# ultralytics classifiers only scale to [0, 1]
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Class offset that keeps per-class NMS of different classes apart
+_MAX_WH = 7680
+
+def nms(boxes: np.ndarray,
+        scores: np.ndarray,
+        iou_threshold: float = 0.5,
+        metric: str = 'iou') -> np.ndarray:
+    """
+    Greedy non-maximum suppression with vectorized overlap computation
+
+    Each step keeps the best remaining box and drops, in one array
+    operation, every remaining box that overlaps it too much.
+
+    Args:
+        boxes: (n, 4) boxes [x1, y1, x2, y2]
+        scores: (n,) confidences
+        iou_threshold: Overlap above which the weaker box is dropped
+        metric: 'iou' (intersection over union) or 'ios' (intersection over
+            the smaller box, which also merges a flower cut off at a tile
+            border with its full detection from the neighbouring tile)
+
+    Returns:
+        Indices of the kept boxes, best first
+    """
+    if metric not in ('iou', 'ios'):
+        raise ValueError("metric must be 'iou' or 'ios'")
+
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    order = np.argsort(-np.asarray(scores), kind='stable')
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+
+        width = np.minimum(boxes[best, 2], boxes[rest, 2]) - np.maximum(boxes[best, 0], boxes[rest, 0])
+        height = np.minimum(boxes[best, 3], boxes[rest, 3]) - np.maximum(boxes[best, 1], boxes[rest, 1])
+        inter = np.maximum(width, 0) * np.maximum(height, 0)
+        if metric == 'iou':
+            denom = areas[best] + areas[rest] - inter
+        else:
+            denom = np.minimum(areas[best], areas[rest])
+        overlap = inter / np.maximum(denom, 1e-9)
+
+        order = rest[overlap <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+def letterbox(image: np.ndarray,
+              size: Tuple[int, int],
+              color: int = 114) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    Resize keeping the aspect ratio and pad to the model input size
+
+    Args:
+        image: BGR image
+        size: Model input (height, width)
+        color: Padding value
+
+    Returns:
+        Padded image, scale factor, (pad_x, pad_y) of the top-left corner
+    """
+    height, width = image.shape[:2]
+    scale = min(size[0] / height, size[1] / width)
+    new_width, new_height = round(width * scale), round(height * scale)
+    pad_x = round((size[1] - new_width) / 2 - 0.1)
+    pad_y = round((size[0] - new_height) / 2 - 0.1)
+
+    padded = np.full((size[0], size[1], 3), color, dtype=np.uint8)
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    padded[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = image
+    return padded, scale, (pad_x, pad_y)
+
+def center_crop(image: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """Crop the central square and resize it to (height, width)"""
+    height, width = image.shape[:2]
+    side = min(height, width)
+    y0, x0 = (height - side) // 2, (width - side) // 2
+    square = image[y0:y0 + side, x0:x0 + side]
+    return cv2.resize(square, (size[1], size[0]), interpolation=cv2.INTER_LINEAR)
+
+def to_tensor(images: Sequence[np.ndarray],
+              mean: Optional[Sequence[float]] = None,
+              std: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    Stack same-sized BGR uint8 images into a normalized NCHW RGB float32 batch
+
+    Args:
+        images: BGR images of identical shape
+        mean: Per-channel (RGB) mean subtracted after scaling to [0, 1]
+        std: Per-channel (RGB) standard deviation
+
+    Returns:
+        (n, 3, height, width) float32 array
+    """
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2).astype(np.float32)
+    batch *= 1 / 255.0
+    if mean is not None:
+        batch -= np.asarray(mean, dtype=np.float32).reshape(1, 3, 1, 1)
+    if std is not None:
+        batch /= np.asarray(std, dtype=np.float32).reshape(1, 3, 1, 1)
+    return np.ascontiguousarray(batch)
+
+class _Boxes:
+    """Detections of one image, shaped like ultralytics ``Results.boxes``"""
+
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+class _Probs:
+    """Class probabilities of one crop, shaped like ultralytics ``Results.probs``"""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.top1 = int(np.argmax(data))
+
+class _Result:
+    def __init__(self, boxes: Optional[_Boxes] = None, probs: Optional[_Probs] = None):
+        self.boxes = boxes
+        self.probs = probs
+
+class OnnxModel:
+    """
+    onnxruntime session on the CPU execution provider
+
+    ``num_threads`` bounds the threads used inside one operator (e.g. a
+    convolution) and ``inter_op_threads`` those running independent
+    operators in parallel; None lets onnxruntime use every core. When
+    several pipelines run side by side (backend workers), give each a
+    share of the cores instead.
+    """
+
+    def __init__(self,
+                 model_path: Union[str, Path],
+                 num_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None):
+        """
+        Load an ONNX model
+
+        Args:
+            model_path: .onnx file
+            num_threads: Intra-op thread count (None for onnxruntime's default)
+            inter_op_threads: Inter-op thread count (None for the default)
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("onnxruntime is required for .onnx models: pip install onnxruntime") from e
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        self.model_path = Path(model_path)
+        self.session = ort.InferenceSession(str(model_path), options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        # Symbolic (dynamic) dimensions come back as strings or None
+        self.batch_size = batch if isinstance(batch, int) else None
+        self.input_size = (height, width) if isinstance(height, int) and isinstance(width, int) else None
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        """Run a batch, in fixed-size chunks if the model has a static batch dimension"""
+        if self.batch_size is None or self.batch_size == len(batch):
+            return self.session.run(None, {self.input_name: batch})[0]
+
+        outputs = []
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start:start + self.batch_size]
+            missing = self.batch_size - len(chunk)
+            if missing:
+                chunk = np.concatenate([chunk, np.zeros((missing,) + chunk.shape[1:], dtype=chunk.dtype)])
+            outputs.append(self.session.run(None, {self.input_name: chunk})[0][:self.batch_size - missing])
+        return np.concatenate(outputs)
+
+class OnnxDetector(OnnxModel):
+    """
+    YOLOv8 detector exported to ONNX
+
+    Frames are letterboxed to the model input, the raw (4 + classes) x
+    anchors output is decoded and filtered with NumPy, and boxes are
+    mapped back to frame coordinates. ``predict`` accepts the same
+    arguments as ``ultralytics.YOLO.predict``, so the pipeline uses either
+    interchangeably.
+    """
+
+    def predict(self,
+                source: Sequence[np.ndarray],
+                conf: float = 0.25,
+                iou: float = 0.7,
+                imgsz: Optional[int] = None,
+                max_det: int = 300,
+                **kwargs) -> List[_Result]:
+        """
+        Detect objects on BGR frames
+
+        Args:
+            source: BGR frames
+            conf: Confidence threshold
+            iou: NMS IoU threshold (per class)
+            imgsz: Inference size for models with dynamic input size
+            max_det: Max detections per frame
+            **kwargs: Ignored ultralytics options (device, verbose, ...)
+
+        Returns:
+            One result per frame with ``boxes.xyxy`` / ``boxes.conf`` / ``boxes.cls``
+        """
+        if not len(source):
+            return []
+
+        batch, transforms = self.preprocess(source, imgsz)
+        outputs = self._run(batch)
+        return [
+            self._decode(output, conf, iou, max_det, *transform)
+            for output, transform in zip(outputs, transforms)
+        ]
+
+    def preprocess(self,
+                   source: Sequence[np.ndarray],
+                   imgsz: Optional[int] = None) -> Tuple[np.ndarray, List[Tuple]]:
+        """
+        Letterbox and normalize frames into a model input batch
+
+        Args:
+            source: BGR frames
+            imgsz: Inference size for models with dynamic input size
+
+        Returns:
+            NCHW batch, (scale, pad, frame shape) per frame
+        """
+        if self.input_size is not None:
+            size = self.input_size
+        else:
+            # Dynamic models still need a multiple of the 32-pixel stride
+            side = -(-(imgsz or 640) // 32) * 32
+            size = (side, side)
+
+        padded, transforms = [], []
+        for image in source:
+            image_padded, scale, pad = letterbox(image, size)
+            padded.append(image_padded)
+            transforms.append((scale, pad, image.shape[:2]))
+        return to_tensor(padded), transforms
+
+    @staticmethod
+    def _decode(output: np.ndarray,
+                conf: float,
+                iou: float,
+                max_det: int,
+                scale: float,
+                pad: Tuple[int, int],
+                shape: Tuple[int, int]) -> _Result:
+        """Raw output of one frame -> frame-coordinate boxes"""
+        # (4 + classes, anchors) -> (anchors, 4 + classes)
+        output = output.T
+
+        class_scores = output[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(output)), class_ids]
+        keep = scores > conf
+        xywh, scores, class_ids = output[keep, :4], scores[keep], class_ids[keep]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+        # Shift each class apart so one NMS pass suppresses within classes only
+        kept = nms(boxes + class_ids[:, None] * _MAX_WH, scores, iou)[:max_det]
+        boxes, scores, class_ids = boxes[kept], scores[kept], class_ids[kept]
+
+        boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=boxes.dtype)
+        boxes /= scale
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+
+        return _Result(boxes=_Boxes(boxes, scores, class_ids.astype(np.float32)))
+
+class OnnxClassifier(OnnxModel):
+    """
+    Image classifier exported to ONNX (YOLOv8-cls or the ResNet18 readiness CNN)
+
+    Crops are center-cropped and resized to the model input; models
+    exported by ``scripts/export_cnn_to_onnx.py`` (input ``input_image``)
+    get ImageNet normalization, others are only scaled to [0, 1] like
+    ultralytics does. Logits are turned into probabilities with a softmax.
+    """
+
+    def __init__(self,
+                 model_path: Union[str, Path],
+                 num_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None,
+                 mean: Optional[Sequence[float]] = None,
+                 std: Optional[Sequence[float]] = None):
+        """
+        Load an ONNX classifier
+
+        Args:
+            model_path: .onnx file
+            num_threads: Intra-op thread count (None for onnxruntime's default)
+            inter_op_threads: Inter-op thread count (None for the default)
+            mean: Input normalization mean (default depends on the model)
+            std: Input normalization std (default depends on the model)
+        """
+        super().__init__(model_path, num_threads, inter_op_threads)
+        if mean is None and std is None and self.input_name == 'input_image':
+            mean, std = IMAGENET_MEAN, IMAGENET_STD
+        self.mean = mean
+        self.std = std
+
+    def predict(self, source: Sequence[np.ndarray], **kwargs) -> List[_Result]:
+        """
+        Classify BGR crops
+
+        Args:
+            source: BGR crops of any size
+            **kwargs: Ignored ultralytics options (device, verbose, ...)
+
+        Returns:
+            One result per crop with ``probs.data`` / ``probs.top1``
+        """
+        if not len(source):
+            return []
+
+        outputs = self._run(self.preprocess(source)).reshape(len(source), -1).astype(np.float32)
+
+        # Softmax unless the model already outputs probabilities
+        if not (np.all(outputs >= 0) and np.allclose(outputs.sum(axis=1), 1, atol=1e-3)):
+            outputs = np.exp(outputs - outputs.max(axis=1, keepdims=True))
+            outputs /= outputs.sum(axis=1, keepdims=True)
+
+        return [_Result(probs=_Probs(probs)) for probs in outputs]
+
+    def preprocess(self, source: Sequence[np.ndarray]) -> np.ndarray:
+        """Center-crop and normalize crops into a model input batch"""
+        size = self.input_size or (224, 224)
+        return to_tensor([center_crop(crop, size) for crop in source], self.mean, self.std)
+
+def load_model(model_path: Union[str, Path],
+               task: str,
+               num_threads: Optional[int] = None,
+               inter_op_threads: Optional[int] = None):
+    """
+    Load a detector or classifier with the backend matching its file type
+
+    ``.onnx`` files run on onnxruntime (CPU); anything else (``.pt`` or a
+    hub model name) is loaded with ultralytics, which is only imported in
+    that case.
+
+    Args:
+        model_path: Model file
+        task: 'detect' or 'classify'
+        num_threads: CPU threads per operator (torch intra-op threads for .pt)
+        inter_op_threads: Threads running independent operators (ONNX only)
+
+    Returns:
+        Model with an ultralytics-compatible ``predict(source, ...)``
+    """
+    if task not in ('detect', 'classify'):
+        raise ValueError("task must be 'detect' or 'classify'")
+
+    if Path(model_path).suffix.lower() == '.onnx':
+        backend = OnnxDetector if task == 'detect' else OnnxClassifier
+        logger.info(f"Using onnxruntime (CPU) for {Path(model_path).name}")
+        return backend(model_path, num_threads, inter_op_threads)
+
+    from ultralytics import YOLO # pyright: ignore[reportPrivateImportUsage]
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+    return YOLO(str(model_path))
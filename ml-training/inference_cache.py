@@ -0,0 +1,239 @@
+"""
+Content-Hash Result Cache
+Two-tier (memory LRU + size-bounded disk) cache of flower inference results
+"""
+
+from pathlib import Path
+from typing import List, Dict, Optional, Union
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+def content_hash(data: Union[bytes, bytearray, memoryview]) -> str:
+    """
+    Hash encoded image bytes
+
+    Args:
+        data: Encoded image file contents
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def model_version(*model_paths: Union[str, Path]) -> str:
+    """
+    Identify a set of model weights by their contents
+
+    Paths that are not local files (e.g. hub model names) contribute their
+    name instead, so the version still changes when the model does.
+
+    Args:
+        model_paths: Detector / classifier weight files
+
+    Returns:
+        Short hex digest covering every model
+    """
+    digest = hashlib.sha256()
+    for model_path in model_paths:
+        path = Path(model_path)
+        if path.is_file():
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        else:
+            digest.update(str(model_path).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+class InferenceCache:
+    """
+    Result cache keyed by image content hash, model version and threshold
+
+    Lookups hit an in-memory LRU first, then a directory of JSON files whose
+    total size is kept under ``max_disk_bytes`` by evicting the least
+    recently used entries (hits refresh a file's mtime). Values are the
+    JSON-serializable flower lists produced by ``result_to_dict``.
+
+    Usage:
+        cache = InferenceCache('cache/inference', max_disk_bytes=256 << 20)
+        pipeline = FlowerDetectionPipeline(detector, classifier, cache=cache)
+
+        pipeline.process_image('frame.jpg')   # computed and stored
+        pipeline.process_image('frame.jpg')   # served from the cache
+    """
+
+    def __init__(self,
+                 cache_dir: Optional[str] = None,
+                 max_entries: int = 1024,
+                 max_disk_bytes: int = 512 << 20):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory of the disk tier (None for memory only)
+            max_entries: Max results held in the memory tier
+            max_disk_bytes: Max total size of the disk tier
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob('*/*.json'))
+
+    @staticmethod
+    def make_key(image_hash: str, version: str, conf_threshold: float) -> str:
+        """
+        Build a cache key
+
+        Args:
+            image_hash: content_hash() of the encoded image
+            version: model_version() of the models that produced the result
+            conf_threshold: Detection confidence threshold used
+
+        Returns:
+            Cache key
+        """
+        return hashlib.sha256(
+            f'{image_hash}:{version}:{conf_threshold:.6g}'.encode()
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """
+        Look up a result
+
+        Args:
+            key: Key from make_key()
+
+        Returns:
+            Cached flower list, or None on a miss
+        """
+        with self._lock:
+            flowers = self._memory.get(key)
+            if flowers is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return flowers
+
+        flowers = self._read_disk(key)
+        with self._lock:
+            if flowers is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, flowers)
+        return flowers
+
+    def put(self, key: str, flowers: List[Dict]):
+        """
+        Store a result in both tiers
+
+        Args:
+            key: Key from make_key()
+            flowers: JSON-serializable flower list
+        """
+        with self._lock:
+            self._remember(key, flowers)
+
+        if self.cache_dir is not None:
+            self._write_disk(key, flowers)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'disk_bytes': self._disk_bytes
+        }
+
+    def _remember(self, key: str, flowers: List[Dict]):
+        """Insert into the memory LRU (caller holds the lock)"""
+        self._memory[key] = flowers
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        # Two-level fan-out keeps directories small
+        return self.cache_dir / key[:2] / f'{key}.json'
+
+    def _read_disk(self, key: str) -> Optional[List[Dict]]:
+        if self.cache_dir is None:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                flowers = json.load(f)
+            os.utime(path)  # Mark as recently used for eviction
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path.name}: {e}")
+            return None
+        return flowers
+
+    def _write_disk(self, key: str, flowers: List[Dict]):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+
+        data = json.dumps(flowers).encode()
+        tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+        try:
+            previous = path.stat().st_size
+        except FileNotFoundError:
+            previous = 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._disk_bytes += len(data) - previous
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used disk entries until under 90% of the limit"""
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.glob('*/*.json'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort()
+
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_disk_bytes * 0.9)
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._disk_bytes = total
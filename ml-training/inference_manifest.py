@@ -0,0 +1,134 @@
+"""
+Incremental Processing Manifest
+Remembers which images of a directory were processed, by which models
+"""
+
+from pathlib import Path
+from typing import List, Dict, Optional
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '.flower_manifest.json'
+MANIFEST_VERSION = 1
+
+class InferenceManifest:
+    """
+    Manifest of processed images and their results
+
+    Each entry maps an image path (relative to the image directory) to its
+    size, mtime, content hash, the model version and confidence threshold
+    it was processed with, and the JSON-serializable flower list. An image
+    is unchanged when size and mtime match (no read needed) or, failing
+    that, when its content hash matches (e.g. after a copy or touch).
+
+    Usage:
+        manifest = InferenceManifest('flight_01/.flower_manifest.json')
+        flowers = manifest.match('IMG_0001.jpg', stat, version, 0.5)
+        ...
+        manifest.record('IMG_0002.jpg', stat, digest, version, 0.5, flowers)
+        manifest.save()
+    """
+
+    def __init__(self, manifest_path: str):
+        """
+        Load a manifest (a missing or unreadable file starts empty)
+
+        Args:
+            manifest_path: JSON manifest file
+        """
+        self.manifest_path = Path(manifest_path)
+        self.entries = {}
+        self.dirty = False
+
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path) as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.entries = data['images']
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable manifest {self.manifest_path}: {e}")
+
+    def match(self,
+              name: str,
+              stat: os.stat_result,
+              version: str,
+              conf_threshold: float,
+              digest: Optional[str] = None) -> Optional[List[Dict]]:
+        """
+        Stored flowers for an unchanged image
+
+        Args:
+            name: Image path relative to the image directory
+            stat: Current os.stat() of the image
+            version: Current model version
+            conf_threshold: Current detection threshold
+            digest: Content hash, to match images whose size/mtime changed
+
+        Returns:
+            Stored flower list, or None if the image must be processed
+        """
+        entry = self.entries.get(name)
+        if entry is None or entry['model_version'] != version or entry['conf'] != conf_threshold:
+            return None
+
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['flowers']
+
+        if digest is not None and entry['hash'] == digest:
+            # Same content under a new mtime; remember it so the next run skips the read
+            entry['size'] = stat.st_size
+            entry['mtime_ns'] = stat.st_mtime_ns
+            self.dirty = True
+            return entry['flowers']
+
+        return None
+
+    def record(self,
+               name: str,
+               stat: os.stat_result,
+               digest: str,
+               version: str,
+               conf_threshold: float,
+               flowers: List[Dict]):
+        """
+        Store the result of a processed image
+
+        Args:
+            name: Image path relative to the image directory
+            stat: os.stat() of the image when it was read
+            digest: Content hash of the image
+            version: Model version used
+            conf_threshold: Detection threshold used
+            flowers: JSON-serializable flower list
+        """
+        self.entries[name] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': digest,
+            'model_version': version,
+            'conf': conf_threshold,
+            'flowers': flowers
+        }
+        self.dirty = True
+
+    def prune(self, names: List[str]):
+        """Forget images that are no longer in the directory"""
+        keep = set(names)
+        for name in [name for name in self.entries if name not in keep]:
+            del self.entries[name]
+            self.dirty = True
+
+    def save(self):
+        """Write the manifest atomically (no-op when nothing changed)"""
+        if not self.dirty:
+            return
+
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'images': self.entries}, f)
+        os.replace(tmp_path, self.manifest_path)
+        self.dirty = False
@@ -0,0 +1,186 @@
+"""
+Pipeline Instrumentation
+Per-stage timing hooks and counters for FlowerDetectionPipeline, with
+Prometheus text exposition
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+# Stage latency buckets in seconds (Prometheus histogram "le" bounds)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Shared no-op context returned while no hook is installed
+_DISABLED = nullcontext()
+
+StageHook = Callable[[str, float], None]
+
+class _StageTimer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'PipelineMetrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        for hook in self.metrics.hooks:
+            hook(self.name, elapsed)
+        return False
+
+class PipelineMetrics:
+    """
+    Stage timing hooks and event counters shared by one or more pipelines
+
+    ``stage(name)`` wraps a pipeline stage; while no hook is installed it
+    returns a shared no-op context, so disabled instrumentation costs one
+    attribute check per stage. Hooks are called with (stage, seconds)
+    after every timed stage, on the thread that ran it.
+
+    Counters (images, flowers, cache hits, ...) are always kept; they are
+    incremented once per frame or batch, not per pixel.
+
+    Usage:
+        metrics = PipelineMetrics()
+        histogram = StageHistogram()
+        metrics.add_hook(histogram)
+        pipeline = FlowerDetectionPipeline(detector, classifier, metrics=metrics)
+        ...
+        print(render_prometheus(metrics, histogram))
+    """
+
+    def __init__(self):
+        self.hooks: Tuple[StageHook, ...] = ()
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.hooks)
+
+    def add_hook(self, hook: StageHook):
+        # Tuples are swapped atomically, so running stages never see a half-updated list
+        with self._lock:
+            self.hooks = self.hooks + (hook,)
+
+    def remove_hook(self, hook: StageHook):
+        with self._lock:
+            self.hooks = tuple(h for h in self.hooks if h is not hook)
+
+    def stage(self, name: str):
+        """Context manager timing one stage (no-op without hooks)"""
+        if not self.hooks:
+            return _DISABLED
+        return _StageTimer(self, name)
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+class StageHistogram:
+    """
+    Stage hook aggregating durations into cumulative histograms
+
+    Keeps Prometheus-style bucket counts, sum and count per stage, so
+    percentiles can be computed by the scraper over any window.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per stage: cumulative bucket counts (incl. +Inf), sum and count"""
+        with self._lock:
+            stages = {stage: (list(counts), total, n) for stage, (counts, total, n) in self._stages.items()}
+
+        output = {}
+        for stage, (counts, total, n) in stages.items():
+            cumulative, running = [], 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            output[stage] = {'buckets': cumulative, 'sum': total, 'count': n}
+        return output
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        if value != value:
+            return 'NaN'
+        if value in (float('inf'), float('-inf')):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+def render_prometheus(metrics: Optional[PipelineMetrics] = None,
+                      histogram: Optional[StageHistogram] = None,
+                      gauges: Optional[Dict[str, Tuple[str, float]]] = None,
+                      counters: Optional[Dict[str, Tuple[str, float]]] = None,
+                      prefix: str = 'flower_pipeline') -> str:
+    """
+    Render metrics in the Prometheus text exposition format (0.0.4)
+
+    Args:
+        metrics: Counters to export as ``<prefix>_<name>_total``
+        histogram: Stage durations, as ``<prefix>_stage_seconds{stage=...}``
+        gauges: Extra gauges, name -> (help text, value)
+        counters: Extra counters kept elsewhere, name -> (help text, value)
+        prefix: Metric name prefix
+
+    Returns:
+        Exposition text
+    """
+    lines: List[str] = []
+
+    if histogram is not None:
+        name = f'{prefix}_stage_seconds'
+        lines.append(f'# HELP {name} Time spent in each pipeline stage')
+        lines.append(f'# TYPE {name} histogram')
+        for stage, entry in sorted(histogram.snapshot().items()):
+            bounds = [_format_value(float(b)) for b in histogram.buckets] + ['+Inf']
+            for bound, count in zip(bounds, entry['buckets']):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {_format_value(entry["sum"])}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {entry["count"]}')
+
+    if metrics is not None:
+        for counter, value in sorted(metrics.counters().items()):
+            name = f'{prefix}_{counter}_total'
+            lines.append(f'# HELP {name} Pipeline {counter.replace("_", " ")}')
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name} {value}')
+
+    for kind, values in (('counter', counters), ('gauge', gauges)):
+        for name, (help_text, value) in sorted((values or {}).items()):
+            if value is None:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {_format_value(value)}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,478 @@
+"""
+Compiled Tree-Ensemble Inference
+Flattens the pollination readiness RandomForest into plain NumPy arrays
+and evaluates it with vectorized tree traversal (no sklearn at serve time)
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+# Node table (the portable description of the forest)
+NODE_ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots')
+
+# Lookup tables derived from the node table for vectorized evaluation
+TABLE_ARRAYS = ('split_values', 'split_offsets', 'masks', 'leaf_values')
+
+class CompiledForest:
+    """
+    RandomForestClassifier compiled into flat NumPy arrays
+
+    All trees share one node table:
+        feature[i], threshold[i]  split of node i
+        left[i], right[i]         global child indices (leaves point to themselves)
+        missing_left[i]           NaN inputs go left at node i (sklearn's missing_go_to_left)
+        value[i]                  class distribution of node i (rows sum to 1)
+        roots[t]                  root node of tree t
+
+    Evaluation does not walk the trees node by node. Leaves of each tree
+    are numbered left to right and tracked as a bitvector; a split whose
+    test fails (x > threshold) rules out every leaf of its left subtree,
+    and the exit leaf is the lowest surviving bit. Sorting each feature's
+    thresholds turns "all failed splits" into a prefix, so the AND of
+    their masks is precomputed per (feature, threshold rank, tree). A NaN
+    fails exactly the splits that send missing values right, which gets
+    one extra row per feature:
+        split_values    sorted unique thresholds, per feature
+        split_offsets   start of each feature in split_values
+        masks           [rank row, tree, word] prefix-AND leaf masks,
+                        len(thresholds) + 2 rows per feature (last: NaN)
+        leaf_values     [class, tree * leaf_slots + leaf] probabilities
+    A batch then costs one searchsorted per feature, one row gather per
+    feature, a bit scan and a leaf-value gather, and reproduces sklearn's
+    predict_proba exactly (inputs are cast to float32, compared with <=).
+
+    Usage:
+        forest = CompiledForest.load('artifacts/pollination_readiness_forest')
+        probs = forest.predict_proba(X)
+    """
+
+    def __init__(self,
+                 feature: np.ndarray,
+                 threshold: np.ndarray,
+                 left: np.ndarray,
+                 right: np.ndarray,
+                 missing_left: np.ndarray,
+                 value: np.ndarray,
+                 roots: np.ndarray,
+                 classes: np.ndarray,
+                 n_features: int,
+                 tables: Optional[Dict[str, np.ndarray]] = None,
+                 chunk_size: int = 256):
+        """
+        Initialize from flat node arrays
+
+        Args:
+            feature, threshold, left, right, missing_left, value, roots: Node table (see class doc)
+            classes: Class labels, as in RandomForestClassifier.classes_
+            n_features: Number of input features
+            tables: Precomputed lookup tables (built from the node table if None)
+            chunk_size: Rows evaluated at once (keeps temporaries cache-sized)
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = int(n_features)
+        self.chunk_size = chunk_size
+
+        if tables is None:
+            tables = self._build_tables()
+        self.split_values = tables['split_values']
+        self.split_offsets = tables['split_offsets']
+        self.masks = tables['masks']
+        self.leaf_values = tables['leaf_values']
+        self.leaf_slots = self.masks.shape[2] * 64
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'CompiledForest':
+        """
+        Compile a fitted RandomForestClassifier
+
+        Args:
+            model: Fitted sklearn RandomForestClassifier (single output)
+
+        Returns:
+            Compiled forest
+        """
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes)
+
+            left = np.where(is_leaf, node_ids, tree.children_left) + offset
+            right = np.where(is_leaf, node_ids, tree.children_right) + offset
+            # sklearn < 1.3 has no missing-value routing (it rejects NaN inputs)
+            missing_left = getattr(tree, 'missing_go_to_left', None)
+            if missing_left is None:
+                missing_left = np.zeros(n_nodes, dtype=np.uint8)
+
+            value = tree.value[:, 0, :].astype(np.float64)
+            value = value / value.sum(axis=1, keepdims=True)
+
+            features.append(np.where(is_leaf, -1, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(left.astype(np.int32))
+            rights.append(right.astype(np.int32))
+            missing.append(np.where(is_leaf, 0, missing_left).astype(np.uint8))
+            values.append(value)
+            roots.append(offset)
+
+            offset += n_nodes
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            missing_left=np.concatenate(missing),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int32),
+            classes=model.classes_,
+            n_features=model.n_features_in_
+        )
+
+    def _build_tables(self) -> Dict[str, np.ndarray]:
+        """Derive the bitvector lookup tables from the node table"""
+        n_nodes = len(self.feature)
+        n_trees = len(self.roots)
+        n_classes = self.value.shape[1]
+        is_leaf = self.left == np.arange(n_nodes)
+
+        # Number leaves left to right within each tree; span[n] is the
+        # half-open range of leaf numbers under node n
+        leaf_rank = np.full(n_nodes, -1, dtype=np.int64)
+        span_lo = np.zeros(n_nodes, dtype=np.int64)
+        span_hi = np.zeros(n_nodes, dtype=np.int64)
+        tree_of = np.zeros(n_nodes, dtype=np.int64)
+        max_leaves = 0
+
+        for t, root in enumerate(self.roots):
+            counter = 0
+            stack = [(int(root), False)]
+            while stack:
+                node, expanded = stack.pop()
+                tree_of[node] = t
+                if is_leaf[node]:
+                    leaf_rank[node] = counter
+                    span_lo[node], span_hi[node] = counter, counter + 1
+                    counter += 1
+                elif expanded:
+                    span_lo[node] = span_lo[self.left[node]]
+                    span_hi[node] = span_hi[self.right[node]]
+                else:
+                    stack.append((node, True))
+                    stack.append((int(self.right[node]), False))
+                    stack.append((int(self.left[node]), False))
+            max_leaves = max(max_leaves, counter)
+
+        n_words = max(1, (max_leaves + 63) // 64)
+        leaf_slots = n_words * 64
+
+        leaves = np.flatnonzero(is_leaf)
+        leaf_values = np.zeros((n_classes, n_trees * leaf_slots), dtype=np.float64)
+        leaf_values[:, tree_of[leaves] * leaf_slots + leaf_rank[leaves]] = self.value[leaves].T
+
+        split_values = []
+        split_offsets = [0]
+        mask_tables = []
+        all_ones = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+        for f in range(self.n_features_in_):
+            nodes = np.flatnonzero(~is_leaf & (self.feature == f))
+            uniques = np.unique(self.threshold[nodes])
+
+            # Row r holds the AND over splits whose threshold rank is < r;
+            # a sample lands on row searchsorted(uniques, x), i.e. it fails
+            # exactly the splits with threshold < x. The extra last row is
+            # for NaN and holds the AND over splits sending NaN right
+            table = np.full((len(uniques) + 1, n_trees, n_words), all_ones, dtype=np.uint64)
+            nan_row = np.full((1, n_trees, n_words), all_ones, dtype=np.uint64)
+            rows = np.searchsorted(uniques, self.threshold[nodes]) + 1
+            for node, row in zip(nodes, rows):
+                bits = np.ones(leaf_slots, dtype=bool)
+                bits[span_lo[self.left[node]]:span_hi[self.left[node]]] = False
+                word = np.packbits(bits, bitorder='little').view(np.uint64)
+                table[row, tree_of[node]] &= word
+                if not self.missing_left[node]:
+                    nan_row[0, tree_of[node]] &= word
+            mask_tables.append(np.bitwise_and.accumulate(table, axis=0))
+            mask_tables.append(nan_row)
+
+            split_values.append(uniques)
+            split_offsets.append(split_offsets[-1] + len(uniques))
+
+        return {
+            'split_values': np.concatenate(split_values).astype(np.float64),
+            'split_offsets': np.asarray(split_offsets, dtype=np.int64),
+            'masks': np.concatenate(mask_tables),
+            'leaf_values': leaf_values
+        }
+
+    def predict_proba(self, X) -> np.ndarray:
+        """
+        Class probabilities, identical to RandomForestClassifier.predict_proba
+
+        Args:
+            X: Feature matrix (n_samples, n_features)
+
+        Returns:
+            Probabilities (n_samples, n_classes)
+        """
+        # sklearn evaluates trees on float32 inputs
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"Expected input of shape (n, {self.n_features_in_}), got {X.shape}"
+            )
+        X = X.astype(np.float64)
+
+        probs = np.empty((len(X), self.leaf_values.shape[0]), dtype=np.float64)
+        for start in range(0, len(X), self.chunk_size):
+            chunk = X[start:start + self.chunk_size]
+            probs[start:start + len(chunk)] = self._predict_chunk(chunk)
+        return probs
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        """Evaluate all trees for one chunk of rows"""
+        acc = None
+        for f in range(self.n_features_in_):
+            start, stop = self.split_offsets[f], self.split_offsets[f + 1]
+            # Row offset: the table of feature f has (stop - start + 2) rows
+            base = start + 2 * f
+            rows = np.searchsorted(self.split_values[start:stop], X[:, f]) + base
+            missing = np.isnan(X[:, f])
+            if missing.any():
+                rows[missing] = base + (stop - start) + 1
+            if acc is None:
+                acc = self.masks[rows]
+            else:
+                np.bitwise_and(acc, self.masks[rows], out=acc)
+
+        if acc is None:
+            raise ValueError("Forest has no features")
+
+        leaf = _first_set_bit(acc)
+        leaf += np.arange(len(self.roots)) * self.leaf_slots
+
+        # Same reduction as sklearn: add tree probabilities one tree at a
+        # time, then divide. Reducing over the leading (tree) axis keeps
+        # that order; pairwise summation along rows would differ in the
+        # last bit for impure leaves
+        leaf = np.ascontiguousarray(leaf.T)
+        sums = [np.take(values, leaf).sum(axis=0) for values in self.leaf_values]
+        return np.stack(sums, axis=1) / len(self.roots)
+
+    def predict(self, X) -> np.ndarray:
+        """Predicted class labels (argmax of predict_proba)"""
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def save(self, output_dir: str):
+        """
+        Save as one uncompressed .npy per array plus a JSON header
+
+        Separate .npy files (unlike .npz) can be memory-mapped, so every
+        server process maps the same pages instead of holding a copy.
+
+        Args:
+            output_dir: Directory to write
+        """
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+
+        for name in NODE_ARRAYS + TABLE_ARRAYS:
+            np.save(output_path / f'{name}.npy', getattr(self, name))
+
+        with open(output_path / 'forest.json', 'w') as f:
+            json.dump({
+                'classes': self.classes_.tolist(),
+                'n_features': self.n_features_in_,
+                'n_estimators': self.n_estimators,
+                'n_nodes': int(len(self.feature))
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, input_dir: str, mmap_mode: Optional[str] = 'r') -> 'CompiledForest':
+        """
+        Load a forest written by save()
+
+        Args:
+            input_dir: Directory written by save()
+            mmap_mode: numpy mmap mode ('r' shares pages between processes, None copies)
+
+        Returns:
+            Compiled forest
+        """
+        input_path = Path(input_dir)
+        if not (input_path / 'missing_left.npy').exists():
+            raise ValueError(
+                f"{input_dir} was exported without missing-value routing, "
+                "re-export it with readiness_forest.py"
+            )
+        with open(input_path / 'forest.json') as f:
+            header = json.load(f)
+
+        def load_array(name):
+            return np.load(input_path / f'{name}.npy', mmap_mode=mmap_mode)
+
+        return cls(
+            classes=np.asarray(header['classes']),
+            n_features=header['n_features'],
+            tables={name: load_array(name) for name in TABLE_ARRAYS},
+            **{name: load_array(name) for name in NODE_ARRAYS}
+        )
+
+def _first_set_bit(words: np.ndarray) -> np.ndarray:
+    """
+    Index of the lowest set bit across the last (word) axis
+
+    Args:
+        words: uint64 array [..., n_words], at least one bit set per row
+
+    Returns:
+        Bit index per row (int64)
+    """
+    n_words = words.shape[-1]
+    word = words[..., n_words - 1]
+    base = np.full(word.shape, (n_words - 1) * 64, dtype=np.int64)
+    for w in range(n_words - 2, -1, -1):
+        nonzero = words[..., w] != 0
+        word = np.where(nonzero, words[..., w], word)
+        base[nonzero] = w * 64
+
+    lowest = word & (~word + np.uint64(1))
+    if hasattr(np, 'bitwise_count'):
+        # numpy >= 2.0: popcount of (lowest - 1) is the bit position
+        return base + np.bitwise_count(lowest - np.uint64(1)).astype(np.int64)
+    # Powers of two convert to float64 exactly
+    return base + np.log2(lowest.astype(np.float64)).astype(np.int64)
+
+def export_onnx(model, output_path: str, n_features: int = 4):
+    """
+    Export the sklearn forest to ONNX (requires skl2onnx)
+
+    Args:
+        model: Fitted RandomForestClassifier
+        output_path: Destination .onnx file
+        n_features: Number of input features
+    """
+    try:
+        from skl2onnx import to_onnx
+    except ImportError as e:
+        raise ImportError("ONNX export requires skl2onnx: pip install skl2onnx") from e
+
+    onnx_model = to_onnx(
+        model,
+        np.zeros((1, n_features), dtype=np.float32),
+        options={id(model): {'zipmap': False}},
+        target_opset=12
+    )
+    with open(output_path, 'wb') as f:
+        f.write(onnx_model.SerializeToString())
+    return output_path
+
+def with_missing_values(X: np.ndarray, rows: int = 50) -> np.ndarray:
+    """
+    Copies of the first rows of X with NaN in each feature, and in all of them
+
+    Args:
+        X: Feature matrix (n_samples, n_features)
+        rows: Rows of X to blank out
+
+    Returns:
+        (rows * (n_features + 1), n_features) float array
+    """
+    sample = np.asarray(X, dtype=np.float64)[:rows]
+    blanked = []
+    for f in range(sample.shape[1]):
+        copy = sample.copy()
+        copy[:, f] = np.nan
+        blanked.append(copy)
+    blanked.append(np.full_like(sample, np.nan))
+    return np.concatenate(blanked)
+
+def verify(model, forest: CompiledForest, X: np.ndarray) -> bool:
+    """
+    Check the compiled forest reproduces sklearn's probabilities exactly
+
+    Rows of X with blanked-out (NaN) features are checked too, since blank
+    CSV cells reach the model as NaN. sklearn versions that reject NaN
+    inputs have no reference routing, so only X is compared with them.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    try:
+        missing = with_missing_values(X)
+        model.predict_proba(missing[:1])
+        X = np.concatenate([X, missing])
+    except ValueError:
+        pass
+    expected = model.predict_proba(X)
+    actual = forest.predict_proba(X)
+    return bool(np.array_equal(expected, actual))
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    import joblib
+    import pandas as pd
+
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    ARTIFACT_DIR = os.path.join(BASE_DIR, 'artifacts')
+
+    parser = argparse.ArgumentParser(description='Compile the readiness RandomForest to flat arrays')
+    parser.add_argument('--model', type=str,
+                        default=os.path.join(ARTIFACT_DIR, 'pollination_readiness_model.joblib'),
+                        help='Trained RandomForest (.joblib)')
+    parser.add_argument('--output', type=str,
+                        default=os.path.join(ARTIFACT_DIR, 'pollination_readiness_forest'),
+                        help='Output directory for the compiled forest')
+    parser.add_argument('--onnx', type=str, default=None,
+                        help='Also export ONNX to this path')
+    parser.add_argument('--verify', type=str,
+                        default=os.path.join(BASE_DIR, 'datasets', 'pollination',
+                                             'pollination_readiness_test.csv'),
+                        help='CSV used to check predictions match sklearn')
+
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    forest = CompiledForest.from_sklearn(model)
+    forest.save(args.output)
+    print(f"✓ Compiled {forest.n_estimators} trees ({len(forest.feature)} nodes) → {args.output}")
+
+    if args.verify and os.path.exists(args.verify):
+        feature_cols = ["temperature", "humidity", "light_lux", "soil_moisture"]
+        X = pd.read_csv(args.verify)[feature_cols].to_numpy()
+
+        if not verify(model, forest, X):
+            raise SystemExit("✗ Compiled forest does not match sklearn predictions")
+        print(f"✓ Predictions match sklearn on {len(X)} rows (plus rows with missing values)")
+
+        for name, fn in (('sklearn', model.predict_proba), ('compiled', forest.predict_proba)):
+            start = time.perf_counter()
+            for row in X[:50]:
+                fn(row[None, :])
+            single = (time.perf_counter() - start) / 50 * 1000
+            start = time.perf_counter()
+            fn(X)
+            batch = len(X) / (time.perf_counter() - start)
+            print(f"  {name:<9} single-row {single:.3f} ms, batch {batch:,.0f} rows/s")
+
+    if args.onnx:
+        export_onnx(model, args.onnx, n_features=forest.n_features_in_)
+        print(f"✓ ONNX export → {args.onnx}")
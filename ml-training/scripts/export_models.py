@@ -1,13 +1,24 @@
 """
 Model Export Utilities
 Exports trained models to various formats for edge deployment
-Supports: ONNX, TensorRT, OpenVINO, CoreML, TFlite
+Supports: ONNX, TensorRT, OpenVINO, CoreML, TFlite, INT8 ONNX
 """
 
 import argparse
+import json
+import re
+import sys
+import time
 from pathlib import Path
 from ultralytics import YOLO # pyright: ignore[reportPrivateImportUsage]
 import torch
+import numpy as np
+import cv2
+
+# The runtime backends (preprocessing, onnxruntime sessions) live next to the training code
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png')
 
 class ModelExporter:
     """Handles model export to different formats"""
@@ -165,6 +176,43 @@ class ModelExporter:
             print(f"✗ CoreML export failed: {e}")
             return None
     
+    def export_int8(self, calibration_dir, imgsz=640, num_images=200, val_data=None,
+                    per_channel=True, calibrate_method='minmax', num_threads=None):
+        """
+        Export to ONNX and quantize to static INT8
+        Best for CPU-only servers (x86 and ARM)
+        
+        Args:
+            calibration_dir: Calibration images (DatasetPreparator.create_calibration_set)
+            imgsz: Image size for export
+            num_images: Max calibration images
+            val_data: dataset.yaml (detector) or classification directory for
+                the accuracy part of the report (None reports latency only)
+            per_channel: Per-channel weight scales
+            calibrate_method: 'minmax', 'entropy' or 'percentile'
+            num_threads: CPU threads for the latency comparison
+        """
+        print("\n=== Exporting to INT8 ONNX ===")
+        task = 'detect' if self.model.task == 'detect' else 'classify'
+        
+        try:
+            # Per-channel QuantizeLinear needs opset 13
+            fp32_path = Path(self.model.export(format='onnx', imgsz=imgsz, opset=13, device='cpu'))
+            int8_path = quantize_int8(
+                fp32_path, calibration_dir, task,
+                output_path=self.output_dir / f"{self.model_path.stem}_int8.onnx",
+                num_images=num_images,
+                per_channel=per_channel,
+                calibrate_method=calibrate_method
+            )
+        except Exception as e:
+            print(f"✗ INT8 export failed: {e}")
+            return None
+        
+        compare_int8(fp32_path, int8_path, task, calibration_dir,
+                     val_data=val_data, num_threads=num_threads)
+        return int8_path
+    
     def export_all(self, imgsz=640):
         """Export to all available formats"""
         print("=== Exporting to All Formats ===\n")
@@ -204,6 +252,222 @@ class ModelExporter:
         
         print(f"\nAll exports saved to: {self.output_dir}")
 
+class ImageCalibrationReader:
+    """
+    Feeds calibration images to onnxruntime's static quantizer
+    
+    Images are preprocessed by the same backend code used at inference
+    (letterbox for detectors, center crop + normalization for
+    classifiers), so activation ranges match production inputs.
+    """
+    
+    def __init__(self, model, image_paths):
+        """
+        Args:
+            model: OnnxDetector / OnnxClassifier of the FP32 model
+            image_paths: Calibration images
+        """
+        self.model = model
+        self.image_paths = list(image_paths)
+        self.rewind()
+    
+    def get_next(self):
+        for image_path in self._remaining:
+            image = cv2.imread(str(image_path))
+            if image is None:
+                continue
+            batch = self.model.preprocess([image])
+            if isinstance(batch, tuple):
+                batch = batch[0]
+            return {self.model.input_name: batch}
+        return None
+    
+    def rewind(self):
+        self._remaining = iter(self.image_paths)
+
+def _list_images(image_dir):
+    return sorted(p for p in Path(image_dir).rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)
+
+def _detection_head_postprocess(onnx_path):
+    """
+    Box-decoding nodes of a YOLOv8 ONNX export (non-Conv nodes of the last
+    /model.N/ layer), which lose most accuracy when quantized
+    """
+    import onnx
+    
+    nodes = onnx.load(str(onnx_path)).graph.node
+    layers = [int(m.group(1)) for m in (re.match(r'/model\.(\d+)/', node.name) for node in nodes) if m]
+    if not layers:
+        return []
+    head = f"/model.{max(layers)}/"
+    return [node.name for node in nodes if node.name.startswith(head) and node.op_type != 'Conv']
+
+def onnx_task(onnx_path):
+    """'detect' for (batch, 4 + classes, anchors) outputs, else 'classify'"""
+    import onnxruntime as ort
+    
+    session = ort.InferenceSession(str(onnx_path), providers=['CPUExecutionProvider'])
+    return 'detect' if len(session.get_outputs()[0].shape) == 3 else 'classify'
+
+def quantize_int8(onnx_path, calibration_dir, task, output_path=None, num_images=200,
+                  per_channel=True, calibrate_method='minmax'):
+    """
+    Static INT8 quantization of an FP32 ONNX model
+    
+    Weights are quantized per channel (int8) and activations per tensor
+    (uint8) in QDQ format, which onnxruntime fuses into integer kernels on
+    both x86 (VNNI/AVX2) and ARM (NEON dot product).
+    
+    Args:
+        onnx_path: FP32 .onnx model (YOLOv8 detector/classifier or ResNet18 CNN)
+        calibration_dir: Calibration images
+        task: 'detect' or 'classify'
+        output_path: INT8 model path (default: <stem>_int8.onnx next to the input)
+        num_images: Max calibration images
+        per_channel: Per-channel weight scales
+        calibrate_method: 'minmax', 'entropy' or 'percentile'
+        
+    Returns:
+        Path of the INT8 model
+    """
+    from onnxruntime.quantization import (CalibrationMethod, QuantFormat, QuantType,
+                                          quant_pre_process, quantize_static)
+    from inference_backends import OnnxClassifier, OnnxDetector
+    
+    onnx_path = Path(onnx_path)
+    output_path = Path(output_path or onnx_path.with_name(f"{onnx_path.stem}_int8.onnx"))
+    methods = {
+        'minmax': CalibrationMethod.MinMax,
+        'entropy': CalibrationMethod.Entropy,
+        'percentile': CalibrationMethod.Percentile
+    }
+    
+    image_paths = _list_images(calibration_dir)[:num_images]
+    if not image_paths:
+        raise FileNotFoundError(f"No calibration images in {calibration_dir}")
+    print(f"Calibrating {onnx_path.name} on {len(image_paths)} images ({calibrate_method})...")
+    
+    model = (OnnxDetector if task == 'detect' else OnnxClassifier)(onnx_path)
+    
+    # Shape inference and graph cleanup give the quantizer more to fuse
+    prepared_path = output_path.with_name(f"{onnx_path.stem}_prep.onnx")
+    try:
+        quant_pre_process(str(onnx_path), str(prepared_path))
+        model_input = prepared_path
+    except Exception as e:
+        print(f"  ⚠ Pre-processing skipped: {e}")
+        model_input = onnx_path
+    
+    try:
+        quantize_static(
+            str(model_input),
+            str(output_path),
+            ImageCalibrationReader(model, image_paths),
+            quant_format=QuantFormat.QDQ,
+            per_channel=per_channel,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            nodes_to_exclude=_detection_head_postprocess(model_input) if task == 'detect' else None,
+            calibrate_method=methods[calibrate_method]
+        )
+    finally:
+        prepared_path.unlink(missing_ok=True)
+    
+    print(f"✓ INT8 quantization successful")
+    print(f"  Output: {output_path}")
+    return output_path
+
+def _time_model(model, images, runs=50, warmup=5):
+    """Single-image latency (ms) of backend predict() calls"""
+    for i in range(warmup):
+        model.predict([images[i % len(images)]])
+    
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        model.predict([images[i % len(images)]])
+        latencies.append((time.perf_counter() - start) * 1000)
+    
+    latencies = np.array(latencies)
+    return {
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p90': float(np.percentile(latencies, 90)),
+        'images_per_s': float(1000 / latencies.mean())
+    }
+
+def compare_int8(fp32_path, int8_path, task, benchmark_dir, val_data=None,
+                 runs=50, warmup=5, num_threads=None, report_path=None):
+    """
+    Accuracy-versus-latency report of an INT8 model against its FP32 source
+    
+    Latency is measured with the onnxruntime CPU backend used in
+    production; accuracy uses the ModelValidator metrics (mAP / precision /
+    recall for detectors, top-1 / top-5 for classifiers).
+    
+    Args:
+        fp32_path: FP32 .onnx model
+        int8_path: INT8 .onnx model
+        task: 'detect' or 'classify'
+        benchmark_dir: Images to time inference on (e.g. the calibration set)
+        val_data: dataset.yaml (detector) or classification directory (None
+            skips accuracy)
+        runs: Timed runs per model
+        warmup: Untimed runs per model
+        num_threads: CPU threads per operator (None for all cores)
+        report_path: JSON report (default: <int8 stem>_report.json)
+        
+    Returns:
+        Report dict
+    """
+    from inference_backends import load_model
+    from validate_models import ModelValidator
+    
+    images = [cv2.imread(str(p)) for p in _list_images(benchmark_dir)[:16]]
+    images = [image for image in images if image is not None]
+    if not images:
+        raise FileNotFoundError(f"No benchmark images in {benchmark_dir}")
+    
+    report = {'task': task, 'threads': num_threads}
+    for name, path in (('fp32', Path(fp32_path)), ('int8', Path(int8_path))):
+        print(f"\n--- {name.upper()}: {path.name} ---")
+        entry = {'path': str(path), 'size_mb': path.stat().st_size / 2**20}
+        entry.update(_time_model(load_model(path, task, num_threads), images, runs, warmup))
+        
+        if val_data:
+            validator = ModelValidator(None, None)
+            if task == 'detect':
+                validator.detector = YOLO(str(path), task='detect')
+                validator.validate_detector(val_data)
+                entry['metrics'] = validator.validation_results['detector']['metrics']
+            else:
+                entry['metrics'] = validator.validate_onnx_classifier(path, val_data)['metrics']
+        report[name] = entry
+    
+    fp32, int8 = report['fp32'], report['int8']
+    report['speedup'] = fp32['latency_ms_p50'] / int8['latency_ms_p50']
+    report['size_ratio'] = int8['size_mb'] / fp32['size_mb']
+    if val_data:
+        report['metric_delta'] = {
+            metric: int8['metrics'][metric] - value for metric, value in fp32['metrics'].items()
+        }
+    
+    report_path = Path(report_path or Path(int8_path).with_name(f"{Path(int8_path).stem}_report.json"))
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    print("\n" + "="*50)
+    print("INT8 vs FP32")
+    print("="*50)
+    print(f"  Latency p50: {fp32['latency_ms_p50']:.2f}ms -> {int8['latency_ms_p50']:.2f}ms "
+          f"({report['speedup']:.2f}x)")
+    print(f"  Throughput:  {fp32['images_per_s']:.1f} -> {int8['images_per_s']:.1f} images/s")
+    print(f"  Size:        {fp32['size_mb']:.1f}MB -> {int8['size_mb']:.1f}MB")
+    for metric, delta in report.get('metric_delta', {}).items():
+        print(f"  {metric}: {fp32['metrics'][metric]:.4f} -> {int8['metrics'][metric]:.4f} ({delta:+.4f})")
+    print(f"\nReport saved to: {report_path}")
+    
+    return report
+
 def get_export_recommendations():
     """Get deployment recommendations by target platform"""
     recommendations = {
@@ -226,7 +490,7 @@ if __name__ == "__main__":
     parser.add_argument('--model', type=str, required=True,
                         help='Path to trained model (best.pt)')
     parser.add_argument('--format', type=str, default='all',
-                        choices=['all', 'onnx', 'tensorrt', 'openvino', 'tflite', 'coreml'],
+                        choices=['all', 'onnx', 'tensorrt', 'openvino', 'tflite', 'coreml', 'int8'],
                         help='Export format')
     parser.add_argument('--imgsz', type=int, default=640,
                         help='Image size for export')
@@ -234,11 +498,41 @@ if __name__ == "__main__":
                         help='Show platform recommendations')
     parser.add_argument('--output-dir', type=str, default=None,
                         help='Output directory (optional)')
+    parser.add_argument('--calibration-data', type=str, default=None,
+                        help='INT8: calibration images (prepare_dataset.py --calibration)')
+    parser.add_argument('--calibration-size', type=int, default=200,
+                        help='INT8: max calibration images')
+    parser.add_argument('--calibrate-method', type=str, default='minmax',
+                        choices=['minmax', 'entropy', 'percentile'],
+                        help='INT8: activation range calibration')
+    parser.add_argument('--per-tensor', action='store_true',
+                        help='INT8: one weight scale per tensor instead of per channel')
+    parser.add_argument('--val-data', type=str, default=None,
+                        help='INT8: dataset.yaml or classification directory for the accuracy report')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='INT8: CPU threads for the latency comparison')
     
     args = parser.parse_args()
     
+    if args.format == 'int8' and not args.calibration_data:
+        parser.error('--format int8 requires --calibration-data')
+    
     if args.recommendations:
         get_export_recommendations()
+    elif args.format == 'int8' and args.model.endswith('.onnx'):
+        # Already exported (e.g. the ResNet18 CNN from export_cnn_to_onnx.py)
+        task = onnx_task(args.model)
+        output_dir = Path(args.output_dir) if args.output_dir else Path(args.model).parent
+        output_dir.mkdir(parents=True, exist_ok=True)
+        int8_path = quantize_int8(
+            args.model, args.calibration_data, task,
+            output_path=output_dir / f"{Path(args.model).stem}_int8.onnx",
+            num_images=args.calibration_size,
+            per_channel=not args.per_tensor,
+            calibrate_method=args.calibrate_method
+        )
+        compare_int8(args.model, int8_path, task, args.calibration_data,
+                     val_data=args.val_data, num_threads=args.threads)
     else:
         exporter = ModelExporter(args.model)
         
@@ -248,5 +542,15 @@ if __name__ == "__main__":
         
         if args.format == 'all':
             exporter.export_all(args.imgsz)
+        elif args.format == 'int8':
+            exporter.export_int8(
+                args.calibration_data,
+                imgsz=args.imgsz,
+                num_images=args.calibration_size,
+                val_data=args.val_data,
+                per_channel=not args.per_tensor,
+                calibrate_method=args.calibrate_method,
+                num_threads=args.threads
+            )
         else:
             getattr(exporter, f"export_{args.format}")(args.imgsz)
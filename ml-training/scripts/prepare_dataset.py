@@ -7,6 +7,7 @@ import argparse
 import yaml
 from pathlib import Path
 import shutil
+import random
 from sklearn.model_selection import train_test_split
 import json
 
@@ -140,6 +141,63 @@ class DatasetPreparator:
         
         print(f"✓ Total - Train: {total_train}, Val: {total_val}")
     
+    def create_calibration_set(self, task='detection', num_images=200, split='train', seed=42):
+        """
+        Sample a calibration set for INT8 quantization
+        
+        Images are drawn from a prepared dataset split (classification
+        images evenly across classes) and copied to
+        <data_dir>/calibration/<task>, so quantization runs are repeatable.
+        
+        Args:
+            task: 'detection' or 'classification'
+            num_images: Number of images to sample
+            split: Dataset split to sample from
+            seed: Random seed
+            
+        Returns:
+            Calibration directory
+        """
+        print(f"Creating {task} calibration set...")
+        
+        if task == 'detection':
+            groups = [sorted((self.detection_dir / 'images' / split).glob('*'))]
+        elif task == 'classification':
+            groups = [
+                sorted(class_dir.glob('*'))
+                for class_dir in sorted((self.classification_dir / split).iterdir())
+                if class_dir.is_dir()
+            ]
+        else:
+            raise ValueError("task must be 'detection' or 'classification'")
+        
+        groups = [[f for f in group if f.suffix.lower() in ('.jpg', '.jpeg', '.png')] for group in groups]
+        groups = [group for group in groups if group]
+        if not groups:
+            raise FileNotFoundError(f"No {split} images found; prepare the {task} dataset first")
+        
+        # Take an equal share from every class, then fill up from the rest
+        rng = random.Random(seed)
+        for group in groups:
+            rng.shuffle(group)
+        share = num_images // len(groups)
+        selected = [f for group in groups for f in group[:share]]
+        rest = [f for group in groups for f in group[share:]]
+        rng.shuffle(rest)
+        selected += rest[:max(num_images - len(selected), 0)]
+        
+        calibration_dir = self.data_dir / 'calibration' / task
+        if calibration_dir.exists():
+            shutil.rmtree(calibration_dir)
+        calibration_dir.mkdir(parents=True)
+        
+        for i, f in enumerate(selected):
+            # Prefix keeps same-named images from different classes apart
+            shutil.copy2(f, calibration_dir / f"{i:05d}_{f.name}")
+        
+        print(f"✓ Calibration: {len(selected)} images in {calibration_dir}")
+        return calibration_dir
+    
     def _create_detection_yaml(self, train_count, val_count):
         """Create dataset.yaml for detection"""
         yaml_path = self.detection_dir / 'dataset.yaml'
@@ -210,6 +268,8 @@ if __name__ == "__main__":
                         help='Classification dataset directory')
     parser.add_argument('--split-ratio', type=float, default=0.8,
                         help='Training split ratio')
+    parser.add_argument('--calibration', type=int, default=0,
+                        help='Sample this many images per task for INT8 calibration')
     parser.add_argument('--validate', action='store_true',
                         help='Validate dataset')
     parser.add_argument('--manifest', action='store_true',
@@ -232,6 +292,12 @@ if __name__ == "__main__":
             args.split_ratio
         )
     
+    if args.calibration:
+        for task, prepared in [('detection', preparator.detection_dir / 'images' / 'train'),
+                               ('classification', preparator.classification_dir / 'train')]:
+            if prepared.exists():
+                preparator.create_calibration_set(task, args.calibration)
+    
     if args.validate:
         preparator.validate_dataset()
     
@@ -8,7 +8,98 @@ from pathlib import Path
 from ultralytics.models.yolo import YOLO
 import torch
 import json
+import os
+import platform
+import sys
+import threading
+import time
 from datetime import datetime
+import cv2
+import numpy as np
+
+# The runtime backends (onnxruntime sessions) live next to the training code
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+BENCHMARK_BATCH_SIZES = (1, 4, 16, 64)
+BENCHMARK_FORMATS = ('pt', 'onnx', 'onnx-int8', 'openvino', 'tflite')
+
+def default_device():
+    """First GPU when CUDA is available, else the CPU"""
+    return 0 if torch.cuda.is_available() else 'cpu'
+
+def find_exported_models(model_path):
+    """
+    Locate the exports of a trained model
+    
+    Looks next to the weights (where ultralytics writes exports) and in
+    the exported/ directory used by export_models.py.
+    
+    Args:
+        model_path: Path to trained .pt model (or any single export)
+        
+    Returns:
+        Dict of format -> path, for the formats that exist
+    """
+    model_path = Path(model_path)
+    stem = model_path.stem
+    if model_path.suffix != '.pt':
+        fmt = 'onnx-int8' if stem.endswith('_int8') else {
+            '.onnx': 'onnx', '.tflite': 'tflite'
+        }.get(model_path.suffix, 'openvino')
+        return {fmt: model_path}
+    
+    candidates = {
+        'pt': [f"{stem}.pt"],
+        'onnx': [f"{stem}.onnx"],
+        'onnx-int8': [f"{stem}_int8.onnx"],
+        'openvino': [f"{stem}_openvino_model"],
+        'tflite': [f"{stem}_saved_model/{stem}_float32.tflite", f"{stem}.tflite"],
+    }
+    found = {}
+    for fmt, names in candidates.items():
+        for directory in (model_path.parent, model_path.parent.parent / 'exported'):
+            matches = [directory / name for name in names if (directory / name).exists()]
+            if matches:
+                found[fmt] = matches[0]
+                break
+    return found
+
+def _current_rss_mb():
+    """Resident set size of this process, or None if it cannot be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        return None
+
+class _PeakRss:
+    """Samples RSS on a background thread while the block runs"""
+    
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+    
+    def __enter__(self):
+        self.peak_mb = _current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+    
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = _current_rss_mb()
+            if rss is not None:
+                self.peak_mb = max(self.peak_mb or 0, rss)
 
 class ModelValidator:
     """Validates and evaluates trained models"""
@@ -22,6 +113,8 @@ class ModelValidator:
             classifier_model_path: Path to classification model
         """
         print("Loading models...")
+        self.detection_model_path = detection_model_path
+        self.classifier_model_path = classifier_model_path
         self.detector = YOLO(detection_model_path) if detection_model_path else None
         self.classifier = YOLO(classifier_model_path) if classifier_model_path else None
         self.validation_results = {}
@@ -76,6 +169,57 @@ class ModelValidator:
         
         return metrics
     
+    def validate_onnx_classifier(self, onnx_path, data_dir, split='val', batch_size=32):
+        """
+        Validate an ONNX classifier (e.g. the ResNet18 readiness CNN) with onnxruntime
+        
+        Class indices follow the sorted class subdirectories of the split,
+        as in training. Metrics use the same keys as validate_classifier.
+        
+        Args:
+            onnx_path: Path to .onnx classifier
+            data_dir: Classification dataset directory (class subdirectories per split)
+            split: Split to evaluate
+            batch_size: Images per forward pass
+        """
+        from inference_backends import OnnxClassifier
+        
+        print(f"\n=== Validating ONNX Classifier: {Path(onnx_path).name} ===")
+        model = OnnxClassifier(onnx_path)
+        
+        split_dir = Path(data_dir) / split
+        class_dirs = sorted(d for d in split_dir.iterdir() if d.is_dir())
+        samples = [
+            (image_path, label)
+            for label, class_dir in enumerate(class_dirs)
+            for image_path in sorted(class_dir.glob('*'))
+            if image_path.suffix.lower() in ('.jpg', '.jpeg', '.png')
+        ]
+        
+        top1 = top5 = 0
+        for start in range(0, len(samples), batch_size):
+            chunk = samples[start:start + batch_size]
+            images = [cv2.imread(str(image_path)) for image_path, _ in chunk]
+            for result, (_, label) in zip(model.predict(images), chunk):
+                ranked = np.argsort(-result.probs.data)
+                top1 += int(ranked[0] == label)
+                top5 += int(label in ranked[:5])
+        
+        total = max(len(samples), 1)
+        results = {
+            'model': f'ONNX Classifier ({Path(onnx_path).name})',
+            'timestamp': datetime.now().isoformat(),
+            'metrics': {
+                'top1_accuracy': top1 / total,
+                'top5_accuracy': top5 / total,
+            }
+        }
+        
+        self.validation_results['classifier'] = results
+        self._print_classification_metrics(results)
+        
+        return results
+    
     def _print_detection_metrics(self, results):
         """Pretty print detection metrics"""
         metrics = results['metrics']
@@ -92,69 +236,222 @@ class ModelValidator:
         print(f"  Top-1 Accuracy: {metrics['top1_accuracy']:.4f} {'✓' if metrics['top1_accuracy'] > 0.85 else '⚠'}")
         print(f"  Top-5 Accuracy: {metrics['top5_accuracy']:.4f}")
     
-    def test_inference_speed(self, test_image_path, imgsz=640):
+    def test_inference_speed(self, test_image_path, imgsz=640, warmup=10, runs=50):
         """
         Test inference speed for detection
         
         Args:
             test_image_path: Path to test image
             imgsz: Image size for detection
+            warmup: Untimed runs before measuring
+            runs: Timed runs
         """
         if not self.detector:
             print("Detector model not loaded")
             return
         
         print(f"\n=== Testing Detection Inference Speed ===")
-        results = self.detector.predict(
-            source=test_image_path,
-            imgsz=imgsz,
-            device=0 if torch.cuda.is_available() else 'cpu',
-            verbose=False
-        )
-        
-        # Results contain timing information
-        if results:
-            result = results[0]
-            if hasattr(result, 'speed'):
-                print(f"  Preprocess: {result.speed.get('preprocess', 0):.2f}ms")
-                print(f"  Inference:  {result.speed.get('inference', 0):.2f}ms")
-                print(f"  Postprocess: {result.speed.get('postprocess', 0):.2f}ms")
-                total = sum(result.speed.values()) # type: ignore
-                print(f"  Total:      {total:.2f}ms")
-        
-        return results
+        run = self._benchmark_model(self.detector, 'detector', Path(self.detection_model_path).suffix.lstrip('.'),
+                                    [cv2.imread(str(test_image_path))],
+                                    batch_size=1, imgsz=imgsz, warmup=warmup, runs=runs)
+        self.validation_results.setdefault('speed', {})['detector'] = run
+        return run
     
-    def test_classification_speed(self, test_image_path, imgsz=224):
+    def test_classification_speed(self, test_image_path, imgsz=224, warmup=10, runs=50):
         """
         Test inference speed for classification
         
         Args:
             test_image_path: Path to test image
             imgsz: Image size for classification
+            warmup: Untimed runs before measuring
+            runs: Timed runs
         """
         if not self.classifier:
             print("Classifier model not loaded")
             return
         
         print(f"\n=== Testing Classification Inference Speed ===")
-        results = self.classifier.predict(
-            source=test_image_path,
-            imgsz=imgsz,
-            device=0 if torch.cuda.is_available() else 'cpu',
-            verbose=False
-        )
+        run = self._benchmark_model(self.classifier, 'classifier', Path(self.classifier_model_path).suffix.lstrip('.'),
+                                    [cv2.imread(str(test_image_path))],
+                                    batch_size=1, imgsz=imgsz, warmup=warmup, runs=runs)
+        self.validation_results.setdefault('speed', {})['classifier'] = run
+        return run
+    
+    def benchmark(self, images, batch_sizes=BENCHMARK_BATCH_SIZES, thread_counts=(None,),
+                  formats=BENCHMARK_FORMATS, warmup=10, runs=50, device=None):
+        """
+        Latency / throughput / memory benchmark of every exported format
+        
+        For each model role, format, thread count and batch size the model
+        is warmed up, then ``runs`` batches are timed individually. Thread
+        counts apply to the formats whose runtime exposes them (pt via
+        torch, onnx via onnxruntime); other formats run once with their
+        runtime's default. torch's thread count is process-wide, so it is
+        restored after every configuration and threads=None runs really
+        use the default.
+        
+        Args:
+            images: BGR images (cycled to fill larger batches)
+            batch_sizes: Images per predict() call
+            thread_counts: CPU thread counts (None for the runtime default)
+            formats: Formats to include, when exported
+            warmup: Untimed batches per configuration
+            runs: Timed batches per configuration
+            device: Device for ultralytics formats (None: GPU 0 if CUDA is
+                available, else CPU; ONNX formats always run on CPU)
+            
+        Returns:
+            Benchmark results, also stored under validation_results['benchmark']
+        """
+        from inference_backends import load_model
+        
+        default_torch_threads = torch.get_num_threads()
+        results = {
+            'timestamp': datetime.now().isoformat(),
+            'config': {
+                'warmup': warmup,
+                'runs': runs,
+                'batch_sizes': list(batch_sizes),
+                'thread_counts': list(thread_counts),
+                'torch_default_threads': default_torch_threads,
+                'cpu_count': os.cpu_count(),
+                'platform': platform.platform(),
+                'processor': platform.processor() or platform.machine(),
+            },
+            'runs': []
+        }
         
-        if results:
-            result = results[0]
-            if hasattr(result, 'speed'):
-                print(f"  Preprocess: {result.speed.get('preprocess', 0):.2f}ms")
-                print(f"  Inference:  {result.speed.get('inference', 0):.2f}ms")
-                print(f"  Postprocess: {result.speed.get('postprocess', 0):.2f}ms")
-                total = sum(result.speed.values()) # type: ignore
-                print(f"  Total:      {total:.2f}ms")
+        roles = [('detector', 'detect', self.detection_model_path, 640),
+                 ('classifier', 'classify', self.classifier_model_path, 224)]
+        for role, task, model_path, imgsz in roles:
+            if not model_path:
+                continue
+            for fmt, path in find_exported_models(model_path).items():
+                if fmt not in formats:
+                    continue
+                threads_for_format = thread_counts if fmt in ('pt', 'onnx', 'onnx-int8') else (None,)
+                for threads in threads_for_format:
+                    print(f"\n=== Benchmarking {role} [{fmt}] threads={threads or 'default'} ===")
+                    try:
+                        try:
+                            if fmt in ('pt', 'onnx', 'onnx-int8'):
+                                model = load_model(path, task, num_threads=threads)
+                            else:
+                                model = YOLO(str(path), task=task)
+                        except Exception as e:
+                            print(f"  ✗ Failed to load {path}: {e}")
+                            results['runs'].append({'model': role, 'format': fmt, 'path': str(path),
+                                                    'threads': threads, 'error': str(e)})
+                            continue
+                        
+                        for batch_size in batch_sizes:
+                            run = self._benchmark_model(model, role, fmt, images, batch_size, imgsz,
+                                                        warmup, runs, threads, device)
+                            run['path'] = str(path)
+                            results['runs'].append(run)
+                    finally:
+                        # load_model sets torch threads globally for pt models
+                        torch.set_num_threads(default_torch_threads)
         
+        self.validation_results['benchmark'] = results
         return results
     
+    def _benchmark_model(self, model, role, fmt, images, batch_size, imgsz,
+                         warmup=10, runs=50, threads=None, device=None):
+        """Time one model at one batch size"""
+        if fmt in ('onnx', 'onnx-int8'):
+            # onnxruntime sessions are created on the CPU provider
+            device = 'cpu'
+        elif device is None:
+            device = default_device()
+        batch = [images[i % len(images)] for i in range(batch_size)]
+        run = {'model': role, 'format': fmt, 'batch_size': batch_size, 'threads': threads,
+               'device': device}
+        
+        try:
+            for _ in range(warmup):
+                model.predict(source=batch, imgsz=imgsz, device=device, verbose=False)
+            
+            latencies = np.empty(runs)
+            with _PeakRss() as rss:
+                for i in range(runs):
+                    start = time.perf_counter()
+                    model.predict(source=batch, imgsz=imgsz, device=device, verbose=False)
+                    latencies[i] = time.perf_counter() - start
+        except Exception as e:
+            print(f"  ✗ batch {batch_size}: {e}")
+            run['error'] = str(e)
+            return run
+        
+        p50, p90, p99 = np.percentile(latencies * 1000, [50, 90, 99])
+        run.update({
+            'latency_ms': {'p50': float(p50), 'p90': float(p90), 'p99': float(p99),
+                           'mean': float(latencies.mean() * 1000)},
+            'images_per_s': float(batch_size * runs / latencies.sum()),
+            'peak_rss_mb': rss.peak_mb,
+        })
+        print(f"  batch {batch_size:>3}: p50 {p50:8.2f}ms  p90 {p90:8.2f}ms  p99 {p99:8.2f}ms  "
+              f"{run['images_per_s']:8.1f} img/s  peak RSS {rss.peak_mb or 0:.0f}MB")
+        return run
+    
+    def compare_to_baseline(self, baseline_path, tolerance=0.10):
+        """
+        Compare benchmark results with a previous validation report
+        
+        Runs are matched by model, format, batch size and thread count. A
+        run regresses when its p50 latency grows, or its throughput
+        drops, by more than ``tolerance``.
+        
+        Args:
+            baseline_path: validation_report.json of the baseline run
+            tolerance: Allowed relative slowdown
+            
+        Returns:
+            List of regressions
+        """
+        with open(baseline_path) as f:
+            baseline = json.load(f).get('benchmark', {}).get('runs', [])
+        current = self.validation_results.get('benchmark', {}).get('runs', [])
+        
+        def key(run):
+            return (run['model'], run['format'], run.get('batch_size'), run.get('threads'))
+        
+        previous = {key(run): run for run in baseline if 'latency_ms' in run}
+        comparisons, regressions = [], []
+        for run in current:
+            before = previous.get(key(run))
+            if before is None or 'latency_ms' not in run:
+                continue
+            latency_change = run['latency_ms']['p50'] / before['latency_ms']['p50'] - 1
+            throughput_change = run['images_per_s'] / before['images_per_s'] - 1
+            comparison = {
+                'model': run['model'], 'format': run['format'],
+                'batch_size': run['batch_size'], 'threads': run['threads'],
+                'p50_change': latency_change,
+                'throughput_change': throughput_change,
+                'regressed': latency_change > tolerance or throughput_change < -tolerance
+            }
+            comparisons.append(comparison)
+            if comparison['regressed']:
+                regressions.append(comparison)
+        
+        self.validation_results['baseline_comparison'] = {
+            'baseline': str(baseline_path),
+            'tolerance': tolerance,
+            'runs': comparisons,
+            'regressions': len(regressions)
+        }
+        
+        print(f"\n=== Baseline Comparison ({len(comparisons)} matching runs) ===")
+        for c in comparisons:
+            status = "⚠ REGRESSION" if c['regressed'] else "✓"
+            print(f"  {c['model']:<10} {c['format']:<9} batch {c['batch_size']:>3} "
+                  f"threads {c['threads'] or 'default':<7} p50 {c['p50_change']:+.1%} "
+                  f"throughput {c['throughput_change']:+.1%} {status}")
+        
+        return regressions
+    
     def generate_validation_report(self, output_path='validation_report.json'):
         """Save validation results to JSON file"""
         print(f"\nSaving validation report to: {output_path}")
@@ -196,20 +493,67 @@ if __name__ == "__main__":
                         help='Path to test image for speed testing')
     parser.add_argument('--output-report', type=str, default='validation_report.json',
                         help='Output path for validation report')
+    parser.add_argument('--skip-validation', action='store_true',
+                        help='Only run speed tests / benchmarks')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Benchmark every exported format of the given models')
+    parser.add_argument('--bench-images', type=str, default=None,
+                        help='Directory of benchmark images (default: --test-image)')
+    parser.add_argument('--batch-sizes', type=str, default='1,4,16,64',
+                        help='Comma-separated benchmark batch sizes')
+    parser.add_argument('--threads', type=str, default='0',
+                        help='Comma-separated CPU thread counts (0 = runtime default)')
+    parser.add_argument('--formats', type=str, default=','.join(BENCHMARK_FORMATS),
+                        help='Comma-separated formats to benchmark')
+    parser.add_argument('--warmup', type=int, default=10, help='Untimed batches per configuration')
+    parser.add_argument('--runs', type=int, default=50, help='Timed batches per configuration')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Previous validation_report.json to compare benchmarks against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed relative slowdown against the baseline')
     
     args = parser.parse_args()
     
     validator = ModelValidator(args.detection_model, args.classifier_model)
+    regressions = []
+    
+    if args.benchmark:
+        if args.bench_images:
+            bench_paths = sorted(p for p in Path(args.bench_images).rglob('*')
+                                 if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+        else:
+            bench_paths = [Path(args.test_image)] if args.test_image else []
+        images = [image for image in (cv2.imread(str(p)) for p in bench_paths) if image is not None]
+        if not images:
+            parser.error('--benchmark needs --bench-images or --test-image')
+        
+        validator.benchmark(
+            images,
+            batch_sizes=[int(b) for b in args.batch_sizes.split(',')],
+            thread_counts=[int(t) or None for t in args.threads.split(',')],
+            formats=args.formats.split(','),
+            warmup=args.warmup,
+            runs=args.runs
+        )
+        
+        if args.baseline:
+            regressions = validator.compare_to_baseline(args.baseline, args.tolerance)
     
     if args.detection_model:
-        validator.validate_detector(args.detection_data)
+        if not args.skip_validation:
+            validator.validate_detector(args.detection_data)
         if args.test_image:
             validator.test_inference_speed(args.test_image)
     
     if args.classifier_model:
-        validator.validate_classifier(args.classifier_data)
+        if not args.skip_validation:
+            validator.validate_classifier(args.classifier_data)
         if args.test_image:
             validator.test_classification_speed(args.test_image)
     
     validator.print_summary()
     validator.generate_validation_report(args.output_report)
+    
+    if regressions:
+        print(f"\n⚠ {len(regressions)} benchmark regression(s) against {args.baseline}")
+        sys.exit(1)
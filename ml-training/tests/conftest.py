@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# ml-training modules are flat scripts imported from their own directory
+ML_TRAINING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ML_TRAINING_DIR not in sys.path:
+    sys.path.insert(0, ML_TRAINING_DIR)
+
+import flower_inference  # noqa: E402
+from inference_backends import _Boxes, _Probs, _Result  # noqa: E402
+
+
+class FakeDetector:
+    """One flower in the top-left corner of every frame"""
+
+    def __init__(self):
+        self.frames = 0
+
+    def predict(self, source, **kwargs):
+        self.frames += len(source)
+        return [_Result(boxes=_Boxes(np.array([[10.0, 10.0, 40.0, 40.0]]),
+                                     np.array([0.8]), np.array([0])))
+                for _ in source]
+
+
+class FakeClassifier:
+    """Every crop is 'open' with 0.9 confidence"""
+
+    def predict(self, source, **kwargs):
+        return [_Result(probs=_Probs(np.array([0.05, 0.9, 0.05]))) for _ in source]
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    """Make FlowerDetectionPipeline load the fakes; returns the detector"""
+    detector = FakeDetector()
+    classifier = FakeClassifier()
+    monkeypatch.setattr(flower_inference, 'load_model',
+                        lambda path, task, *args: detector if task == 'detect' else classifier)
+    return detector
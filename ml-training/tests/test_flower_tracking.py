@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import flower_inference
+from flower_inference import FlowerDetectionPipeline
+from flower_tracking import FlowerTracker
+from inference_backends import _Probs, _Result
+
+
+class FakeClassifier:
+    """Every crop is 'open' with 0.9 confidence"""
+
+    def __init__(self):
+        self.crops = 0
+
+    def predict(self, source, **kwargs):
+        self.crops += len(source)
+        return [_Result(probs=_Probs(np.array([0.05, 0.9, 0.05]))) for _ in source]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    classifier = FakeClassifier()
+    monkeypatch.setattr(flower_inference, 'load_model',
+                        lambda path, task, *args: classifier if task == 'classify' else None)
+    return FlowerDetectionPipeline('detector.onnx', 'classifier.onnx',
+                                   tracker=FlowerTracker(max_age=3))
+
+
+def test_batch_longer_than_max_age(pipeline):
+    tracker = pipeline.tracker
+    images = [np.full((120, 160, 3), 100, dtype=np.uint8) for _ in range(10)]
+    # One flower in the first two frames only, then nothing
+    detections = [([(10, 10, 40, 40)], [0.8])] * 2 + [([], [])] * 8
+
+    outputs = pipeline._process_tracked(images, detections, annotate=False)
+
+    flowers = [flower for frame, _ in outputs for flower in frame]
+    assert len(flowers) == 2
+    assert all(flower['classification'].class_name == 'open' for flower in flowers)
+    assert pipeline.classifier.crops == 1
+
+    # The track was pruned mid-batch; none of its state may linger
+    assert not tracker.is_active(flowers[0]['track_id'])
+    assert tracker._classifications == {}
+    assert tracker._attempts == {}
+    assert tracker.stats()['classifier_runs'] == 1
+
+
+def test_cached_classification_survives_pruning_within_batch(pipeline):
+    tracker = pipeline.tracker
+    image = np.full((120, 160, 3), 100, dtype=np.uint8)
+    box = [(10, 10, 40, 40)]
+
+    first = pipeline._process_tracked([image], [(box, [0.8])], annotate=False)
+    track_id = first[0][0][0]['track_id']
+
+    # Seen once more, then dropped within the same batch
+    detections = [(box, [0.8])] + [([], [])] * 6
+    outputs = pipeline._process_tracked([image] * 7, detections, annotate=False)
+
+    flower = outputs[0][0][0]
+    assert flower['track_id'] == track_id
+    assert flower['classification'].class_name == 'open'
+    assert pipeline.classifier.crops == 1
+    assert tracker._classifications == {}
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+import pytest
+
+from flower_video import MotionGate, process_video
+
+
+class FakePipeline:
+    """One flower per frame; records the batches it was given"""
+
+    def __init__(self):
+        self.batches = []
+
+    def process_frames(self, frames):
+        self.batches.append(len(frames))
+        return [([{'bbox': (1, 1, 5, 5), 'crop': frame[1:5, 1:5]}], None) for frame in frames]
+
+    def _annotate(self, frame, flowers):
+        return frame
+
+
+@pytest.fixture
+def video(tmp_path):
+    """Ten 64x48 frames: five dark, then five bright"""
+    path = str(tmp_path / 'flight.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for value in [50] * 5 + [200] * 5:
+        writer.write(np.full((48, 64, 3), value, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def frame(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+@pytest.mark.parametrize('method, threshold', [('diff', 4.0), ('dhash', 4)])
+def test_gate_passes_changed_frames_only(method, threshold):
+    gate = MotionGate(threshold=threshold, method=method)
+    changed = frame(50)
+    changed[:, 32:] = 200
+
+    assert gate(frame(50))
+    assert not gate(frame(51))
+    assert gate(changed)
+    assert not gate(changed.copy())
+
+
+def test_gate_processes_one_frame_in_max_skip():
+    gate = MotionGate(max_skip=2)
+    assert [gate(frame(50)) for _ in range(7)] == [True, False, False, True, False, False, True]
+
+
+def test_gate_rejects_unknown_method():
+    with pytest.raises(ValueError):
+        MotionGate(method='ssim')
+
+
+def test_every_frame_is_reported_in_order(video):
+    pipeline = FakePipeline()
+    results = list(process_video(pipeline, video, batch_size=4))
+
+    assert [r['frame'] for r in results] == list(range(10))
+    assert pipeline.batches == [4, 4, 2]
+    assert all(r['flower_count'] == 1 and 'crop' not in r['flowers'][0] for r in results)
+
+
+def test_gated_frames_are_skipped(video):
+    pipeline = FakePipeline()
+    results = list(process_video(pipeline, video, batch_size=4, gate=MotionGate()))
+
+    assert [r['frame'] for r in results if not r['skipped']] == [0, 5]
+    assert sum(r['flower_count'] for r in results) == 2
+    assert sum(pipeline.batches) == 2
+
+
+def test_stride_and_annotated_output(video, tmp_path):
+    output = str(tmp_path / 'annotated.avi')
+    results = list(process_video(FakePipeline(), video, output_path=output, stride=3))
+
+    assert [r['frame'] for r in results] == [0, 3, 6, 9]
+    capture = cv2.VideoCapture(output)
+    written = 0
+    while capture.grab():
+        written += 1
+    capture.release()
+    assert written == 4
@@ -0,0 +1,103 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from flower_inference import FlowerDetectionPipeline
+from inference_cache import InferenceCache, content_hash
+
+FLOWERS = [{'bbox': [10, 10, 40, 40], 'detection_confidence': 0.8}]
+
+
+def key(name, conf=0.5):
+    return InferenceCache.make_key(content_hash(name.encode()), 'v1', conf)
+
+
+def test_miss_then_memory_hit():
+    cache = InferenceCache()
+    assert cache.get(key('a')) is None
+    cache.put(key('a'), FLOWERS)
+    assert cache.get(key('a')) == FLOWERS
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_key_covers_threshold_and_version():
+    digest = content_hash(b'frame')
+    keys = {
+        InferenceCache.make_key(digest, 'v1', 0.5),
+        InferenceCache.make_key(digest, 'v1', 0.6),
+        InferenceCache.make_key(digest, 'v2', 0.5),
+    }
+    assert len(keys) == 3
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    InferenceCache(str(tmp_path)).put(key('a'), FLOWERS)
+
+    cache = InferenceCache(str(tmp_path))
+    assert cache.stats()['disk_bytes'] > 0
+    assert cache.get(key('a')) == FLOWERS
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_memory_tier_is_bounded():
+    cache = InferenceCache(max_entries=2)
+    for name in 'abc':
+        cache.put(key(name), FLOWERS)
+    assert cache.get(key('a')) is None
+    assert cache.get(key('c')) == FLOWERS
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = InferenceCache(str(tmp_path))
+    for i, name in enumerate('abcde'):
+        cache.put(key(name), FLOWERS)
+        os.utime(cache._path(key(name)), (1_000_000 + i, 1_000_000 + i))
+    size = cache._path(key('a')).stat().st_size
+
+    cache = InferenceCache(str(tmp_path), max_entries=1, max_disk_bytes=5 * size)
+    cache.put(key('f'), FLOWERS)
+
+    assert cache.stats()['disk_bytes'] <= 5 * size
+    assert not cache._path(key('a')).exists()
+    assert cache._path(key('e')).exists()
+    assert cache.get(key('f')) == FLOWERS
+
+
+def test_corrupt_disk_entry_is_a_miss(tmp_path):
+    InferenceCache(str(tmp_path)).put(key('a'), FLOWERS)
+    path = next(tmp_path.glob('*/*.json'))
+    path.write_text('{"truncated')
+
+    cache = InferenceCache(str(tmp_path))
+    assert cache.get(key('a')) is None
+    cache.put(key('a'), FLOWERS)
+    assert InferenceCache(str(tmp_path)).get(key('a')) == FLOWERS
+
+
+def test_pipeline_answers_repeated_image_from_cache(detector, tmp_path):
+    image_path = tmp_path / 'frame.png'
+    cv2.imwrite(str(image_path), np.full((80, 80, 3), 100, dtype=np.uint8))
+    pipeline = FlowerDetectionPipeline('detector.onnx', 'classifier.onnx',
+                                       cache=InferenceCache())
+
+    first, _ = pipeline.process_image(str(image_path))
+    second, annotated = pipeline.process_image(str(image_path))
+    assert detector.frames == 1
+    assert len(second) == len(first) == 1
+    assert second[0]['classification'].class_name == 'open'
+    assert annotated.shape == (80, 80, 3)
+
+
+@pytest.mark.parametrize('content', [None, b'not an image'])
+def test_pipeline_with_cache_rejects_unreadable_image(detector, tmp_path, content):
+    image_path = tmp_path / 'frame.jpg'
+    if content is not None:
+        image_path.write_bytes(content)
+    pipeline = FlowerDetectionPipeline('detector.onnx', 'classifier.onnx',
+                                       cache=InferenceCache())
+
+    with pytest.raises(ValueError, match='Failed to load image'):
+        pipeline.process_image(str(image_path))
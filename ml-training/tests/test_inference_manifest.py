@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from flower_inference import FlowerDetectionPipeline
+from flower_tracking import FlowerTracker
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    for i in range(3):
+        image = np.full((80, 80, 3), 40 * i, dtype=np.uint8)
+        cv2.imwrite(str(tmp_path / f'img_{i}.png'), image)
+    return tmp_path
+
+
+def run(image_dir, tracker=None):
+    pipeline = FlowerDetectionPipeline('detector.onnx', 'classifier.onnx', tracker=tracker)
+    return list(pipeline.iter_batch(str(image_dir), keep_crops=False,
+                                    manifest_path=str(image_dir / 'manifest.json')))
+
+
+def test_unchanged_images_are_not_processed_again(detector, image_dir):
+    first = run(image_dir)
+    assert detector.frames == 3
+
+    second = run(image_dir)
+    assert detector.frames == 3
+    assert [r['image'] for r in second] == [r['image'] for r in first]
+    assert [r['flower_count'] for r in second] == [1, 1, 1]
+    assert second[0]['flowers'][0]['classification'].class_name == 'open'
+
+
+def count_reads(monkeypatch):
+    """Names of the image files read (raw bytes or cv2.imread)"""
+    reads = []
+    read_bytes = Path.read_bytes
+    imread = cv2.imread
+    monkeypatch.setattr(Path, 'read_bytes', lambda self: reads.append(self.name) or read_bytes(self))
+    monkeypatch.setattr(cv2, 'imread', lambda path, *args: reads.append(Path(path).name) or imread(path, *args))
+    return reads
+
+
+def test_touched_image_matches_by_content(detector, image_dir, monkeypatch):
+    run(image_dir)
+    touched = image_dir / 'img_1.png'
+    stat = touched.stat()
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    reads = count_reads(monkeypatch)
+    results = run(image_dir)
+    assert detector.frames == 3
+    assert results[1]['flower_count'] == 1
+    assert reads == ['img_1.png']
+
+
+def test_changed_image_is_read_once_and_processed_again(detector, image_dir, monkeypatch):
+    run(image_dir)
+    cv2.imwrite(str(image_dir / 'img_2.png'), np.full((80, 80, 3), 255, dtype=np.uint8))
+
+    reads = count_reads(monkeypatch)
+    results = run(image_dir)
+    assert reads == ['img_2.png']
+    assert detector.frames == 4
+    assert [r['flower_count'] for r in results] == [1, 1, 1]
+
+    run(image_dir)
+    assert detector.frames == 4
+
+
+def test_incremental_rejects_tracking(detector, image_dir):
+    with pytest.raises(ValueError, match='tracking'):
+        run(image_dir, tracker=FlowerTracker())
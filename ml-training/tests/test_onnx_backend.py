@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip('onnx')
+pytest.importorskip('onnxruntime')
+from onnx import TensorProto, helper  # noqa: E402
+
+from flower_inference import FlowerDetectionPipeline  # noqa: E402
+from inference_backends import OnnxClassifier, OnnxDetector, load_model  # noqa: E402
+
+# YOLOv8-style raw output for a 64x64 input, one column per anchor:
+# (cx, cy, w, h, score of class 0, score of class 1)
+ANCHORS = np.array([
+    [32, 32, 16, 16, 0.9, 0.0],   # a flower
+    [33, 32, 16, 16, 0.8, 0.0],   # its duplicate, suppressed by NMS
+    [10, 10, 4, 4, 0.1, 0.05],    # below the confidence threshold
+], dtype=np.float32).T
+
+
+def constant_model(path, input_name, input_shape, output):
+    """ONNX model returning ``output`` for every image of the input batch"""
+    axes = list(range(1, len(input_shape)))
+    nodes = [
+        # (n, 1, ...) zeros that depend on the input, broadcast onto the output
+        helper.make_node('ReduceMean', [input_name], ['mean'], axes=axes, keepdims=1),
+        helper.make_node('Reshape', ['mean', 'shape'], ['means']),
+        helper.make_node('Mul', ['means', 'zero'], ['zeros']),
+        helper.make_node('Add', ['zeros', 'value'], ['output']),
+    ]
+    initializers = [
+        helper.make_tensor('shape', TensorProto.INT64, [output.ndim + 1], [-1] + [1] * output.ndim),
+        helper.make_tensor('zero', TensorProto.FLOAT, [], [0.0]),
+        helper.make_tensor('value', TensorProto.FLOAT, (1,) + output.shape, output.ravel().tolist()),
+    ]
+    graph = helper.make_graph(
+        nodes, 'constant',
+        [helper.make_tensor_value_info(input_name, TensorProto.FLOAT, input_shape)],
+        [helper.make_tensor_value_info('output', TensorProto.FLOAT, None)],
+        initializers
+    )
+    # Pin the IR version so older onnxruntime releases can load the model
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)], ir_version=7)
+    onnx.save(model, str(path))
+    return str(path)
+
+
+@pytest.fixture
+def detector_path(tmp_path):
+    return constant_model(tmp_path / 'detector.onnx', 'images', ['batch', 3, 64, 64], ANCHORS)
+
+
+@pytest.fixture
+def classifier_path(tmp_path):
+    logits = np.array([0.0, 3.0, 0.0], dtype=np.float32)
+    return constant_model(tmp_path / 'classifier.onnx', 'input_image', ['batch', 3, 32, 32], logits)
+
+
+def test_detector_maps_boxes_back_to_the_frame(detector_path):
+    detector = load_model(detector_path, 'detect')
+    assert isinstance(detector, OnnxDetector)
+    assert detector.input_size == (64, 64)
+
+    # 64x128 frames are letterboxed at half scale with 16 pixels of padding on top
+    [result] = detector.predict([np.zeros((64, 128, 3), dtype=np.uint8)], conf=0.25)
+
+    np.testing.assert_allclose(result.boxes.xyxy, [[48, 16, 80, 48]])
+    np.testing.assert_allclose(result.boxes.conf, [0.9])
+    assert result.boxes.cls.tolist() == [0]
+
+
+def test_static_batch_is_run_in_padded_chunks(tmp_path):
+    path = constant_model(tmp_path / 'static.onnx', 'images', [2, 3, 64, 64], ANCHORS)
+    detector = OnnxDetector(path)
+    assert detector.batch_size == 2
+
+    results = detector.predict([np.zeros((64, 64, 3), dtype=np.uint8)] * 3)
+    assert [len(result.boxes.conf) for result in results] == [1, 1, 1]
+
+
+def test_classifier_normalizes_and_softmaxes(classifier_path):
+    classifier = load_model(classifier_path, 'classify')
+    assert isinstance(classifier, OnnxClassifier)
+    assert classifier.mean is not None  # exported CNN input gets ImageNet normalization
+
+    results = classifier.predict([np.zeros((50, 40, 3), dtype=np.uint8)] * 2)
+    assert [result.probs.top1 for result in results] == [1, 1]
+    assert results[0].probs.data.sum() == pytest.approx(1.0)
+
+
+def test_pipeline_runs_on_onnx_models(detector_path, classifier_path):
+    pipeline = FlowerDetectionPipeline(detector_path, classifier_path, num_threads=1)
+    [(flowers, _)] = pipeline.process_frames([np.zeros((64, 64, 3), dtype=np.uint8)])
+
+    assert [flower['bbox'] for flower in flowers] == [(24, 24, 40, 40)]
+    assert flowers[0]['classification'].class_name == 'open'
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from readiness_forest import CompiledForest, verify, with_missing_values
+
+
+def make_data(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int) + (X[:, 2] > 1).astype(int)
+    return X, y
+
+
+@pytest.fixture(params=[False, True], ids=["complete", "trained-with-nan"])
+def model(request):
+    X, y = make_data()
+    if request.param:
+        X = X.copy()
+        X[np.random.default_rng(1).random(X.shape) < 0.1] = np.nan
+    return RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0).fit(X, y)
+
+
+def test_matches_sklearn(model):
+    X, _ = make_data(200, seed=2)
+    forest = CompiledForest.from_sklearn(model)
+    np.testing.assert_array_equal(forest.predict_proba(X), model.predict_proba(X))
+
+
+def test_nan_rows_follow_sklearn_routing(model):
+    X, _ = make_data(200, seed=3)
+    missing = with_missing_values(X)
+    forest = CompiledForest.from_sklearn(model)
+    np.testing.assert_array_equal(forest.predict_proba(missing), model.predict_proba(missing))
+    assert verify(model, forest, X)
+
+
+def test_save_load_roundtrip(model, tmp_path):
+    X, _ = make_data(100, seed=4)
+    missing = with_missing_values(X)
+    CompiledForest.from_sklearn(model).save(tmp_path)
+    forest = CompiledForest.load(tmp_path)
+    np.testing.assert_array_equal(forest.predict_proba(missing), model.predict_proba(missing))
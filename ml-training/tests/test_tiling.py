@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import flower_inference
+from flower_inference import FlowerDetectionPipeline, tile_offsets
+from inference_backends import _Boxes, _Result, nms
+
+
+class BrightRegionDetector:
+    """
+    Reports the bounding box of the bright pixels of each tile, if any,
+    with a lower confidence when the region is cut off by the tile edge
+    """
+
+    def __init__(self):
+        self.tiles = []
+
+    def predict(self, source, **kwargs):
+        self.tiles.extend(tile.shape[:2] for tile in source)
+        results = []
+        for tile in source:
+            ys, xs = np.nonzero(tile[..., 0] > 128)
+            if len(xs) == 0:
+                results.append(_Result(boxes=_Boxes(np.zeros((0, 4)), np.zeros(0), np.zeros(0))))
+                continue
+            box = [xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]
+            clipped = box[0] == 0 or box[1] == 0 or box[2] == tile.shape[1] or box[3] == tile.shape[0]
+            results.append(_Result(boxes=_Boxes(np.array([box], dtype=np.float32),
+                                                np.array([0.6 if clipped else 0.9]),
+                                                np.array([0]))))
+        return results
+
+
+@pytest.fixture
+def bright_detector(monkeypatch):
+    detector = BrightRegionDetector()
+    monkeypatch.setattr(flower_inference, 'load_model',
+                        lambda path, task, *args: detector if task == 'detect' else None)
+    return detector
+
+
+def test_tile_offsets_cover_the_frame():
+    offsets = tile_offsets(300, 500, 128, 0.25)
+    xs, ys = sorted(set(offsets[:, 0])), sorted(set(offsets[:, 1]))
+    assert xs == [0, 96, 192, 288, 372]
+    assert ys == [0, 96, 172]
+    assert len(offsets) == len(xs) * len(ys)
+
+
+def test_tile_offsets_of_a_small_frame():
+    assert tile_offsets(64, 100, 128, 0.2).tolist() == [[0, 0]]
+
+
+def test_ios_merges_a_clipped_box_that_iou_keeps():
+    full = [100, 100, 140, 140]
+    clipped = [100, 100, 112, 140]  # the same flower cut at a tile border
+    boxes = np.array([full, clipped], dtype=np.float32)
+    scores = np.array([0.9, 0.8])
+
+    assert nms(boxes, scores, 0.5, metric='iou').tolist() == [0, 1]
+    assert nms(boxes, scores, 0.5, metric='ios').tolist() == [0]
+
+
+def test_nms_keeps_separate_boxes_best_first():
+    boxes = np.array([[0, 0, 10, 10], [50, 50, 60, 60], [1, 1, 10, 10]], dtype=np.float32)
+    scores = np.array([0.5, 0.9, 0.7])
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+
+
+def test_nms_rejects_unknown_metric():
+    with pytest.raises(ValueError):
+        nms(np.zeros((1, 4)), np.ones(1), metric='giou')
+
+
+def test_flower_across_tile_border_is_detected_once(bright_detector):
+    pipeline = FlowerDetectionPipeline('detector.onnx', 'classifier.onnx',
+                                       tile_size=128, tile_overlap=0.25, tile_batch_size=4)
+    image = np.zeros((200, 300, 3), dtype=np.uint8)
+    # Mostly in the tile starting at x=96; its first 8 columns are also in
+    # the tile at x=0, too little overlap for IoU to merge the two boxes
+    image[80:110, 120:150] = 255
+
+    [(boxes, scores)] = pipeline._detect_batch([image])
+
+    assert boxes == [(120, 80, 150, 110)]
+    assert scores == [pytest.approx(0.9)]
+    assert len(bright_detector.tiles) == len(tile_offsets(200, 300, 128, 0.25))
+    assert set(bright_detector.tiles) == {(128, 128)}
+
+
+def test_frame_within_one_tile_is_not_split(bright_detector):
+    pipeline = FlowerDetectionPipeline('detector.onnx', 'classifier.onnx', tile_size=128)
+    image = np.zeros((100, 120, 3), dtype=np.uint8)
+    image[10:20, 30:50] = 255
+
+    [(boxes, _)] = pipeline._detect_batch([image])
+
+    assert boxes == [(30, 10, 50, 20)]
+    assert bright_detector.tiles == [(100, 120)]
@@ -6,6 +6,8 @@ import numpy as np
 import pandas as pd
 import joblib
 
+from readiness_forest import CompiledForest, verify
+
 from sklearn.preprocessing import LabelEncoder
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import (
@@ -151,11 +153,24 @@ os.makedirs(ARTIFACT_DIR, exist_ok=True)
 MODEL_PATH = os.path.join(ARTIFACT_DIR, "pollination_readiness_model.joblib")
 ENCODER_PATH = os.path.join(ARTIFACT_DIR, "pollination_readiness_label_encoder.joblib")
 
-joblib.dump(model, MODEL_PATH)
-joblib.dump(le, ENCODER_PATH)
+# Uncompressed dumps let the backend load them with mmap_mode="r"; only the
+# compiled forest's .npy arrays (below) actually share pages between
+# workers, since sklearn trees unpickle their nodes into private memory
+joblib.dump(model, MODEL_PATH, compress=0)
+joblib.dump(le, ENCODER_PATH, compress=0)
+
+# Flat-array copy of the forest for the backend's compiled evaluator
+FOREST_PATH = os.path.join(ARTIFACT_DIR, "pollination_readiness_forest")
+
+forest = CompiledForest.from_sklearn(model)
+forest.save(FOREST_PATH)
+
+if not verify(model, forest, X_test.to_numpy()):
+    raise RuntimeError("Compiled forest does not match sklearn predictions")
 
 print("\nArtifacts saved:")
 print("Model:", MODEL_PATH)
 print("Label encoder:", ENCODER_PATH)
+print("Compiled forest:", FOREST_PATH)
 
 print("\nTraining pipeline completed successfully.")